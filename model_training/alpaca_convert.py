@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+import argparse
+import json
+import re
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from qa_parser import QAStreamParser
+
+# 每次从输入文件读取的字符数
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# 与SFT notebook中formatting_prompts_func使用的alpaca_prompt相同
+ALPACA_PROMPT = """Below is an instruction that describes a task, paired with an input that provides further context. Write a response that appropriately completes the request.
+
+### Instruction:
+{}
+
+### Input:
+{}
+
+### Response:
+{}"""
+
+# 只在文件开头查找嵌套的问题-答案对象的键，避免把答案中的同名文本当成键
+_HEAD_SIZE = 4096
+
+
+def alpaca_record(instruction: str, input: str, output: str) -> Dict[str, str]:
+    """Alpaca格式的记录：instruction、input、output三个字段"""
+    return {"instruction": instruction, "input": input, "output": output}
+
+
+class PromptTemplate:
+    """
+    将问题-答案对填入提示词模板，输出 {"text": ...} 记录，即SFT训练时formatting_prompts_func的结果
+
+    模板依次接收instruction、input、output三个参数，末尾追加eos_token。
+    """
+
+    def __init__(self, prompt: str = ALPACA_PROMPT, eos_token: str = ""):
+        """
+        Args:
+            prompt: 含有三个{}占位符的提示词模板
+            eos_token: 追加在每条文本末尾的结束符，应与训练使用的tokenizer.eos_token相同
+        """
+        self.prompt = prompt
+        self.eos_token = eos_token
+
+    def __call__(self, instruction: str, input: str, output: str) -> Dict[str, str]:
+        return {"text": self.prompt.format(instruction, input, output) + self.eos_token}
+
+
+# 命令行可选的模板
+TEMPLATES = {
+    "alpaca": lambda eos_token: alpaca_record,
+    "alpaca_prompt": lambda eos_token: PromptTemplate(ALPACA_PROMPT, eos_token),
+}
+
+
+def iter_jsonl_pairs(path: str) -> Iterator[Tuple[str, Any]]:
+    """
+    逐行读取JSONL文件中的问题-答案对
+
+    每行是 {"question": ..., "answer": ...}（运行目录的data.jsonl）或
+    {"instruction": ..., "output": ...}，无法解析的行被跳过
+
+    Args:
+        path: JSONL文件路径
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "question" in record:
+                yield record["question"], record.get("answer", "")
+            elif "instruction" in record:
+                yield record["instruction"], record.get("output", "")
+
+
+def iter_json_pairs(path: str, key: Optional[str] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    增量解析JSON文件中以问题为键、答案为值的对象，不把整个文件读入内存
+
+    key为None时，文件开头有 "qa_pairs" 键（CoT notebook导出的格式）就解析该键的对象，
+    否则解析顶层对象（合成数据pipeline输出的格式）
+
+    Args:
+        path: JSON文件路径
+        key: 问题-答案对象所在的顶层键
+        chunk_size: 每次读取的字符数
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(_HEAD_SIZE)
+        if key is None and re.search(r'"qa_pairs"\s*:', head):
+            key = "qa_pairs"
+        if key is not None:
+            head = _skip_to_key(f, head, key, chunk_size)
+
+        parser = QAStreamParser(max_objects=1)
+        yield from parser.feed(head)
+        while not parser.finished:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield from parser.feed(chunk)
+        yield from parser.close()
+        if parser.report.lost:
+            print(f"{path} 中有 {parser.report.lost} 个问题-答案对无法解析")
+
+
+def _skip_to_key(f, buffer: str, key: str, chunk_size: int) -> str:
+    """读取到顶层对象中key对应的值，返回从该值的左括号开始的内容"""
+    pattern = re.compile(re.escape(json.dumps(key)) + r'\s*:\s*(?=\{)')
+    while True:
+        match = pattern.search(buffer)
+        if match:
+            return buffer[match.end():]
+        chunk = f.read(chunk_size)
+        if not chunk:
+            raise ValueError(f"文件中没有找到键 '{key}' 对应的对象")
+        # 保留末尾一段，键可能被切分在两次读取之间
+        buffer = buffer[-(len(key) + 64):] + chunk
+
+
+def iter_qa_pairs(path: str, key: Optional[str] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    根据扩展名逐条读取JSONL或JSON文件中的问题-答案对
+
+    Args:
+        path: 输入文件路径，.jsonl结尾按JSONL读取
+        key: JSON文件中问题-答案对象所在的顶层键
+        chunk_size: 每次读取的字符数
+    """
+    if path.endswith(".jsonl"):
+        return iter_jsonl_pairs(path)
+    return iter_json_pairs(path, key, chunk_size)
+
+
+def iter_converted(input_path: str, template: Callable[[str, str, str], Dict[str, Any]] = alpaca_record,
+                   key: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    逐条读取问题-答案对并用模板转换为训练记录
+
+    Args:
+        input_path: 输入文件（JSON或JSONL）
+        template: 以 (instruction, input, output) 为参数返回一条记录的函数
+        key: JSON文件中问题-答案对象所在的顶层键
+        chunk_size: 每次读取的字符数
+    """
+    for question, answer in iter_qa_pairs(input_path, key, chunk_size):
+        if not isinstance(answer, str):
+            answer = json.dumps(answer, ensure_ascii=False)
+        yield template(question, "", answer)
+
+
+def convert_to_alpaca(input_path: str, output_path: str,
+                      template: Callable[[str, str, str], Dict[str, Any]] = alpaca_record,
+                      key: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    将问题-答案对逐条转换为训练记录并写入JSONL文件，内存占用不随数据量增长
+
+    Args:
+        input_path: 输入文件（JSON或JSONL）
+        output_path: 输出JSONL文件
+        template: 以 (instruction, input, output) 为参数返回一条记录的函数
+        key: JSON文件中问题-答案对象所在的顶层键
+        chunk_size: 每次读取的字符数
+
+    Returns:
+        写入的记录数
+    """
+    count = 0
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for record in iter_converted(input_path, template, key, chunk_size):
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """逐条读取convert_to_alpaca写出的JSONL记录"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将问题-答案数据流式转换为Alpaca格式的JSONL")
+    parser.add_argument("--input", type=str, required=True, help="输入文件（JSON或JSONL）")
+    parser.add_argument("--output", type=str, required=True, help="输出JSONL文件")
+    parser.add_argument("--template", type=str, choices=sorted(TEMPLATES), default="alpaca",
+                        help="alpaca输出instruction/input/output字段，alpaca_prompt输出填好提示词的text字段")
+    parser.add_argument("--eos_token", type=str, default="", help="alpaca_prompt模板追加的结束符，如 <|endoftext|>")
+    parser.add_argument("--key", type=str, default=None, help="JSON文件中问题-答案对象所在的顶层键，默认自动识别")
+
+    args = parser.parse_args()
+
+    count = convert_to_alpaca(args.input, args.output, TEMPLATES[args.template](args.eos_token), args.key)
+    print(f"已将 {count} 条记录写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
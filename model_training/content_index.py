@@ -0,0 +1,224 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# 与text_segment分段使用同一个token估计，片段预算和分段预算一致
+from text_segment.text_segmentation import cjk_token_estimate
+
+# 每个片段的默认token预算，约等于原来截取的3000个英文字符
+DEFAULT_CHUNK_TOKENS = 750
+
+_CJK = '㐀-䶿一-鿿豈-﫿'
+_CJK_RUN_PATTERN = re.compile(f'[{_CJK}]+')
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+_PARAGRAPH_PATTERN = re.compile(r'\n\s*\n')
+_SENTENCE_PATTERN = re.compile(r'(?<=[。！？；.!?;])\s*')
+
+
+def split_chunks(text: str, max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[str]:
+    """
+    将网页内容按段落切分为不超过token预算的片段
+
+    相邻的段落合并到同一片段中，超过预算的段落按句子切分，仍然超过预算的句子按字符切分。
+    token数用cjk_token_estimate估计
+
+    Args:
+        text: 网页内容（markdown）
+        max_tokens: 每个片段的token预算
+
+    Returns:
+        片段列表
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens必须大于0")
+
+    pieces = []
+    for paragraph in _PARAGRAPH_PATTERN.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if cjk_token_estimate(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_PATTERN.split(paragraph):
+            if sentence:
+                pieces.extend(_split_long(sentence, max_tokens))
+
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = cjk_token_estimate(piece)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _split_long(text: str, max_tokens: int) -> List[str]:
+    """按字符切分超过预算的文本"""
+    parts = []
+    start = 0
+    while start < len(text):
+        # 先按纯英文估计长度，再逐步缩短到预算以内
+        end = min(len(text), start + max_tokens * 4)
+        while end - start > 1 and cjk_token_estimate(text[start:end]) > max_tokens:
+            end = start + (end - start) * 3 // 4
+        parts.append(text[start:end])
+        start = end
+    return parts
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    BM25使用的词项：小写的英文单词和数字，汉字的单字和相邻两字
+
+    Args:
+        text: 文本
+
+    Returns:
+        词项列表
+    """
+    text = text.lower()
+    terms = _WORD_PATTERN.findall(text)
+    for run in _CJK_RUN_PATTERN.findall(text):
+        terms.extend(run)
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+class Chunk:
+    """
+    网页内容的一个片段
+
+    Attributes:
+        url: 来源URL
+        position: 在来源网页中的序号
+        text: 片段内容
+    """
+
+    def __init__(self, url: str, position: int, text: str):
+        self.url = url
+        self.position = position
+        self.text = text
+
+    def __repr__(self):
+        return f"Chunk(url={self.url!r}, position={self.position})"
+
+
+class ContentIndex:
+    """
+    网页内容片段的BM25索引
+
+    用子主题检索最相关的片段；得分相同（包括完全没有词项重合）时，
+    靠前的片段优先，不同网页的片段轮流排列，检索结果因此会退化为各网页的开头。
+    检索不修改索引，多个子主题可以并发检索同一个索引。
+    """
+
+    def __init__(self, max_tokens: int = DEFAULT_CHUNK_TOKENS, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            max_tokens: 每个片段的token预算
+            k1: BM25词频饱和参数
+            b: BM25文档长度归一化参数
+        """
+        self.max_tokens = max_tokens
+        self.k1 = k1
+        self.b = b
+        self.chunks: List[Chunk] = []
+        self._term_counts: List[Counter] = []
+        self._lengths: List[int] = []
+        self._document_frequency: Counter = Counter()
+
+    @classmethod
+    def from_pages(cls, pages: Dict[str, str], max_tokens: int = DEFAULT_CHUNK_TOKENS) -> "ContentIndex":
+        """
+        从 {URL: 内容} 构建索引，内容为空的网页会被跳过
+
+        Args:
+            pages: {URL: 网页内容}
+            max_tokens: 每个片段的token预算
+
+        Returns:
+            ContentIndex
+        """
+        index = cls(max_tokens)
+        for url, content in pages.items():
+            if content:
+                index.add(url, content)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def add(self, url: str, content: str):
+        """
+        切分一个网页的内容并加入索引
+
+        Args:
+            url: 来源URL
+            content: 网页内容
+        """
+        for position, text in enumerate(split_chunks(content, self.max_tokens)):
+            terms = Counter(tokenize(text))
+            self.chunks.append(Chunk(url, position, text))
+            self._term_counts.append(terms)
+            self._lengths.append(sum(terms.values()))
+            self._document_frequency.update(terms.keys())
+
+    def search(self, query: str, top_k: int) -> List[Tuple[Chunk, float]]:
+        """
+        检索与查询最相关的片段
+
+        Args:
+            query: 查询文本，通常是子主题
+            top_k: 返回的片段数量上限
+
+        Returns:
+            按相关性从高到低排列的 (片段, BM25得分) 列表
+        """
+        if not self.chunks or top_k <= 0:
+            return []
+        query_terms = set(tokenize(query))
+        total = len(self.chunks)
+        average_length = sum(self._lengths) / total or 1
+        idf = {
+            term: math.log(1 + (total - self._document_frequency[term] + 0.5) / (self._document_frequency[term] + 0.5))
+            for term in query_terms if term in self._document_frequency
+        }
+
+        scores = []
+        for terms, length in zip(self._term_counts, self._lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / average_length)
+            for term, weight in idf.items():
+                frequency = terms.get(term, 0)
+                if frequency:
+                    score += weight * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+
+        ranked = sorted(range(total), key=lambda i: (-scores[i], self.chunks[i].position, i))
+        return [(self.chunks[i], scores[i]) for i in ranked[:top_k]]
+
+
+def spread_examples(num_examples: int, num_chunks: int) -> List[int]:
+    """
+    将示例数平均分配到片段上，余数分给排名靠前的片段
+
+    Args:
+        num_examples: 示例总数
+        num_chunks: 片段数量
+
+    Returns:
+        每个片段的示例数，不含0
+    """
+    if num_chunks <= 0:
+        return []
+    base, remainder = divmod(num_examples, num_chunks)
+    counts = [base + (1 if i < remainder else 0) for i in range(num_chunks)]
+    return [count for count in counts if count]
@@ -183,25 +183,50 @@ generated_answers = {}
 
 # ### Test Q&A
 
-# The script iterates through the questions, generates answers, and verifies their correctness.  The generated answers are stored in a dictionary
+# The script generates answers for all questions and verifies their correctness. `CoTPipelineRunner` (from `cot_runner.py` in this directory) runs generation and verification as two pools of worker threads connected by a bounded queue, so the answer to one question is verified while later questions are still being generated. Each worker gets its own `CoTDataGenerator`, because a `ChatAgent` keeps conversation state and cannot be shared between threads. The generated answers are stored in a dictionary in the original question order.
 
 # In[ ]:
 
 
+from cot_runner import CoTPipelineRunner
+
+def make_generator():
+    agent = ChatAgent(
+        system_message=sys_msg,
+        model=model,
+        message_window_size=10,
+    )
+    return CoTDataGenerator(agent, golden_answers=qa_data)
+
+def print_result(result):
+    print(f"Question: {result.question}")
+    if result.answer is not None:
+        print(f"AI's thought process and answer:\n{result.answer}")
+    if result.error is not None:
+        print(f"Error: {result.error}")
+    else:
+        print(f"Answer verification result: {'Correct' if result.is_correct else 'Incorrect'}")
+    print("-" * 50)
+    print()  # Add a new line at the end of each result
+
 # Test Q&A
-for question in qa_data.keys():
-    print(f"Question: {question}")
+runner = CoTPipelineRunner(make_generator, generate_workers=4, verify_workers=4)
+results = runner.run(qa_data.keys(), on_result=print_result)
+for result in results:
+    if result.answer is not None:
+        generated_answers[result.question] = result.answer
 
-    # Get AI's thought process and answer
-    answer = testo1.get_answer(question)
-    generated_answers[question] = answer
-    print(f"AI's thought process and answer:\n{answer}")
 
-    # Verify the answer
-    is_correct = testo1.verify_answer(question, answer)
-    print(f"Answer verification result: {'Correct' if is_correct else 'Incorrect'}")
-    print("-" * 50)
-    print()  # Add a new line at the end of each iteration
+# In[ ]:
+
+
+# Throughput and per-stage latency percentiles (seconds)
+report = runner.report()
+print(f"Questions: {report['questions']}, {report['questions_per_minute']:.1f} questions/min")
+print(f"Correct: {report['correct']}, Incorrect: {report['incorrect']}, Errors: {report['errors']}")
+for stage in ('generate_latency', 'verify_latency'):
+    latency = report[stage]
+    print(f"{stage}: p50={latency['p50']:.2f} p90={latency['p90']:.2f} p99={latency['p99']:.2f} max={latency['max']:.2f}")
 
 
 # ### Export the generated answers to a JSON file and transform these to Alpaca traing data format
@@ -222,38 +247,33 @@ with open(simplified_file, 'w', encoding='utf-8') as f:
 print(f"The generated answers have been exported to: {simplified_file}")
 
 
-# The script transforms the Q&A data into the Alpaca training data format, which is suitable for supervised fine-tuning (SFT). The transformed data is saved to a new JSON file.
+# The script transforms the Q&A data into the Alpaca training data format, which is suitable for supervised fine-tuning (SFT). The transformed data is saved to a new JSONL file, one record per line. `convert_to_alpaca` (from `alpaca_convert.py` in this directory) parses the `qa_pairs` object incrementally and writes each record as soon as it is read, so memory use stays constant however many CoT traces there are.
 
 # In[ ]:
 
 
-import json
 from datetime import datetime
+from alpaca_convert import convert_to_alpaca, iter_records
 
-def transform_qa_format(input_file):
-    # Read the input JSON file
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    # Transform the data
-    transformed_data = []
-    for question, answer in data['qa_pairs'].items():
-        transformed_pair = {
-            "instruction": question,
-            "input": "",
-            "output": answer
-        }
-        transformed_data.append(transformed_pair)
+class TransformedRecords:
+    """Re-iterable view of the records in a JSONL file, read lazily from disk."""
 
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        return iter_records(self.path)
+
+def transform_qa_format(input_file):
     # Generate output filename with timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = f'transformed_qa_{timestamp}.json'
+    output_file = f'transformed_qa_{timestamp}.jsonl'
 
-    # Write the transformed data
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(transformed_data, f, ensure_ascii=False, indent=2)
+    # Stream the Q&A pairs into Alpaca records
+    count = convert_to_alpaca(input_file, output_file)
+    print(f"Transformed {count} Q&A pairs")
 
-    return output_file, transformed_data
+    return output_file, TransformedRecords(output_file)
 
 
 # In[ ]:
@@ -263,6 +283,20 @@ output_file, transformed_data = transform_qa_format(simplified_file)
 print(f"Transformation complete. Output saved to: {output_file}")
 
 
+# The records can also be written as a local Parquet dataset: fixed-size shards plus a `manifest.json` with the schema, row counts and sha256 checksums. The training step can memory-map the shards directly with `load_dataset("parquet", data_files=data_files(shard_dir), split="train")`, without re-parsing JSON or going through the Hugging Face Hub. This needs `pyarrow` (`pip install pyarrow`).
+
+# In[ ]:
+
+
+from shard_writer import ShardWriter, data_files, verify_dataset
+
+shard_dir = os.path.splitext(output_file)[0] + '_parquet'
+with ShardWriter(shard_dir, rows_per_shard=50000, format="parquet") as writer:
+    writer.write_all(transformed_data)
+print(f"Wrote {writer.total_rows} rows in {len(writer.shards)} shards to: {shard_dir}")
+print(f"Checksum problems: {verify_dataset(shard_dir) or 'none'}")
+
+
 # ## Upload the Data to Huggingface
 
 # This defines a function upload_to_huggingface that uploads a dataset to Hugging Face. The script is modular, with helper functions handling specific tasks such as dataset name generation, dataset creation, metadata card creation, and record addition
@@ -526,6 +560,42 @@ from datasets import load_dataset
 dataset = load_dataset("zjrwtxtechstudio/o1data06", split = "train")
 dataset = dataset.map(formatting_prompts_func, batched = True,)
 
+# To format a local export offline instead, in constant memory:
+#   python alpaca_convert.py --input generated_answers_XXX.json --output train.jsonl \
+#       --template alpaca_prompt --eos_token "<EOS token of your tokenizer>"
+# then load it with load_dataset("json", data_files="train.jsonl", split="train"),
+# or write Parquet shards with `python shard_writer.py ... --template alpaca_prompt` and use
+# load_dataset("parquet", data_files=data_files(shard_dir), split="train")
+
+
+# ### Pack short samples into full-length sequences
+# With `packing = False` every sample is padded to `max_seq_length`, so short CoT samples waste most of the compute. `pack_texts` (from `sequence_packing.py` in this directory) tokenizes the formatted texts once, caches the token ids in `token_cache.jsonl`, and bin-packs the samples into `max_seq_length` sequences with first-fit-decreasing. `position_ids` restart at every sample and the first token of each sample gets no label, so no sample predicts the next one. The stored `attention_mask` only marks padding, though: to keep samples from attending to each other, train with `PackedDataCollator`, which builds a block-diagonal causal mask from `sequence_lengths` for eager/SDPA attention. With flash-attention-2 (which ignores 4D masks), use `transformers.DataCollatorWithFlattening` instead. The packed dataset is written as Parquet shards for reuse; the trainer setup for it is shown in the comment at the end of the next cell.
+
+# In[ ]:
+
+
+from sequence_packing import pack_texts, format_padding_report
+from shard_writer import data_files
+
+packed_dir = "packed_sft_data"
+if not os.path.exists(os.path.join(packed_dir, "manifest.json")):
+    packing = pack_texts(dataset["text"], tokenizer, max_seq_length, packed_dir, cache_path="token_cache.jsonl")
+    print(format_padding_report(packing))
+packed_dataset = load_dataset("parquet", data_files=data_files(packed_dir), split="train")
+
+# To train on the packed sequences, change the trainer below to:
+#   from sequence_packing import PackedDataCollator
+#   trainer = SFTTrainer(
+#       model = model,
+#       tokenizer = tokenizer,
+#       train_dataset = packed_dataset,
+#       data_collator = PackedDataCollator(tokenizer.pad_token_id,
+#                                          torch.bfloat16 if is_bfloat16_supported() else torch.float16),
+#       dataset_kwargs = {"skip_prepare_dataset": True},
+#       max_seq_length = max_seq_length,
+#       args = TrainingArguments(..., remove_unused_columns = False), # keep sequence_lengths for the collator
+#   )
+
 
 # <a name="Train"></a>
 # ### Train the model
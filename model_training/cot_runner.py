@@ -0,0 +1,179 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from stats_utils import percentile
+
+# 生成阶段结束后通知验证线程退出
+_DONE = object()
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """返回延迟（秒）的数量、平均值、p50、p90、p99和最大值"""
+    return {
+        "count": len(latencies),
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies, default=0.0),
+    }
+
+
+class CoTResult:
+    """
+    一个问题的生成和验证结果
+
+    Attributes:
+        index: 问题在输入中的序号
+        question: 问题
+        answer: 生成的思考过程和答案，生成失败时为None
+        is_correct: 验证结果，未验证或验证失败时为None
+        generate_latency: 生成耗时（秒）
+        verify_latency: 验证耗时（秒）
+        error: 生成或验证时的异常信息
+    """
+
+    def __init__(self, index: int, question: str):
+        self.index = index
+        self.question = question
+        self.answer: Optional[str] = None
+        self.is_correct: Optional[bool] = None
+        self.generate_latency = 0.0
+        self.verify_latency = 0.0
+        self.error: Optional[str] = None
+
+
+class CoTPipelineRunner:
+    """
+    流水线式批量运行CoTDataGenerator的生成和验证
+
+    生成和验证是两组独立的工作线程，中间用有界队列连接：第N个问题验证的同时，
+    生成线程已经在生成后面的问题。队列满时生成线程等待，内存中积压的答案数量有上限。
+    ChatAgent带有对话状态，不能在线程间共享，所以每个工作线程使用generator_factory
+    创建的独立的CoTDataGenerator，这些实例在启动线程前创建，创建失败时直接抛出异常。
+
+    用法：
+        runner = CoTPipelineRunner(lambda: CoTDataGenerator(ChatAgent(sys_msg, model=model),
+                                                            golden_answers=qa_data))
+        results = runner.run(qa_data.keys())
+        print(runner.report())
+    """
+
+    def __init__(self, generator_factory: Callable[[], Any], generate_workers: int = 4,
+                 verify_workers: int = 4, queue_size: Optional[int] = None):
+        """
+        Args:
+            generator_factory: 创建CoTDataGenerator（或任何有get_answer和verify_answer方法的对象）的函数
+            generate_workers: 同时生成答案的线程数
+            verify_workers: 同时验证答案的线程数
+            queue_size: 等待验证的答案数量上限，默认为验证线程数的2倍
+        """
+        if generate_workers < 1 or verify_workers < 1:
+            raise ValueError("generate_workers和verify_workers必须大于0")
+        self.generator_factory = generator_factory
+        self.generate_workers = generate_workers
+        self.verify_workers = verify_workers
+        self.queue_size = queue_size or 2 * verify_workers
+        self._lock = threading.Lock()
+        self._results: List[CoTResult] = []
+        self._elapsed = 0.0
+
+    def run(self, questions: Iterable[str],
+            on_result: Optional[Callable[[CoTResult], None]] = None) -> List[CoTResult]:
+        """
+        生成并验证所有问题的答案
+
+        Args:
+            questions: 问题列表
+            on_result: 每个问题验证完成后调用，调用之间互斥，可以直接打印结果
+
+        Returns:
+            按输入顺序排列的结果列表
+        """
+        pending = enumerate(questions)
+        verify_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        results: List[CoTResult] = []
+        started = time.perf_counter()
+
+        def next_question():
+            with self._lock:
+                return next(pending, None)
+
+        def generate_worker(generator):
+            while True:
+                item = next_question()
+                if item is None:
+                    return
+                result = CoTResult(*item)
+                t0 = time.perf_counter()
+                try:
+                    result.answer = generator.get_answer(result.question)
+                except Exception as e:
+                    result.error = f"生成失败: {e}"
+                result.generate_latency = time.perf_counter() - t0
+                verify_queue.put(result)
+
+        def verify_worker(generator):
+            while True:
+                result = verify_queue.get()
+                if result is _DONE:
+                    return
+                if result.answer is not None:
+                    t0 = time.perf_counter()
+                    try:
+                        result.is_correct = bool(generator.verify_answer(result.question, result.answer))
+                    except Exception as e:
+                        result.error = f"验证失败: {e}"
+                    result.verify_latency = time.perf_counter() - t0
+                with self._lock:
+                    results.append(result)
+                    if on_result is not None:
+                        try:
+                            on_result(result)
+                        except Exception as e:
+                            # 回调出错不能让验证线程退出，否则生成线程会一直等待队列
+                            print(f"on_result回调出错: {e}")
+
+        generators = [
+            threading.Thread(target=generate_worker, args=(self.generator_factory(),), daemon=True)
+            for _ in range(self.generate_workers)
+        ]
+        verifiers = [
+            threading.Thread(target=verify_worker, args=(self.generator_factory(),), daemon=True)
+            for _ in range(self.verify_workers)
+        ]
+        for thread in generators + verifiers:
+            thread.start()
+        for thread in generators:
+            thread.join()
+        for _ in verifiers:
+            verify_queue.put(_DONE)
+        for thread in verifiers:
+            thread.join()
+
+        self._elapsed = time.perf_counter() - started
+        results.sort(key=lambda r: r.index)
+        self._results = results
+        return results
+
+    def report(self) -> Dict[str, Any]:
+        """
+        返回最近一次运行的统计：每分钟处理的问题数、各阶段延迟的百分位数、正确和失败数量
+
+        Returns:
+            统计字典
+        """
+        results = self._results
+        generated = [r for r in results if r.answer is not None]
+        return {
+            "questions": len(results),
+            "elapsed": self._elapsed,
+            "questions_per_minute": len(results) / self._elapsed * 60 if self._elapsed else 0.0,
+            "correct": sum(r.is_correct is True for r in results),
+            "incorrect": sum(r.is_correct is False for r in results),
+            "errors": sum(r.error is not None for r in results),
+            "generate_latency": latency_summary([r.generate_latency for r in results]),
+            "verify_latency": latency_summary([r.verify_latency for r in generated]),
+        }
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote, unquote, urlparse
+
+# 缓存内容的默认有效期（秒）
+DEFAULT_CACHE_TTL = 7 * 24 * 3600
+# 命令行默认的缓存目录
+DEFAULT_CRAWL_CACHE_DIR = ".crawl_cache"
+
+
+class CrawlError(Exception):
+    """抓取没有完成或没有得到内容"""
+
+
+class FetchResult:
+    """
+    一次抓取的结果
+
+    Attributes:
+        content: 页面内容（markdown），not_modified为True时为None
+        etag: 内容版本标识，不支持时为None
+        not_modified: 内容与请求时提供的etag相同，没有重新下载
+    """
+
+    def __init__(self, content: Optional[str], etag: Optional[str] = None, not_modified: bool = False):
+        self.content = content
+        self.etag = etag
+        self.not_modified = not_modified
+
+
+class ContentFetcher(ABC):
+    """网页内容抓取接口，子类实现fetch"""
+
+    @abstractmethod
+    def fetch(self, url: str, etag: Optional[str] = None) -> FetchResult:
+        """
+        抓取URL的内容
+
+        Args:
+            url: 要抓取的URL
+            etag: 缓存中内容的版本标识，内容没有变化时实现可以返回not_modified
+
+        Returns:
+            FetchResult
+
+        Raises:
+            CrawlError: 抓取没有完成或没有得到内容
+        """
+
+
+class FirecrawlFetcher(ContentFetcher):
+    """通过Firecrawl抓取网页内容，Firecrawl不提供版本标识，每次都重新抓取"""
+
+    def __init__(self, firecrawl=None):
+        """
+        Args:
+            firecrawl: camel.loaders.Firecrawl实例，为None时新建一个
+        """
+        if firecrawl is None:
+            from camel.loaders import Firecrawl
+            firecrawl = Firecrawl()
+        self.firecrawl = firecrawl
+
+    def fetch(self, url: str, etag: Optional[str] = None) -> FetchResult:
+        response = self.firecrawl.crawl(url=url)
+        if response["status"] != "completed":
+            raise CrawlError(f"爬取状态为 {response['status']}")
+        if not response["data"] or not response["data"][0].get("markdown"):
+            raise CrawlError("爬取结果中没有内容")
+        return FetchResult(response["data"][0]["markdown"])
+
+
+class LocalFileFetcher(ContentFetcher):
+    """
+    从本地文件读取“网页”内容，用于测试和离线运行
+
+    file://开头的URL直接读取对应文件；其他URL读取root目录下以URL编码后的URL命名的文件，
+    如 https://example.com/a 对应 root/https%3A%2F%2Fexample.com%2Fa.md。
+    文件的修改时间和大小作为版本标识。
+    """
+
+    def __init__(self, root: str = "."):
+        """
+        Args:
+            root: 存放页面文件的目录
+        """
+        self.root = root
+
+    def path_for(self, url: str) -> str:
+        """返回URL对应的本地文件路径"""
+        parsed = urlparse(url)
+        if parsed.scheme == "file":
+            return unquote(parsed.path)
+        return os.path.join(self.root, quote(url, safe="") + ".md")
+
+    def fetch(self, url: str, etag: Optional[str] = None) -> FetchResult:
+        path = self.path_for(url)
+        stat = os.stat(path)
+        current = f"{stat.st_mtime_ns}-{stat.st_size}"
+        if etag == current:
+            return FetchResult(None, current, not_modified=True)
+        with open(path, "r", encoding="utf-8") as f:
+            return FetchResult(f.read(), current)
+
+
+class ContentCache:
+    """
+    以URL为键的页面内容缓存，每个URL保存为cache_dir下的一个JSON文件
+
+    cache_dir为None时只缓存在内存中。超过ttl的内容视为过期，过期内容的etag
+    用于下一次抓取时询问内容是否变化。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, ttl: float = DEFAULT_CACHE_TTL):
+        """
+        Args:
+            cache_dir: 缓存目录，为None时只缓存在内存中
+            ttl: 缓存内容的有效期（秒）
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._memory: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, url: str) -> Optional[Dict]:
+        """
+        读取URL的缓存条目
+
+        Returns:
+            {'url', 'content', 'etag', 'fetched_at'} 字典，没有缓存时为None
+        """
+        with self._lock:
+            entry = self._memory.get(url)
+        if entry is not None or not self.cache_dir:
+            return entry
+        path = self._path(url)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._memory[url] = entry
+        return entry
+
+    def is_fresh(self, entry: Dict) -> bool:
+        """缓存条目是否仍在有效期内"""
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def put(self, url: str, content: str, etag: Optional[str] = None) -> Dict:
+        """
+        写入URL的内容
+
+        Returns:
+            写入的缓存条目
+        """
+        entry = {"url": url, "content": content, "etag": etag, "fetched_at": time.time()}
+        with self._lock:
+            self._memory[url] = entry
+        if self.cache_dir:
+            # 先写临时文件再替换，并发写同一个URL时不会留下写了一半的文件
+            path = self._path(url)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        return entry
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+
+class CrawlPrefetcher:
+    """
+    并发抓取一组URL，结果写入ContentCache
+
+    相同的URL只抓取一次；同一主机同时进行的抓取数不超过per_host_limit。
+    有效期内的缓存直接使用；过期的缓存带上etag重新抓取，内容没有变化时只刷新时间。
+    抓取失败或没有得到内容时使用过期的缓存内容，没有缓存时返回空字符串；
+    失败的结果不写入缓存，下一次运行会重新抓取。
+    stats记录最近一次prefetch调用中各类结果的数量。
+    """
+
+    def __init__(self, fetcher: ContentFetcher, cache: Optional[ContentCache] = None,
+                 max_workers: int = 8, per_host_limit: int = 2):
+        """
+        Args:
+            fetcher: 网页内容抓取器
+            cache: 内容缓存，为None时使用只在内存中的缓存
+            max_workers: 同时抓取的URL数量上限
+            per_host_limit: 同一主机同时抓取的URL数量上限
+        """
+        if max_workers < 1 or per_host_limit < 1:
+            raise ValueError("max_workers和per_host_limit必须大于0")
+        self.fetcher = fetcher
+        self.cache = cache if cache is not None else ContentCache()
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self._host_limits: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+        self.stats = {"cache_hits": 0, "fetched": 0, "not_modified": 0, "failed": 0}
+
+    def get(self, url: str) -> str:
+        """
+        获取单个URL的内容，优先使用缓存
+
+        Args:
+            url: URL
+
+        Returns:
+            页面内容，抓取失败且没有缓存时为空字符串
+        """
+        entry = self.cache.get(url)
+        if entry is not None and not entry["content"]:
+            # 旧版本缓存的空内容，当作没有缓存
+            entry = None
+        if entry is not None and self.cache.is_fresh(entry):
+            self._count("cache_hits")
+            return entry["content"]
+
+        try:
+            with self._host_limit(url):
+                result = self.fetcher.fetch(url, entry["etag"] if entry else None)
+        except Exception as e:
+            print(f"爬取URL {url} 时出错: {e}")
+            self._count("failed")
+            return entry["content"] if entry else ""
+
+        if result.not_modified and entry is not None:
+            self._count("not_modified")
+            return self.cache.put(url, entry["content"], result.etag or entry["etag"])["content"]
+        if not result.content:
+            print(f"爬取URL {url} 没有得到内容")
+            self._count("failed")
+            return entry["content"] if entry else ""
+        self._count("fetched")
+        return self.cache.put(url, result.content, result.etag)["content"]
+
+    def prefetch(self, urls: Iterable[str]) -> Dict[str, str]:
+        """
+        并发获取一组URL的内容
+
+        Args:
+            urls: URL列表，可以有重复
+
+        Returns:
+            {URL: 页面内容}，按URL第一次出现的顺序排列
+        """
+        with self._lock:
+            self.stats = dict.fromkeys(self.stats, 0)
+        unique_urls = list(dict.fromkeys(urls))
+        if not unique_urls:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique_urls))) as executor:
+            contents = list(executor.map(self.get, unique_urls))
+        return dict(zip(unique_urls, contents))
+
+    def _host_limit(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.Semaphore(self.per_host_limit)
+            return self._host_limits[host]
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+# 默认的主题分解缓存文件
+DEFAULT_DECOMPOSE_CACHE = ".decompose_cache.json"
+
+
+class DecompositionCache:
+    """
+    主题分解结果的持久化缓存
+
+    以 (主题, 子主题数量, 模型, 温度) 为键，保存在一个JSON文件中，
+    基础型和网页增强型pipeline共用。同一主题重复运行时直接使用缓存的子主题，不再调用模型。
+    """
+
+    def __init__(self, path: str = DEFAULT_DECOMPOSE_CACHE):
+        """
+        Args:
+            path: 缓存文件路径
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(main_topic: str, num_subtopics: int, model: str, temperature: float) -> str:
+        """返回缓存键"""
+        return json.dumps([main_topic, num_subtopics, model, temperature], ensure_ascii=False)
+
+    def get(self, main_topic: str, num_subtopics: int, model: str, temperature: float) -> Optional[List[str]]:
+        """
+        读取缓存的子主题列表
+
+        Returns:
+            子主题列表，没有缓存时为None
+        """
+        with self._lock:
+            entry = self._load().get(self.key(main_topic, num_subtopics, model, temperature))
+        return list(entry["subtopics"]) if entry else None
+
+    def put(self, main_topic: str, num_subtopics: int, model: str, temperature: float, subtopics: List[str]):
+        """
+        写入子主题列表，已有的缓存会被覆盖
+
+        Args:
+            main_topic: 主要主题
+            num_subtopics: 子主题数量
+            model: 模型名称
+            temperature: 模型温度参数
+            subtopics: 子主题列表
+        """
+        with self._lock:
+            # 写入前重新读取文件，保留其他进程同时写入的条目
+            entries = self._load()
+            entries[self.key(main_topic, num_subtopics, model, temperature)] = {
+                "subtopics": list(subtopics),
+                "created_at": time.time(),
+            }
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 先写临时文件再替换，中断时不会留下写了一半的缓存文件
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
@@ -1,10 +1,18 @@
 #!/usr/bin/env python
 import argparse
+import asyncio
 import os
 import json
+import time
 from typing import Dict, Any, List
 
-from synthetic_data_pipeline import SyntheticDataPipeline
+from content_index import DEFAULT_CHUNK_TOKENS
+from crawl_cache import DEFAULT_CACHE_TTL, DEFAULT_CRAWL_CACHE_DIR, LocalFileFetcher
+from decompose_cache import DEFAULT_DECOMPOSE_CACHE, DecompositionCache
+from run_checkpoint import RunCheckpoint
+from run_report import format_run_report
+from synthetic_data_pipeline import SyntheticDataPipeline, load_few_shot_examples
+from topup import DEFAULT_MAX_BATCH_SIZE
 from web_enhanced_data_pipeline import WebEnhancedDataPipeline
 
 def display_banner():
@@ -22,7 +30,8 @@ def write_metadata(
     args: Dict[str, Any], 
     total_examples: int, 
     subtopics_info: Dict[str, int],
-    used_urls: List[str] = None
+    used_urls: List[str] = None,
+    run_report: Dict[str, Any] = None
 ) -> None:
     """
     写入元数据文件，记录生成数据的相关信息
@@ -33,6 +42,7 @@ def write_metadata(
         total_examples: 生成的总示例数
         subtopics_info: 每个子主题生成的示例数统计
         used_urls: 使用的URL列表
+        run_report: pipeline.run_report()返回的运行报告（每个子主题的调用次数、token用量、耗时等）
     """
     metadata = {
         "main_topic": args.topic,
@@ -47,6 +57,9 @@ def write_metadata(
     if used_urls:
         metadata["used_urls"] = used_urls
     
+    if run_report:
+        metadata["run_report"] = run_report
+    
     metadata_file = f"{os.path.splitext(output_file)[0]}_metadata.json"
     with open(metadata_file, 'w', encoding='utf-8') as f:
         json.dump(metadata, f, ensure_ascii=False, indent=2)
@@ -67,6 +80,27 @@ def load_urls_from_file(file_path: str) -> List[str]:
         urls = [line.strip() for line in f if line.strip() and line.strip().startswith('http')]
     return urls
 
+def finish_run_dir(args, pipeline: SyntheticDataPipeline, checkpoint: RunCheckpoint, started: float,
+                   used_urls: List[str] = None) -> None:
+    """
+    从运行目录导出数据，打印运行报告并写入元数据
+    
+    Args:
+        args: 命令行参数
+        pipeline: 完成生成的pipeline
+        checkpoint: generate_to_run_dir返回的RunCheckpoint
+        started: 开始生成的时间（time.perf_counter）
+        used_urls: 使用的URL列表
+    """
+    # 数据已在运行目录中，逐条导出，不在内存中构造完整的字典
+    total = checkpoint.export_json(args.output)
+    print(f"成功生成 {total} 个数据样本")
+    print(f"数据已保存到: {args.output}")
+    run_report = pipeline.run_report(time.perf_counter() - started)
+    print(format_run_report(run_report))
+    write_metadata(args.output, args, total, checkpoint.completed(), used_urls or None, run_report=run_report)
+    print("数据生成完成!")
+
 def main():
     parser = argparse.ArgumentParser(description="自动合成数据生成工具")
     parser.add_argument("--topic", type=str, required=True, help="要生成数据的主题")
@@ -79,8 +113,30 @@ def main():
     parser.add_argument("--verbose", action="store_true", help="显示详细日志")
     parser.add_argument("--urls", type=str, nargs='+', help="要爬取的URL列表")
     parser.add_argument("--url_file", type=str, help="包含URL列表的文件路径")
+    parser.add_argument("--concurrency", type=int, default=1, help="同时生成的子主题数量（基础型pipeline，或指定--run_dir时）")
+    parser.add_argument("--requests_per_minute", type=float, default=None, help="每分钟最多调用模型的次数")
+    parser.add_argument("--stateless", action="store_true", help="每次调用不携带对话历史，提示词大小保持不变")
+    parser.add_argument("--few_shot_file", type=str, default=None, help="示例问题-答案对JSON文件，附加到系统提示词中")
+    parser.add_argument("--run_dir", type=str, default=None, help="运行目录，边生成边写入，中断后可以继续")
+    parser.add_argument("--resume", action="store_true", help="继续--run_dir中未完成的运行")
+    parser.add_argument("--max_attempts", type=int, default=None, help="每个子主题最多调用模型的次数，默认按示例数量自动计算")
+    parser.add_argument("--max_batch_size", type=int, default=DEFAULT_MAX_BATCH_SIZE, help="每次调用最多要求生成的示例数")
+    parser.add_argument("--dedup_threshold", type=float, default=0.8, help="近似重复问题的相似度阈值")
+    parser.add_argument("--no_dedup", action="store_true", help="只丢弃文本完全相同的问题，不检查近似重复")
+    parser.add_argument("--decompose_cache", type=str, default=DEFAULT_DECOMPOSE_CACHE, help="主题分解结果的缓存文件")
+    parser.add_argument("--no_decompose_cache", action="store_true", help="不使用主题分解缓存")
+    parser.add_argument("--refresh_subtopics", action="store_true", help="忽略缓存的主题分解结果，重新分解主题")
+    parser.add_argument("--crawl_cache_dir", type=str, default=DEFAULT_CRAWL_CACHE_DIR, help="网页内容缓存目录")
+    parser.add_argument("--crawl_cache_ttl", type=float, default=DEFAULT_CACHE_TTL, help="网页内容缓存的有效期（秒）")
+    parser.add_argument("--crawl_workers", type=int, default=8, help="同时爬取的URL数量")
+    parser.add_argument("--per_host_limit", type=int, default=2, help="同一网站同时爬取的URL数量")
+    parser.add_argument("--chunk_tokens", type=int, default=DEFAULT_CHUNK_TOKENS, help="网页内容切分后每个片段的token预算")
+    parser.add_argument("--chunks_per_subtopic", type=int, default=5, help="每个子主题最多使用的相关网页片段数")
+    parser.add_argument("--local_pages_dir", type=str, default=None, help="从本地目录读取网页内容而不是使用Firecrawl（测试或离线运行）")
     
     args = parser.parse_args()
+    if args.resume and not args.run_dir:
+        parser.error("--resume 需要同时指定 --run_dir")
     
     display_banner()
     
@@ -108,11 +164,45 @@ def main():
     if args.web_enabled and urls:
         print(f"将使用 {len(urls)} 个URL进行内容增强")
     print("开始生成数据...")
+    started = time.perf_counter()
+    
+    few_shot_examples = load_few_shot_examples(args.few_shot_file)
+    decompose_cache = None if args.no_decompose_cache else DecompositionCache(args.decompose_cache)
     
     # 根据参数选择合适的pipeline
     if args.web_enabled:
         print("使用网页增强型pipeline...")
-        pipeline = WebEnhancedDataPipeline(temperature=args.temperature, api_key=args.api_key)
+        pipeline = WebEnhancedDataPipeline(
+            temperature=args.temperature,
+            api_key=args.api_key,
+            requests_per_minute=args.requests_per_minute,
+            stateless=args.stateless,
+            few_shot_examples=few_shot_examples,
+            max_attempts=args.max_attempts,
+            max_batch_size=args.max_batch_size,
+            dedup_threshold=None if args.no_dedup else args.dedup_threshold,
+            decompose_cache=decompose_cache,
+            refresh_subtopics=args.refresh_subtopics,
+            fetcher=LocalFileFetcher(args.local_pages_dir) if args.local_pages_dir else None,
+            crawl_cache_dir=args.crawl_cache_dir,
+            crawl_cache_ttl=args.crawl_cache_ttl,
+            crawl_workers=args.crawl_workers,
+            per_host_limit=args.per_host_limit,
+            chunk_tokens=args.chunk_tokens,
+            chunks_per_subtopic=args.chunks_per_subtopic
+        )
+        if args.run_dir:
+            checkpoint = pipeline.generate_to_run_dir(
+                main_topic=args.topic,
+                total_examples=args.num_examples,
+                run_dir=args.run_dir,
+                num_subtopics=args.num_subtopics,
+                resume=args.resume,
+                concurrency=args.concurrency,
+                urls=urls
+            )
+            finish_run_dir(args, pipeline, checkpoint, started, urls)
+            return
         data = pipeline.generate_synthetic_data(
             main_topic=args.topic,
             total_examples=args.num_examples,
@@ -122,12 +212,42 @@ def main():
         )
     else:
         print("使用基础型pipeline...")
-        pipeline = SyntheticDataPipeline(temperature=args.temperature, api_key=args.api_key)
-        data = pipeline.generate_synthetic_data(
-            main_topic=args.topic,
-            total_examples=args.num_examples,
-            num_subtopics=args.num_subtopics
+        pipeline = SyntheticDataPipeline(
+            temperature=args.temperature,
+            api_key=args.api_key,
+            requests_per_minute=args.requests_per_minute,
+            stateless=args.stateless,
+            few_shot_examples=few_shot_examples,
+            max_attempts=args.max_attempts,
+            max_batch_size=args.max_batch_size,
+            dedup_threshold=None if args.no_dedup else args.dedup_threshold,
+            decompose_cache=decompose_cache,
+            refresh_subtopics=args.refresh_subtopics
         )
+        if args.run_dir:
+            checkpoint = pipeline.generate_to_run_dir(
+                main_topic=args.topic,
+                total_examples=args.num_examples,
+                run_dir=args.run_dir,
+                num_subtopics=args.num_subtopics,
+                resume=args.resume,
+                concurrency=args.concurrency
+            )
+            finish_run_dir(args, pipeline, checkpoint, started)
+            return
+        elif args.concurrency > 1:
+            data = asyncio.run(pipeline.generate_synthetic_data_async(
+                main_topic=args.topic,
+                total_examples=args.num_examples,
+                num_subtopics=args.num_subtopics,
+                concurrency=args.concurrency
+            ))
+        else:
+            data = pipeline.generate_synthetic_data(
+                main_topic=args.topic,
+                total_examples=args.num_examples,
+                num_subtopics=args.num_subtopics
+            )
     
     # 保存数据
     with open(args.output, 'w', encoding='utf-8') as f:
@@ -136,12 +256,13 @@ def main():
     print(f"成功生成 {len(data)} 个数据样本")
     print(f"数据已保存到: {args.output}")
     
-    # 示例统计子主题数据分布（实际项目中需要从pipeline中获取真实子主题信息）
-    # 这里仅做示例，实际使用时需要修改
-    subtopics_info = {f"子主题_{i+1}": args.num_examples // args.num_subtopics for i in range(args.num_subtopics)}
+    # 每个子主题实际生成的示例数
+    subtopics_info = {subtopic: stats["examples"] for subtopic, stats in pipeline.subtopic_stats.items()}
     
     # 写入元数据
-    write_metadata(args.output, args, len(data), subtopics_info, urls if urls else None)
+    run_report = pipeline.run_report(time.perf_counter() - started)
+    print(format_run_report(run_report))
+    write_metadata(args.output, args, len(data), subtopics_info, urls if urls else None, run_report=run_report)
     
     print("数据生成完成!")
 
@@ -0,0 +1,372 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# 字符串中需要检查的字符：结尾的引号和转义用的反斜杠
+_STRING_SCAN_PATTERN = re.compile(r'["\\]')
+# 转义序列：\uXXXX、反斜杠后的整个英文单词，或其他单个字符
+_ESCAPE_PATTERN = re.compile(r'\\(u[0-9a-fA-F]{4}|[a-zA-Z]+|.)', re.S)
+# 字符串值损坏（如答案中含有未转义的引号）时，跳到下一个看起来像字符串结尾的位置
+_STRING_END_PATTERN = re.compile(r'"\s*(?=[,}])')
+_SURROGATE_PATTERN = re.compile('[\ud800-\udfff]')
+
+_SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'n': '\n', 't': '\t', 'r': '\r'}
+# 以n、t、r开头的常见LaTeX命令：模型没有把反斜杠转义时，在含有$的字符串中不把它们当成换行符、制表符
+_LATEX_COMMANDS = frozenset([
+    'neq', 'ne', 'nu', 'nabla', 'not', 'neg', 'ni', 'nmid', 'newline',
+    'times', 'theta', 'tan', 'tanh', 'tau', 'text', 'textbf', 'textit', 'textrm', 'tfrac', 'to', 'top',
+    'triangle', 'tilde', 'right', 'rho', 'rangle', 'rceil', 'rfloor', 'rightarrow', 'rm',
+])
+_WHITESPACE = ' \t\r\n'
+# 允许字符串中直接出现换行符等控制字符，其余与json.loads相同
+_JSON_DECODER = json.JSONDecoder(strict=False)
+
+_SEEK, _KEY, _COLON, _VALUE, _AFTER = range(5)
+
+
+def _scan_string(buffer: str, position: int) -> Tuple[Optional[int], int]:
+    """
+    从position开始查找JSON字符串的结尾引号，position应在开头引号之后
+
+    Returns:
+        (结尾引号之后的位置, None表示字符串还不完整; 下次可以继续查找的位置)
+    """
+    length = len(buffer)
+    while True:
+        match = _STRING_SCAN_PATTERN.search(buffer, position)
+        if match is None:
+            return None, length
+        position = match.start()
+        if buffer[position] == '"':
+            return position + 1, position + 1
+        if position + 1 >= length:
+            # 缓冲区以反斜杠结束，转义的字符还没有到
+            return None, position
+        position += 2
+
+
+def _replace_escape(match, math: bool) -> str:
+    escape = match.group(1)
+    if len(escape) == 5 and escape[0] == 'u':
+        try:
+            return chr(int(escape[1:], 16))
+        except ValueError:
+            pass
+    if escape[0].isalpha():
+        # \b、\f和非法转义（如\frac、\beta、\left）按原样保留，多为没有转义的LaTeX命令
+        if escape[0] not in 'ntr' or (math and escape in _LATEX_COMMANDS):
+            return '\\' + escape
+        return _SIMPLE_ESCAPES[escape[0]] + escape[1:]
+    return _SIMPLE_ESCAPES.get(escape, '\\' + escape)
+
+
+def decode_json_string(raw: str) -> str:
+    """
+    解码JSON字符串的内容（不含两侧引号），容忍模型输出中常见的错误
+
+    合法的JSON字符串按json.loads解码（字符串中直接出现的换行符等控制字符也允许），
+    结果与json.dump写出的内容一致。只有解码失败时（通常是没有转义的LaTeX命令，
+    如\\sqrt、\\left）才按容错规则解码：非法转义和LaTeX命令原样保留反斜杠，
+    \\n、\\t、\\r开头的LaTeX命令（如\\neq、\\times、\\right）只在含有$的字符串中识别，
+    避免误伤普通的换行
+
+    Args:
+        raw: 引号之间的原始文本
+
+    Returns:
+        解码后的字符串
+    """
+    if '\\' not in raw:
+        return raw
+    try:
+        return _JSON_DECODER.decode('"' + raw + '"')
+    except ValueError:
+        pass
+    math = '$' in raw
+    text = _ESCAPE_PATTERN.sub(lambda match: _replace_escape(match, math), raw)
+    if _SURROGATE_PATTERN.search(text):
+        # 合并\uXXXX形式的代理对
+        text = text.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+    return text
+
+
+class ParseReport:
+    """
+    一次解析的统计
+
+    Attributes:
+        pairs: 解析出的完整问题-答案对数量
+        lost: 已经开始但无法解析的问题-答案对数量（格式错误或被截断）
+        objects: 遇到的JSON对象数量
+        truncated: 输出是否在JSON对象内部结束（通常是达到了最大token数）
+    """
+
+    def __init__(self):
+        self.pairs = 0
+        self.lost = 0
+        self.objects = 0
+        self.truncated = False
+
+    @property
+    def failed(self) -> bool:
+        """没有解析出任何问题-答案对，且输出中没有JSON对象、有无法解析的内容或被截断"""
+        return self.pairs == 0 and (self.lost > 0 or self.objects == 0 or self.truncated)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"pairs": self.pairs, "lost": self.lost, "objects": self.objects, "truncated": self.truncated}
+
+    def __repr__(self):
+        return (f"ParseReport(pairs={self.pairs}, lost={self.lost}, objects={self.objects}, "
+                f"truncated={self.truncated})")
+
+
+class QAStreamParser:
+    """
+    从模型输出中增量提取 "问题": "答案" 形式的问题-答案对
+
+    可以逐块喂入流式输出，每块返回其中新完成的问题-答案对，不必等模型输出结束。
+    JSON对象前后的说明文字和```json代码块标记会被忽略；单个格式错误的问题-答案对
+    只丢弃它自己，之前已经完整的问题-答案对都会保留，被截断的输出也是如此。
+
+    用法：
+        parser = QAStreamParser()
+        for chunk in chunks:
+            for question, answer in parser.feed(chunk):
+                ...
+        remaining = parser.close()
+        print(parser.report)
+    """
+
+    def __init__(self, max_objects: Optional[int] = None):
+        """
+        Args:
+            max_objects: 最多解析的JSON对象数量，达到后忽略之后的所有输出；None表示不限制
+        """
+        self.max_objects = max_objects
+        self.report = ParseReport()
+        self._buffer = ''
+        self._state = _SEEK
+        self._key: Optional[str] = None
+        # 已经读完但还没确认后面格式正确的问题-答案对
+        self._pending: Optional[Tuple[str, Any]] = None
+        # 缓冲区开头的值还不完整时，已经检查过的位置和扫描状态，下次从这里继续，
+        # 分成很多小块喂入的长答案不会被反复从头扫描
+        self._scan_position = 0
+        self._scan_depth = 0
+        self._scan_in_string = False
+        # 正在跳过损坏的字符串值
+        self._skipping = False
+
+    @property
+    def finished(self) -> bool:
+        """是否已经解析完max_objects个JSON对象"""
+        return (self.max_objects is not None and self.report.objects >= self.max_objects
+                and self._state == _SEEK)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        喂入一段输出
+
+        Args:
+            chunk: 新的一段输出
+
+        Returns:
+            本段中新完成的 (问题, 答案) 列表
+        """
+        self._buffer += chunk
+        pairs = []
+        position = self._parse(pairs)
+        self._buffer = self._buffer[position:]
+        self._scan_position = max(self._scan_position - position, 0)
+        return pairs
+
+    def close(self) -> List[Tuple[str, Any]]:
+        """
+        结束解析，统计被截断的问题-答案对
+
+        Returns:
+            结束时才确认的 (问题, 答案) 列表
+        """
+        pairs = []
+        if self._state == _VALUE and self._buffer.strip()[:1] not in ('', '"'):
+            # 输出恰好在数字等非字符串值之后结束
+            try:
+                self._pending = (self._key, json.loads(self._buffer))
+                self._state = _AFTER
+            except ValueError:
+                pass
+        if self._pending is not None:
+            # 值已经完整，只是后面的逗号或右括号被截断
+            self._emit(pairs)
+        if self._state in (_COLON, _VALUE) or (self._state == _KEY and '"' in self._buffer):
+            self.report.lost += 1
+        self.report.truncated = self._state != _SEEK
+        self._buffer = ''
+        self._state = _SEEK
+        self._key = None
+        self._reset_scan()
+        self._skipping = False
+        return pairs
+
+    def _emit(self, pairs: List[Tuple[str, Any]]):
+        pairs.append(self._pending)
+        self._pending = None
+        self.report.pairs += 1
+
+    def _reset_scan(self):
+        self._scan_position = 0
+        self._scan_depth = 0
+        self._scan_in_string = False
+
+    def _string_end(self, buffer: str, position: int) -> Optional[int]:
+        """找到position处开始的字符串的结尾，还不完整时返回None并记住检查到的位置"""
+        end, self._scan_position = _scan_string(buffer, max(position + 1, self._scan_position))
+        if end is not None:
+            self._reset_scan()
+        return end
+
+    def _parse(self, pairs: List[Tuple[str, Any]]) -> int:
+        """尽可能解析缓冲区，返回第一个还不能解析的字符位置"""
+        buffer = self._buffer
+        length = len(buffer)
+        position = 0
+        while True:
+            if self._state == _SEEK:
+                if self.finished:
+                    return length
+                start = buffer.find('{', position)
+                if start == -1:
+                    return length
+                self.report.objects += 1
+                self._state = _KEY
+                position = start + 1
+
+            while position < length and buffer[position] in _WHITESPACE:
+                position += 1
+            if position >= length:
+                return position
+            char = buffer[position]
+
+            if self._state == _KEY:
+                if char == '"':
+                    end = self._string_end(buffer, position)
+                    if end is None:
+                        return position
+                    self._key = decode_json_string(buffer[position + 1:end - 1])
+                    self._state = _COLON
+                    position = end
+                elif char == '}':
+                    self._state = _SEEK
+                    position += 1
+                else:
+                    # 逗号或无法识别的字符
+                    position += 1
+
+            elif self._state == _COLON:
+                if char == ':':
+                    self._state = _VALUE
+                    position += 1
+                else:
+                    # 键后面没有冒号，丢弃这个键，从当前字符重新开始找下一个键
+                    self.report.lost += 1
+                    self._key = None
+                    self._state = _KEY
+
+            elif self._state == _VALUE:
+                if char == '"':
+                    end = self._string_end(buffer, position)
+                    if end is None:
+                        return position
+                    self._pending = (self._key, decode_json_string(buffer[position + 1:end - 1]))
+                    position = end
+                else:
+                    end = self._scan_value(buffer, position)
+                    if end is None:
+                        return position
+                    try:
+                        self._pending = (self._key, json.loads(buffer[position:end]))
+                    except ValueError:
+                        self.report.lost += 1
+                    position = end
+                self._key = None
+                self._state = _AFTER
+
+            elif self._state == _AFTER:
+                if self._skipping or (self._pending is not None and char not in ',}"'):
+                    # 字符串值后面紧跟着其他字符，说明值中有未转义的引号，丢弃这一对并跳到值的真正结尾
+                    if self._pending is not None:
+                        self._pending = None
+                        self.report.lost += 1
+                    self._skipping = True
+                    match = _STRING_END_PATTERN.search(buffer, max(position, self._scan_position))
+                    if match is None:
+                        # 结尾的引号和空白后面可能还会出现逗号或右括号，下次从引号开始找
+                        rest = buffer.rstrip()
+                        quote = len(rest) - 1 if rest.endswith('"') else len(buffer)
+                        self._scan_position = max(quote, position)
+                        return position
+                    self._skipping = False
+                    self._reset_scan()
+                    position = match.end()
+                elif char in ',}"':
+                    if self._pending is not None:
+                        self._emit(pairs)
+                    if char == ',':
+                        self._state = _KEY
+                        position += 1
+                    elif char == '}':
+                        self._state = _SEEK
+                        position += 1
+                    else:
+                        # 两个问题-答案对之间缺少逗号
+                        self._state = _KEY
+                else:
+                    position += 1
+
+    def _scan_value(self, buffer: str, position: int) -> Optional[int]:
+        """找到非字符串值的结尾（同层的逗号、右括号或换行），值还不完整时返回None并记住扫描状态"""
+        depth = self._scan_depth
+        in_string = self._scan_in_string
+        position = max(position, self._scan_position)
+        length = len(buffer)
+        while True:
+            if in_string:
+                end, position = _scan_string(buffer, position)
+                if end is None:
+                    break
+                in_string = False
+                continue
+            if position >= length:
+                break
+            char = buffer[position]
+            if char == '"':
+                in_string = True
+            elif char in '[{':
+                depth += 1
+            elif char in ']}':
+                if depth == 0:
+                    self._reset_scan()
+                    return position
+                depth -= 1
+            elif char in ',\n' and depth == 0:
+                self._reset_scan()
+                return position
+            position += 1
+        self._scan_position, self._scan_depth, self._scan_in_string = position, depth, in_string
+        return None
+
+
+def parse_qa_pairs(content: str) -> Tuple[Dict[str, Any], ParseReport]:
+    """
+    从完整的模型输出中提取问题-答案对
+
+    Args:
+        content: 模型输出
+
+    Returns:
+        (问题-答案对字典, 解析统计)
+    """
+    parser = QAStreamParser()
+    pairs = parser.feed(content)
+    pairs.extend(parser.close())
+    return dict(pairs), parser.report
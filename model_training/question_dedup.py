@@ -0,0 +1,158 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from array import array
+from typing import Any, Dict, Optional
+
+# MinHash签名与text_segment/dedup.py的分段去重共用同一个实现
+from text_segment.minhash import MinHasher
+
+DUPLICATE = 'duplicate'
+NEAR_DUPLICATE = 'near_duplicate'
+NEW = 'new'
+
+# 不影响题意的LaTeX排版命令：\left、\right、\big等定界符大小，\,、\;、\!等间距
+_LATEX_LAYOUT_PATTERN = re.compile(r'\\(?:left|right|[bB]igg?[lr]?|displaystyle|limits)(?![a-zA-Z])|\\[,;:! ]')
+_LATEX_ALIASES = (
+    (re.compile(r'\\[dt]frac(?![a-zA-Z])'), r'\\frac'),
+    (re.compile(r'\\leq(?![a-zA-Z])'), r'\\le'),
+    (re.compile(r'\\geq(?![a-zA-Z])'), r'\\ge'),
+    (re.compile(r'\\neq(?![a-zA-Z])'), r'\\ne'),
+)
+# 数学公式定界符：$、$$、\(、\)、\[、\]
+_MATH_DELIMITER_PATTERN = re.compile(r'\$+|\\[()\[\]]')
+# 空白和句读标点，数学符号（+、-、=、^、括号等）保留
+_IGNORED_PATTERN = re.compile(r'[\s,.;:!?，。；：！？、"\'“”‘’`]+')
+
+
+def normalize_question(question: str) -> str:
+    """
+    规范化问题文本，使只在LaTeX排版、空白、标点或大小写上不同的问题完全相同
+
+    Args:
+        question: 问题文本
+
+    Returns:
+        规范化后的文本
+    """
+    text = unicodedata.normalize('NFKC', question)
+    text = _LATEX_LAYOUT_PATTERN.sub('', text)
+    for pattern, replacement in _LATEX_ALIASES:
+        text = pattern.sub(replacement, text)
+    text = _MATH_DELIMITER_PATTERN.sub('', text)
+    return _IGNORED_PATTERN.sub('', text).lower()
+
+
+class QuestionDeduplicator:
+    """
+    合成数据的问题去重索引
+
+    规范化后完全相同的问题视为重复；规范化文本的字符shingle的MinHash签名估计的
+    Jaccard相似度不低于threshold的问题视为近似重复（措辞稍有不同的改写），
+    候选问题通过签名分段的LSH桶查找。check是线程安全的，多个子主题并发生成时共用一个索引。
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16, shingle_size: int = 4):
+        """
+        Args:
+            threshold: 近似重复的最低估计Jaccard相似度
+            num_perm: MinHash排列数
+            bands: LSH分段数，必须整除num_perm
+            shingle_size: 字符shingle长度
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold必须在(0, 1]之间")
+        if num_perm <= 0 or bands <= 0 or num_perm % bands:
+            raise ValueError("bands必须整除num_perm")
+        if shingle_size <= 0:
+            raise ValueError("shingle_size必须大于0")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self._minhash = MinHasher(num_perm, bands, shingle_size)
+
+        # 规范化文本的哈希 -> MinHash签名（短于一个shingle的问题为None）
+        self._signatures: Dict[str, Optional[array]] = {}
+        # (分段序号, 分段内容) -> 落在该桶中的问题哈希列表
+        self._buckets: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        self.stats = {'checked': 0, 'duplicates': 0, 'near_duplicates': 0}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def check(self, question: str) -> str:
+        """
+        检查问题是否与索引中的问题重复，不重复时加入索引
+
+        Args:
+            question: 问题文本
+
+        Returns:
+            NEW、DUPLICATE 或 NEAR_DUPLICATE
+        """
+        normalized = normalize_question(question)
+        key = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        signature = self._minhash.signature(normalized)
+        band_keys = self._minhash.band_keys(signature) if signature is not None else []
+
+        with self._lock:
+            self.stats['checked'] += 1
+            if key in self._signatures:
+                self.stats['duplicates'] += 1
+                return DUPLICATE
+            if self._has_near_duplicate(signature, band_keys):
+                self.stats['near_duplicates'] += 1
+                return NEAR_DUPLICATE
+            self._signatures[key] = signature
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, []).append(key)
+            return NEW
+
+    def _has_near_duplicate(self, signature: Optional[array], band_keys: list) -> bool:
+        checked = set()
+        for band_key in band_keys:
+            for candidate in self._buckets.get(band_key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if self._minhash.similarity(signature, self._signatures[candidate]) >= self.threshold:
+                    return True
+        return False
+
+
+def filter_new_pairs(pairs: Dict[str, Any], seen: Dict[str, Any], index: Optional[QuestionDeduplicator],
+                     counts: Dict[str, int], limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    从一批问题-答案对中挑出新问题
+
+    Args:
+        pairs: 模型返回的问题-答案对
+        seen: 当前子主题已有的问题-答案对
+        index: 问题去重索引，为None时只按问题文本完全相同去重
+        counts: 累计 'exact_duplicates' 和 'near_duplicates' 的计数字典
+        limit: 最多挑出的新问题数，达到后其余的问题不检查，也不加入去重索引
+
+    Returns:
+        新问题的问题-答案对
+    """
+    new_pairs = {}
+    for question, answer in pairs.items():
+        if limit is not None and len(new_pairs) >= limit:
+            break
+        if question in seen:
+            status = DUPLICATE
+        elif index is not None:
+            status = index.check(question)
+        else:
+            status = NEW
+        if status == NEW:
+            new_pairs[question] = answer
+        elif status == DUPLICATE:
+            counts['exact_duplicates'] = counts.get('exact_duplicates', 0) + 1
+        else:
+            counts['near_duplicates'] = counts.get('near_duplicates', 0) + 1
+    return new_pairs
@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DATA_FILE = "data.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+
+class RunCheckpoint:
+    """
+    合成数据生成的运行目录
+
+    每解析出一批问题-答案对就以JSONL格式追加写入data.jsonl，每完成一个子主题就更新
+    manifest.json。程序中断后可以从运行目录继续，已完成的子主题不再重新生成，
+    未完成子主题已写入的问题-答案对也会保留。追加写入是线程安全的。
+    """
+
+    def __init__(self, run_dir: str):
+        """
+        Args:
+            run_dir: 运行目录路径
+        """
+        self.run_dir = run_dir
+        self.data_path = os.path.join(run_dir, DATA_FILE)
+        self.manifest_path = os.path.join(run_dir, MANIFEST_FILE)
+        self.manifest: Optional[Dict] = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        """运行目录中是否已有运行记录"""
+        return os.path.exists(self.manifest_path)
+
+    def start(self, main_topic: str, subtopics: List[str], counts: List[int], config: Optional[Dict] = None):
+        """
+        开始一次新的运行
+
+        Args:
+            main_topic: 主要主题
+            subtopics: 子主题列表
+            counts: 每个子主题要生成的示例数
+            config: 需要一并记录的生成参数
+        """
+        if self.exists():
+            raise FileExistsError(f"运行目录中已有运行记录: {self.run_dir}，请使用resume继续或换一个目录")
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.manifest = {
+            "main_topic": main_topic,
+            "config": config or {},
+            "subtopics": [{"name": s, "num_examples": n} for s, n in zip(subtopics, counts)],
+            "completed": {},
+        }
+        self._file = open(self.data_path, 'w', encoding='utf-8')
+        self._write_manifest()
+
+    def resume(self, main_topic: str) -> Dict:
+        """
+        继续运行目录中未完成的运行
+
+        Args:
+            main_topic: 主要主题，必须与运行目录中记录的一致
+
+        Returns:
+            运行记录
+        """
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest["main_topic"] != main_topic:
+            raise ValueError(f"运行目录中的主题是 '{manifest['main_topic']}'，与 '{main_topic}' 不一致")
+        self.manifest = manifest
+        self._truncate_partial_line()
+        self._file = open(self.data_path, 'a', encoding='utf-8')
+        return manifest
+
+    def pending(self) -> List[Tuple[str, int]]:
+        """返回尚未完成的 (子主题, 示例数) 列表"""
+        completed = self.manifest["completed"]
+        return [(s["name"], s["num_examples"]) for s in self.manifest["subtopics"] if s["name"] not in completed]
+
+    def completed(self) -> Dict[str, int]:
+        """返回已完成的子主题及其生成的示例数"""
+        return dict(self.manifest["completed"])
+
+    def stats(self) -> Dict[str, Dict]:
+        """返回已完成子主题记录的生成统计"""
+        return dict(self.manifest.get("stats", {}))
+
+    def load_partial(self, subtopic: str) -> Dict[str, str]:
+        """
+        读取某个子主题已写入的问题-答案对，用于继续未完成的子主题
+
+        Args:
+            subtopic: 子主题
+
+        Returns:
+            问题-答案对字典
+        """
+        return {question: answer for name, question, answer in self.iter_records() if name == subtopic}
+
+    def append(self, subtopic: str, pairs: Dict[str, str]):
+        """
+        追加写入一批问题-答案对，写入后立即刷新到磁盘
+
+        Args:
+            subtopic: 子主题
+            pairs: 问题-答案对字典
+        """
+        if not pairs:
+            return
+        lines = "".join(
+            json.dumps({"subtopic": subtopic, "question": q, "answer": a}, ensure_ascii=False) + "\n"
+            for q, a in pairs.items()
+        )
+        with self._lock:
+            self._file.write(lines)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def mark_completed(self, subtopic: str, num_examples: int, stats: Optional[Dict] = None):
+        """
+        记录一个子主题已完成
+
+        Args:
+            subtopic: 子主题
+            num_examples: 该子主题生成的示例数
+            stats: 该子主题的生成统计
+        """
+        with self._lock:
+            self.manifest["completed"][subtopic] = num_examples
+            if stats is not None:
+                self.manifest.setdefault("stats", {})[subtopic] = stats
+            self._write_manifest()
+
+    def iter_records(self) -> Iterator[Tuple[str, str, str]]:
+        """
+        逐条读取已写入的 (子主题, 问题, 答案)，不把整个文件读入内存
+
+        末尾因中断而写了一半的记录会被跳过
+        """
+        if not os.path.exists(self.data_path):
+            return
+        with open(self.data_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                yield record["subtopic"], record["question"], record["answer"]
+
+    def export_json(self, output_file: str) -> int:
+        """
+        将运行目录中的数据导出为以问题为键、答案为值的JSON文件
+
+        逐条写出，不在内存中构造完整的字典；重复的问题只保留第一次出现的答案
+
+        Args:
+            output_file: 输出文件路径
+
+        Returns:
+            导出的问题-答案对数量
+        """
+        seen = set()
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write("{")
+            for _, question, answer in self.iter_records():
+                if question in seen:
+                    continue
+                f.write(",\n  " if seen else "\n  ")
+                seen.add(question)
+                f.write(f"{json.dumps(question, ensure_ascii=False)}: {json.dumps(answer, ensure_ascii=False)}")
+            f.write("\n}" if seen else "}")
+        return len(seen)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _write_manifest(self):
+        # 先写临时文件再替换，中断时不会留下写了一半的manifest
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _truncate_partial_line(self):
+        """去掉data.jsonl末尾因中断而写了一半的行，保证之后追加的记录从新的一行开始"""
+        if not os.path.exists(self.data_path):
+            return
+        with open(self.data_path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            # 从末尾向前找到最后一个换行符
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                position -= step
+                f.seek(position)
+                newline = f.read(step).rfind(b"\n")
+                if newline != -1:
+                    f.truncate(position + newline + 1)
+                    return
+            f.truncate(0)
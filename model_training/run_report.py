@@ -0,0 +1,80 @@
+from typing import Any, Dict, List, Optional
+
+# 报告中逐子主题累加到合计中的字段
+_SUMMED_FIELDS = (
+    "target", "examples", "calls", "prompt_tokens", "completion_tokens", "total_tokens", "wasted_tokens",
+    "wall_time", "parse_failures", "lost_pairs", "truncated_responses", "exact_duplicates", "near_duplicates",
+)
+
+
+def build_run_report(subtopic_stats: Dict[str, Dict[str, Any]], wall_time: Optional[float] = None) -> Dict[str, Any]:
+    """
+    根据每个子主题的生成统计构造运行报告
+
+    Args:
+        subtopic_stats: pipeline的subtopic_stats，子主题 -> 生成调度统计
+        wall_time: 整次运行的耗时（秒），为None时用各子主题耗时之和
+
+    Returns:
+        {'subtopics': [每个子主题的统计], 'totals': 合计}
+    """
+    subtopics: List[Dict[str, Any]] = []
+    for name, stats in subtopic_stats.items():
+        calls = stats.get("attempts", 0)
+        examples = stats.get("examples", 0)
+        subtopics.append({
+            "subtopic": name,
+            "target": stats.get("target", 0),
+            "examples": examples,
+            "calls": calls,
+            "prompt_tokens": stats.get("prompt_tokens", 0),
+            "completion_tokens": stats.get("completion_tokens", 0),
+            "total_tokens": stats.get("tokens", 0),
+            "wasted_tokens": stats.get("wasted_tokens", 0),
+            "wall_time": stats.get("wall_time", 0.0),
+            "parse_failures": stats.get("parse_failures", 0),
+            "lost_pairs": stats.get("lost_pairs", 0),
+            "truncated_responses": stats.get("truncated_responses", 0),
+            "exact_duplicates": stats.get("exact_duplicates", 0),
+            "near_duplicates": stats.get("near_duplicates", 0),
+            "examples_per_call": examples / calls if calls else 0.0,
+        })
+
+    totals = {field: sum(s[field] for s in subtopics) for field in _SUMMED_FIELDS}
+    totals["wall_time"] = round(totals["wall_time"] if wall_time is None else wall_time, 3)
+    totals["examples_per_call"] = totals["examples"] / totals["calls"] if totals["calls"] else 0.0
+    return {"subtopics": subtopics, "totals": totals}
+
+
+def format_run_report(report: Dict[str, Any]) -> str:
+    """
+    将运行报告格式化为便于在终端查看的表格，耗时最长和每次调用产出最少的子主题会被标出
+
+    Args:
+        report: build_run_report的返回值
+
+    Returns:
+        表格文本
+    """
+    subtopics = report["subtopics"]
+    if not subtopics:
+        return "没有子主题统计"
+    slowest = max(subtopics, key=lambda s: s["wall_time"])["subtopic"]
+    lowest_yield = min(subtopics, key=lambda s: s["examples_per_call"])["subtopic"]
+
+    lines = [f"{'子主题':<24} {'示例':>9} {'调用':>5} {'输入token':>10} {'输出token':>10} "
+             f"{'耗时(秒)':>9} {'解析失败':>8} {'重复':>5}"]
+    for s in subtopics + [dict(report["totals"], subtopic="合计")]:
+        marks = []
+        if s["subtopic"] == slowest and len(subtopics) > 1:
+            marks.append("最慢")
+        if s["subtopic"] == lowest_yield and len(subtopics) > 1:
+            marks.append("产出最低")
+        name = s["subtopic"] if len(s["subtopic"]) <= 24 else s["subtopic"][:23] + "…"
+        lines.append(
+            f"{name:<24} {s['examples']:>4}/{s['target']:<4} {s['calls']:>5} {s['prompt_tokens']:>10} "
+            f"{s['completion_tokens']:>10} {s['wall_time']:>9.1f} {s['parse_failures']:>8} "
+            f"{s['exact_duplicates'] + s['near_duplicates']:>5}"
+            + (f"  <- {'、'.join(marks)}" if marks else "")
+        )
+    return "\n".join(lines)
@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from shard_writer import DEFAULT_ROWS_PER_SHARD, ShardWriter
+
+# label中不计算损失的位置
+IGNORE_INDEX = -100
+# 每次送入tokenizer的文本数
+TOKENIZE_BATCH_SIZE = 1000
+
+
+class TokenCache:
+    """
+    文本的token id缓存，保存为JSONL文件
+
+    以 (tokenizer名称, 文本) 的sha1为键，重复运行（例如换一个max_seq_length重新打包）时
+    只对新文本调用tokenizer。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: 缓存文件路径，为None时只缓存在内存中
+        """
+        self.path = path
+        self._ids: Dict[str, List[int]] = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 中断时写了一半的最后一行
+                        continue
+                    self._ids[entry["key"]] = entry["ids"]
+
+    @staticmethod
+    def key(tokenizer_name: str, text: str) -> str:
+        return hashlib.sha1(f"{tokenizer_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def tokenize(self, texts: Sequence[str], tokenizer, batch_size: int = TOKENIZE_BATCH_SIZE) -> List[List[int]]:
+        """
+        返回每个文本的token id，缓存中没有的文本分批调用tokenizer并写入缓存
+
+        Args:
+            texts: 文本列表
+            tokenizer: Hugging Face tokenizer，与SFTTrainer一样使用默认的特殊token设置
+            batch_size: 每次送入tokenizer的文本数
+
+        Returns:
+            token id列表
+        """
+        name = getattr(tokenizer, "name_or_path", "") or type(tokenizer).__name__
+        keys = [self.key(name, text) for text in texts]
+        missing = list({key: i for i, key in enumerate(keys) if key not in self._ids}.values())
+
+        new_entries = []
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            encoded = tokenizer([texts[i] for i in batch])["input_ids"]
+            for i, ids in zip(batch, encoded):
+                ids = list(ids)
+                self._ids[keys[i]] = ids
+                new_entries.append({"key": keys[i], "ids": ids})
+
+        if self.path and new_entries:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for entry in new_entries:
+                    f.write(json.dumps(entry) + "\n")
+        return [self._ids[key] for key in keys]
+
+
+def first_fit_decreasing(lengths: Sequence[int], capacity: int) -> List[List[int]]:
+    """
+    用首次适应递减（FFD）算法把样本装入容量为capacity的序列
+
+    样本按长度从长到短依次放入第一个还放得下的序列，用线段树查找，复杂度O(n log n)。
+    超过capacity的样本按capacity计算（写入时会被截断）。
+
+    Args:
+        lengths: 每个样本的token数
+        capacity: 每个序列的token数上限
+
+    Returns:
+        每个序列中的样本序号列表
+    """
+    if capacity < 1:
+        raise ValueError("capacity必须大于0")
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    size = 1
+    while size < max(len(lengths), 1):
+        size *= 2
+    # 线段树的叶子是每个序列的剩余容量，内部节点是子树中的最大剩余容量，未使用的序列剩余容量为capacity
+    tree = [capacity] * (2 * size)
+    bins: List[List[int]] = []
+
+    for i in order:
+        length = min(max(lengths[i], 1), capacity)
+        node = 1
+        while node < size:
+            node = 2 * node if tree[2 * node] >= length else 2 * node + 1
+        slot = node - size
+        if slot == len(bins):
+            bins.append([])
+        bins[slot].append(i)
+        tree[node] -= length
+        node //= 2
+        while node:
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+    return bins
+
+
+def padding_report(lengths: Sequence[int], bins: List[List[int]], max_seq_length: int) -> Dict[str, Any]:
+    """
+    比较打包前后的填充效率（实际token数占序列总长度的比例）
+
+    打包前每个样本单独填充到max_seq_length；打包后每个序列填充到max_seq_length
+
+    Args:
+        lengths: 每个样本的token数
+        bins: first_fit_decreasing的结果
+        max_seq_length: 序列长度
+
+    Returns:
+        统计字典
+    """
+    tokens = sum(min(length, max_seq_length) for length in lengths)
+    samples = len(lengths)
+    return {
+        "samples": samples,
+        "sequences": len(bins),
+        "max_seq_length": max_seq_length,
+        "tokens": tokens,
+        "truncated_samples": sum(length > max_seq_length for length in lengths),
+        "mean_sample_length": tokens / samples if samples else 0.0,
+        "efficiency_before": tokens / (samples * max_seq_length) if samples else 0.0,
+        "efficiency_after": tokens / (len(bins) * max_seq_length) if bins else 0.0,
+    }
+
+
+def build_packed_sequence(samples: List[List[int]], max_seq_length: int, pad_token_id: int,
+                          pad_to_max: bool = True) -> Dict[str, List[int]]:
+    """
+    将几个样本拼接为一个训练序列
+
+    position_ids在每个样本开头重新从0开始；每个样本第一个token的label为-100，
+    不会用前一个样本的结尾预测下一个样本的开头。sequence_lengths记录每个样本的长度。
+
+    attention_mask只区分内容和填充，本身不能阻止样本之间互相注意。训练时需要用
+    PackedDataCollator按sequence_lengths生成分块对角的注意力掩码。
+
+    Args:
+        samples: 样本的token id列表
+        max_seq_length: 序列长度，超出的样本被截断
+        pad_token_id: 填充token
+        pad_to_max: 是否填充到max_seq_length
+
+    Returns:
+        input_ids、attention_mask、labels、position_ids、sequence_lengths
+    """
+    input_ids: List[int] = []
+    labels: List[int] = []
+    position_ids: List[int] = []
+    sequence_lengths: List[int] = []
+    for ids in samples:
+        ids = ids[:max_seq_length - len(input_ids)]
+        if not ids:
+            continue
+        input_ids.extend(ids)
+        labels.append(IGNORE_INDEX)
+        labels.extend(ids[1:])
+        position_ids.extend(range(len(ids)))
+        sequence_lengths.append(len(ids))
+
+    attention_mask = [1] * len(input_ids)
+    if pad_to_max:
+        padding = max_seq_length - len(input_ids)
+        input_ids.extend([pad_token_id] * padding)
+        attention_mask.extend([0] * padding)
+        labels.extend([IGNORE_INDEX] * padding)
+        position_ids.extend(range(padding))
+    return {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask,
+        "labels": labels,
+        "position_ids": position_ids,
+        "sequence_lengths": sequence_lengths,
+    }
+
+
+def segment_ids(sequence_lengths: Sequence[int], length: int) -> List[int]:
+    """
+    返回打包序列中每个位置所属样本的序号
+
+    填充位置各自使用不同的负数序号，只与自己同属一组。
+
+    Args:
+        sequence_lengths: build_packed_sequence返回的每个样本的长度
+        length: 序列长度（含填充）
+
+    Returns:
+        长度为length的序号列表
+    """
+    ids: List[int] = []
+    for i, sample_length in enumerate(sequence_lengths):
+        ids.extend([i] * sample_length)
+    ids.extend(-(j + 1) for j in range(length - len(ids)))
+    return ids
+
+
+class PackedDataCollator:
+    """
+    将打包后的序列组成batch，并生成分块对角的因果注意力掩码
+
+    每个token只能注意同一样本中它之前的token，默认的eager/SDPA注意力下样本之间也不会互相注意。
+    attention_mask是 (batch, 1, 序列长度, 序列长度) 的加性掩码（可以注意处为0，其余为dtype的最小值），
+    即transformers中自定义4D注意力掩码的格式，dtype应与模型计算使用的dtype相同。
+    flash-attention-2不使用4D掩码，这种情况下应改用transformers.DataCollatorWithFlattening，
+    由它根据position_ids划分样本。
+
+    训练时batch中需要保留sequence_lengths列，TrainingArguments要设置remove_unused_columns=False。
+
+    用法：
+        trainer = SFTTrainer(model=model, train_dataset=packed_dataset,
+                             data_collator=PackedDataCollator(tokenizer.pad_token_id, torch.bfloat16),
+                             dataset_kwargs={"skip_prepare_dataset": True},
+                             args=TrainingArguments(..., remove_unused_columns=False))
+    """
+
+    def __init__(self, pad_token_id: int, dtype=None):
+        """
+        Args:
+            pad_token_id: 把batch中较短的序列补齐时使用的填充token
+            dtype: 注意力掩码的torch dtype，默认为torch.float32
+        """
+        self.pad_token_id = pad_token_id
+        self.dtype = dtype
+
+    def __call__(self, features: List[Dict[str, Any]]) -> Dict[str, Any]:
+        import torch
+
+        length = max(len(feature["input_ids"]) for feature in features)
+        dtype = self.dtype or torch.float32
+
+        def pad(values, value):
+            return list(values) + [value] * (length - len(values))
+
+        input_ids = torch.tensor([pad(f["input_ids"], self.pad_token_id) for f in features])
+        labels = torch.tensor([pad(f["labels"], IGNORE_INDEX) for f in features])
+        position_ids = torch.tensor([list(f["position_ids"]) + list(range(length - len(f["position_ids"])))
+                                     for f in features])
+        segments = torch.tensor([segment_ids(f["sequence_lengths"], length) for f in features])
+
+        same_sample = segments[:, :, None] == segments[:, None, :]
+        causal = torch.ones(length, length, dtype=torch.bool).tril()
+        allowed = same_sample & causal
+        attention_mask = torch.zeros(allowed.shape, dtype=dtype).masked_fill(~allowed, torch.finfo(dtype).min)
+        return {
+            "input_ids": input_ids,
+            "labels": labels,
+            "position_ids": position_ids,
+            "attention_mask": attention_mask[:, None],
+        }
+
+
+def pack_texts(texts: Iterable[str], tokenizer, max_seq_length: int, output_dir: str,
+               cache_path: Optional[str] = None, pad_to_max: bool = True,
+               rows_per_shard: int = DEFAULT_ROWS_PER_SHARD) -> Dict[str, Any]:
+    """
+    对formatting_prompts_func输出的文本分词、打包，并写成Parquet分片数据集
+
+    打包的序列按样本原来的顺序排列（以每个序列中最小的样本序号排序），
+    打包统计写入数据集manifest.json的metadata字段。
+
+    Args:
+        texts: 训练文本（已包含提示词模板和EOS）
+        tokenizer: Hugging Face tokenizer
+        max_seq_length: 打包后的序列长度
+        output_dir: 输出目录
+        cache_path: token id缓存文件，为None时不缓存
+        pad_to_max: 是否把每个序列填充到max_seq_length
+        rows_per_shard: 每个分片的序列数
+
+    Returns:
+        打包统计
+    """
+    if pa is None:
+        raise ImportError("写入打包后的数据集需要pyarrow，请先运行 pip install pyarrow")
+    texts = list(texts)
+    token_ids = TokenCache(cache_path).tokenize(texts, tokenizer)
+    lengths = [len(ids) for ids in token_ids]
+    bins = sorted(first_fit_decreasing(lengths, max_seq_length), key=min)
+    report = padding_report(lengths, bins, max_seq_length)
+
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    int_list = pa.list_(pa.int32())
+    schema = pa.schema([(name, int_list) for name in
+                        ("input_ids", "attention_mask", "labels", "position_ids", "sequence_lengths")])
+    with ShardWriter(output_dir, rows_per_shard, "parquet", schema=schema, metadata={"packing": report}) as writer:
+        for sample_indices in bins:
+            # 同一序列内保持样本原来的先后顺序
+            samples = [token_ids[i] for i in sorted(sample_indices)]
+            writer.write(build_packed_sequence(samples, max_seq_length, pad_token_id, pad_to_max))
+    return report
+
+
+def format_padding_report(report: Dict[str, Any]) -> str:
+    """将打包统计格式化为一段文字"""
+    return (f"{report['samples']} 个样本打包为 {report['sequences']} 个长度为 {report['max_seq_length']} 的序列，"
+            f"填充效率 {report['efficiency_before']:.1%} -> {report['efficiency_after']:.1%}，"
+            f"平均样本长度 {report['mean_sample_length']:.0f}，截断 {report['truncated_samples']} 个样本")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将SFT训练文本按长度打包为固定长度的序列")
+    parser.add_argument("--input", type=str, required=True, help="JSONL文件，每行含有训练文本字段")
+    parser.add_argument("--output_dir", type=str, required=True, help="输出目录")
+    parser.add_argument("--tokenizer", type=str, required=True, help="Hugging Face tokenizer名称或路径")
+    parser.add_argument("--max_seq_length", type=int, default=2048, help="打包后的序列长度")
+    parser.add_argument("--text_field", type=str, default="text", help="训练文本字段")
+    parser.add_argument("--cache", type=str, default=None, help="token id缓存文件")
+    parser.add_argument("--no_padding", action="store_true", help="不把序列填充到max_seq_length")
+    parser.add_argument("--rows_per_shard", type=int, default=DEFAULT_ROWS_PER_SHARD, help="每个分片的序列数")
+
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    from alpaca_convert import iter_records
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    texts = (record[args.text_field] for record in iter_records(args.input))
+    report = pack_texts(texts, tokenizer, args.max_seq_length, args.output_dir, args.cache,
+                        pad_to_max=not args.no_padding, rows_per_shard=args.rows_per_shard)
+    print(format_padding_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from alpaca_convert import TEMPLATES, iter_converted
+
+MANIFEST_FILE = "manifest.json"
+# 每个分片的默认行数
+DEFAULT_ROWS_PER_SHARD = 100_000
+FORMATS = ("parquet", "arrow")
+
+
+def file_sha256(path: str) -> str:
+    """计算文件的sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ShardWriter:
+    """
+    将训练记录按固定行数写成列式的Parquet或Arrow分片
+
+    默认所有列都是字符串列，列名取自第一条记录（或由columns指定）；也可以传入pyarrow schema
+    写入其他类型的列。关闭时在输出目录写入manifest.json，记录格式、schema、每个分片的行数、
+    字节数和sha256。with块中出现异常时不写manifest.json并删除已写出的分片，
+    以manifest是否存在判断数据集是否完整的调用方不会用到写了一半的数据。
+    训练时可以直接用 datasets.load_dataset("parquet", data_files=...) 内存映射读取，
+    不需要重新解析JSON，也不依赖Hugging Face Hub。Arrow分片使用IPC流格式，与datasets的缓存文件相同。
+
+    用法：
+        with ShardWriter("dataset", rows_per_shard=50000) as writer:
+            for record in records:
+                writer.write(record)
+    """
+
+    def __init__(self, output_dir: str, rows_per_shard: int = DEFAULT_ROWS_PER_SHARD,
+                 format: str = "parquet", columns: Optional[List[str]] = None, prefix: str = "train",
+                 schema: Optional["pa.Schema"] = None, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            output_dir: 输出目录，不能已有manifest.json
+            rows_per_shard: 每个分片的行数
+            format: parquet 或 arrow
+            columns: 列名，为None时使用第一条记录的键
+            prefix: 分片文件名前缀
+            schema: 列的pyarrow schema，指定时忽略columns
+            metadata: 一并写入manifest的附加信息
+        """
+        if pa is None:
+            raise ImportError("写入Parquet/Arrow分片需要pyarrow，请先运行 pip install pyarrow")
+        if format not in FORMATS:
+            raise ValueError(f"format必须是 {FORMATS} 之一")
+        if rows_per_shard < 1:
+            raise ValueError("rows_per_shard必须大于0")
+        if os.path.exists(os.path.join(output_dir, MANIFEST_FILE)):
+            raise FileExistsError(f"输出目录中已有数据集: {output_dir}")
+        os.makedirs(output_dir, exist_ok=True)
+
+        self.output_dir = output_dir
+        self.rows_per_shard = rows_per_shard
+        self.format = format
+        self.prefix = prefix
+        if schema is None and columns:
+            schema = pa.schema([(name, pa.string()) for name in columns])
+        self.schema = schema
+        self.metadata = metadata
+        self.shards: List[Dict[str, Any]] = []
+        self.total_rows = 0
+        self._columns: Dict[str, List[Any]] = {}
+        self._string_columns = set()
+        self._buffered = 0
+        self._closed = False
+
+    def write(self, record: Dict[str, Any]):
+        """
+        写入一条记录，缓冲的记录达到rows_per_shard时写出一个分片
+
+        Args:
+            record: 列名 -> 值，字符串列中不是字符串的值以JSON字符串保存，缺少的列为null
+        """
+        if self.schema is None:
+            self.schema = pa.schema([(name, pa.string()) for name in record])
+        if not self._columns:
+            self._columns = {name: [] for name in self.schema.names}
+            self._string_columns = {field.name for field in self.schema if pa.types.is_string(field.type)}
+        extra = set(record) - set(self._columns)
+        if extra:
+            raise ValueError(f"记录中有schema之外的列: {sorted(extra)}")
+
+        for name, values in self._columns.items():
+            value = record.get(name)
+            if value is not None and name in self._string_columns and not isinstance(value, str):
+                value = json.dumps(value, ensure_ascii=False)
+            values.append(value)
+        self._buffered += 1
+        if self._buffered >= self.rows_per_shard:
+            self._flush()
+
+    def write_all(self, records: Iterable[Dict[str, Any]]) -> int:
+        """写入所有记录，返回写入的行数"""
+        count = 0
+        for record in records:
+            self.write(record)
+            count += 1
+        return count
+
+    def close(self) -> Dict[str, Any]:
+        """
+        写出剩余的记录和manifest.json
+
+        Returns:
+            manifest
+        """
+        if self._closed:
+            return self.manifest()
+        if self._buffered:
+            self._flush()
+        self._closed = True
+        manifest = self.manifest()
+        tmp_path = os.path.join(self.output_dir, MANIFEST_FILE + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, os.path.join(self.output_dir, MANIFEST_FILE))
+        return manifest
+
+    def abort(self):
+        """丢弃缓冲的记录，删除已写出的分片，不写manifest.json"""
+        if self._closed:
+            return
+        self._closed = True
+        for shard in self.shards:
+            path = os.path.join(self.output_dir, shard["file"])
+            if os.path.exists(path):
+                os.remove(path)
+        self.shards = []
+        self.total_rows = 0
+        self._columns = {}
+        self._buffered = 0
+
+    def manifest(self) -> Dict[str, Any]:
+        """返回当前的manifest内容"""
+        schema = self.schema if self.schema is not None else []
+        manifest = {
+            "format": self.format,
+            "schema": [{"name": field.name, "type": str(field.type)} for field in schema],
+            "rows_per_shard": self.rows_per_shard,
+            "total_rows": self.total_rows,
+            "shards": list(self.shards),
+        }
+        if self.metadata:
+            manifest["metadata"] = self.metadata
+        return manifest
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _flush(self):
+        table = pa.Table.from_pydict(self._columns, schema=self.schema)
+        file_name = f"{self.prefix}-{len(self.shards):05d}.{self.format}"
+        path = os.path.join(self.output_dir, file_name)
+        if self.format == "parquet":
+            pq.write_table(table, path)
+        else:
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_stream(sink, self.schema) as writer:
+                writer.write_table(table)
+
+        self.shards.append({
+            "file": file_name,
+            "rows": table.num_rows,
+            "bytes": os.path.getsize(path),
+            "sha256": file_sha256(path),
+        })
+        self.total_rows += table.num_rows
+        self._columns = {name: [] for name in self.schema.names}
+        self._buffered = 0
+
+
+def verify_dataset(output_dir: str) -> List[str]:
+    """
+    按manifest.json检查分片是否完整
+
+    Args:
+        output_dir: ShardWriter的输出目录
+
+    Returns:
+        问题描述列表，为空表示所有分片的大小和sha256都与manifest一致
+    """
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    problems = []
+    for shard in manifest["shards"]:
+        path = os.path.join(output_dir, shard["file"])
+        if not os.path.exists(path):
+            problems.append(f"缺少分片 {shard['file']}")
+        elif os.path.getsize(path) != shard["bytes"] or file_sha256(path) != shard["sha256"]:
+            problems.append(f"分片 {shard['file']} 的内容与manifest不一致")
+    return problems
+
+
+def data_files(output_dir: str) -> List[str]:
+    """返回manifest中记录的分片路径，可以直接传给datasets.load_dataset的data_files参数"""
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return [os.path.join(output_dir, shard["file"]) for shard in manifest["shards"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将问题-答案数据写成Parquet/Arrow分片数据集")
+    parser.add_argument("--input", type=str, required=True, help="输入文件（JSON或JSONL）")
+    parser.add_argument("--output_dir", type=str, required=True, help="输出目录")
+    parser.add_argument("--format", type=str, choices=FORMATS, default="parquet", help="分片格式")
+    parser.add_argument("--rows_per_shard", type=int, default=DEFAULT_ROWS_PER_SHARD, help="每个分片的行数")
+    parser.add_argument("--template", type=str, choices=sorted(TEMPLATES), default="alpaca",
+                        help="alpaca输出instruction/input/output列，alpaca_prompt输出填好提示词的text列")
+    parser.add_argument("--eos_token", type=str, default="", help="alpaca_prompt模板追加的结束符")
+    parser.add_argument("--key", type=str, default=None, help="JSON文件中问题-答案对象所在的顶层键，默认自动识别")
+
+    args = parser.parse_args()
+
+    template = TEMPLATES[args.template](args.eos_token)
+    with ShardWriter(args.output_dir, args.rows_per_shard, args.format) as writer:
+        writer.write_all(iter_converted(args.input, template, args.key))
+    manifest = writer.manifest()
+    print(f"已写入 {manifest['total_rows']} 行，共 {len(manifest['shards'])} 个分片: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import math
+from typing import List
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    计算百分位数（最近秩法）
+
+    Args:
+        values: 数值列表
+        p: 百分位，0到100之间
+
+    Returns:
+        百分位数，values为空时为0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
@@ -1,6 +1,10 @@
+import asyncio
+import functools
 import json
 import os
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from typing import List, Dict, Any, Optional, Callable, Tuple
 import argparse
 from tqdm import tqdm
 
@@ -9,28 +13,166 @@ from camel.configs import DeepSeekConfig
 from camel.models import ModelFactory
 from camel.types import ModelPlatformType, ModelType
 
+from decompose_cache import DEFAULT_DECOMPOSE_CACHE, DecompositionCache
+from qa_parser import parse_qa_pairs
+from question_dedup import QuestionDeduplicator, filter_new_pairs
+from run_checkpoint import RunCheckpoint
+from run_report import build_run_report, format_run_report
+from topup import DEFAULT_MAX_BATCH_SIZE, TopUpScheduler, response_usage
+
+SYSTEM_MESSAGE = "你是一个专门用于生成高质量合成数据的助手。你需要根据给定的主题生成问题和答案对。数学公式必须使用LaTeX格式。确保数据的生成格式保持一致：JSON格式，以问题为键，答案为值。"
+
+# 无状态模式下补充生成时，提示词中最多列出的已有问题数及每个问题的最大长度，
+# 使每次调用的提示词大小保持不变
+AVOID_QUESTIONS_LIMIT = 20
+AVOID_QUESTION_LENGTH = 100
+
+
+def build_system_message(few_shot_examples: Optional[Dict[str, str]] = None,
+                         base_message: str = SYSTEM_MESSAGE) -> str:
+    """
+    构造系统提示词，可附带少量示例问答对
+    
+    Args:
+        few_shot_examples: 示例问题-答案对字典，为None时不附带示例
+        base_message: 基础系统提示词
+        
+    Returns:
+        系统提示词
+    """
+    if not few_shot_examples:
+        return base_message
+    examples = json.dumps(few_shot_examples, ensure_ascii=False, indent=2)
+    return f"{base_message}\n\n以下是符合要求的示例：\n{examples}"
+
+
+def avoid_questions_prompt(questions: List[str]) -> str:
+    """
+    列出最近生成的若干问题，提示模型不要重复
+    
+    无状态模式下模型看不到之前的回答，用这段文字代替对话历史；
+    只列出最近的AVOID_QUESTIONS_LIMIT个问题，提示词长度有上限
+    
+    Args:
+        questions: 已生成的问题列表
+        
+    Returns:
+        附加到提示词中的文字，没有问题时为空字符串
+    """
+    recent = questions[-AVOID_QUESTIONS_LIMIT:]
+    if not recent:
+        return ""
+    lines = "\n".join(f"- {q[:AVOID_QUESTION_LENGTH]}" for q in recent)
+    return f"\n以下问题已经生成过，不要重复：\n{lines}\n"
+
+
+class RateLimiter:
+    """令牌桶限流器，线程安全，用于限制每分钟的模型调用次数"""
+    
+    def __init__(self, requests_per_minute: float, burst: Optional[int] = None):
+        """
+        Args:
+            requests_per_minute: 每分钟允许的请求数
+            burst: 令牌桶容量，即允许的突发请求数，默认为1
+        """
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute必须大于0")
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst or 1
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """取得一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
 class SyntheticDataPipeline:
-    def __init__(self, temperature: float = 0.2, api_key: Optional[str] = None):
+    # 系统提示词，子类可以替换
+    system_prompt = SYSTEM_MESSAGE
+    
+    def __init__(self, temperature: float = 0.2, api_key: Optional[str] = None,
+                 requests_per_minute: Optional[float] = None, stateless: bool = False,
+                 few_shot_examples: Optional[Dict[str, str]] = None, max_attempts: Optional[int] = None,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, dedup_threshold: Optional[float] = 0.8,
+                 decompose_cache: Optional[DecompositionCache] = None, refresh_subtopics: bool = False):
         """
         初始化合成数据生成pipeline
         
         Args:
             temperature: 模型温度参数
             api_key: DeepSeek API密钥，如果为None则从环境变量获取
+            requests_per_minute: 每分钟最多调用模型的次数，None表示不限制
+            stateless: 为True时每次调用前清空agent的对话历史，只发送系统提示词和本次提示词，
+                每次调用的提示词大小不随已生成的数据量增长
+            few_shot_examples: 附加到系统提示词中的示例问题-答案对
+            max_attempts: 每个子主题最多调用模型的次数，None表示按示例数量自动计算
+            max_batch_size: 每次调用最多要求生成的示例数
+            dedup_threshold: 近似重复问题的相似度阈值，整个数据集共用一个问题去重索引，
+                规范化后相同或近似重复的问题会被丢弃并补充生成；为None时只丢弃文本完全相同的问题
+            decompose_cache: 主题分解结果的缓存，为None时每次都调用模型分解主题
+            refresh_subtopics: 为True时忽略已缓存的分解结果，重新分解主题并更新缓存
         """
         if api_key:
             os.environ["DEEPSEEK_API_KEY"] = api_key
         
+        self.model_type = ModelType.DEEPSEEK_CHAT
+        self.temperature = temperature
         self.model = ModelFactory.create(
             model_platform=ModelPlatformType.DEEPSEEK,
-            model_type=ModelType.DEEPSEEK_CHAT,
+            model_type=self.model_type,
             model_config_dict=DeepSeekConfig(temperature=temperature).as_dict(),
         )
         
-        self.agent = ChatAgent(
-            system_message="你是一个专门用于生成高质量合成数据的助手。你需要根据给定的主题生成问题和答案对。数学公式必须使用LaTeX格式。确保数据的生成格式保持一致：JSON格式，以问题为键，答案为值。",
-            model=self.model
-        )
+        self.stateless = stateless
+        self.max_attempts = max_attempts
+        self.max_batch_size = max_batch_size
+        self.dedup_threshold = dedup_threshold
+        self.decompose_cache = decompose_cache
+        self.refresh_subtopics = refresh_subtopics
+        self.question_index: Optional[QuestionDeduplicator] = None
+        # 子主题 -> 生成调度统计（调用次数、新问题产出率、浪费的token数等）
+        self.subtopic_stats: Dict[str, Dict[str, Any]] = {}
+        self.system_message = build_system_message(few_shot_examples, self.system_prompt)
+        self.agent = self._create_agent()
+        self.rate_limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+    
+    def _reset_run_state(self):
+        """开始新的一次生成：清空调度统计，新建问题去重索引"""
+        self.subtopic_stats = {}
+        self.question_index = QuestionDeduplicator(self.dedup_threshold) if self.dedup_threshold else None
+    
+    def _create_agent(self) -> ChatAgent:
+        """创建一个使用共享模型的新agent，拥有独立的对话历史"""
+        return ChatAgent(system_message=self.system_message, model=self.model)
+    
+    def _step(self, prompt: str, agent: Optional[ChatAgent] = None):
+        """
+        调用模型，所有请求都经过这里以便统一限流
+        
+        Args:
+            prompt: 提示词
+            agent: 使用的agent，默认为self.agent
+            
+        Returns:
+            agent的响应
+        """
+        agent = agent or self.agent
+        if self.stateless:
+            agent.reset()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return agent.step(prompt)
     
     def decompose_topic(self, main_topic: str, num_subtopics: int = 5) -> List[str]:
         """
@@ -43,6 +185,13 @@ class SyntheticDataPipeline:
         Returns:
             子主题列表
         """
+        cache_key = (main_topic, num_subtopics, self.model_type.value, self.temperature)
+        if self.decompose_cache is not None and not self.refresh_subtopics:
+            cached = self.decompose_cache.get(*cache_key)
+            if cached:
+                print(f"使用缓存的主题分解结果: {self.decompose_cache.path}")
+                return cached
+        
         prompt = f"""
         请将以下主题分解为{num_subtopics}个更具体的子主题：
         
@@ -51,7 +200,7 @@ class SyntheticDataPipeline:
         请直接返回子主题列表，每行一个子主题，不要有任何额外的解释或编号。
         """
         
-        response = self.agent.step(prompt)
+        response = self._step(prompt)
         subtopics = [
             line.strip() for line in response.msgs[0].content.strip().split("\n")
             if line.strip()
@@ -64,27 +213,24 @@ class SyntheticDataPipeline:
             请再提供{remaining}个关于"{main_topic}"的子主题，使其与之前提供的不同。
             直接返回子主题列表，每行一个，不要有任何额外的解释或编号。
             """
-            more_response = self.agent.step(more_prompt)
+            if self.stateless:
+                more_prompt += "\n已有的子主题：\n" + "\n".join(subtopics)
+            more_response = self._step(more_prompt)
             more_subtopics = [
                 line.strip() for line in more_response.msgs[0].content.strip().split("\n")
                 if line.strip()
             ]
             subtopics.extend(more_subtopics[:remaining])
         
-        return subtopics[:num_subtopics]
+        subtopics = subtopics[:num_subtopics]
+        # 只缓存完整的分解结果，子主题数量不足时下次重新分解
+        if self.decompose_cache is not None and len(subtopics) == num_subtopics:
+            self.decompose_cache.put(*cache_key, subtopics)
+        return subtopics
     
-    def generate_data_for_subtopic(self, subtopic: str, num_examples: int) -> Dict[str, str]:
-        """
-        为单个子主题生成合成数据
-        
-        Args:
-            subtopic: 子主题
-            num_examples: 要生成的示例数量
-            
-        Returns:
-            问题-答案对的字典
-        """
-        prompt = f"""
+    def _subtopic_prompt(self, subtopic: str, num_examples: int) -> str:
+        """构造为子主题生成数据的提示词"""
+        return f"""
         请为以下子主题生成{num_examples}个高质量的问题和答案对：
         
         子主题：{subtopic}
@@ -107,27 +253,126 @@ class SyntheticDataPipeline:
         
         请保持一致的格式和输出风格。
         """
+    
+    def _topup_prompt(self, subtopic: str, num_examples: int, existing_questions: Optional[List[str]] = None) -> str:
+        """构造补充生成的提示词，existing_questions不为None时列出最近的已有问题"""
+        prompt = f"""
+            请为子主题"{subtopic}"再生成{num_examples}个不同的问题和答案对，确保它们与之前提供的不同。
+            
+            必须按以下JSON格式返回：
+            {{
+                "问题1": "答案1",
+                "问题2": "答案2"
+            }}
+            
+            如果是数学问题，必须使用LaTeX格式，例如：
+            {{
+                "What is the coefficient of $x^2y^6$ in the expansion of $\\\\left(\\\\frac{{3}}{{5}}x-\\\\frac{{y}}{{2}}\\\\right)^8$?": "\\\\frac{{63}}{{400}}"
+            }}
+            """
+        if existing_questions is not None:
+            prompt += avoid_questions_prompt(existing_questions)
+        return prompt
+    
+    def generate_data_for_subtopic(self, subtopic: str, num_examples: int,
+                                   agent: Optional[ChatAgent] = None) -> Dict[str, str]:
+        """
+        为单个子主题生成合成数据
+        
+        Args:
+            subtopic: 子主题
+            num_examples: 要生成的示例数量
+            agent: 使用的agent，默认为self.agent
+            
+        Returns:
+            问题-答案对的字典
+        """
+        response = self._step(self._subtopic_prompt(subtopic, num_examples), agent)
+        data, report = parse_qa_pairs(response.msgs[0].content)
+        if report.failed:
+            print(f"无法解析子主题 '{subtopic}' 的JSON响应")
+        elif report.lost:
+            print(f"子主题 '{subtopic}' 的响应中有 {report.lost} 个问题-答案对无法解析")
+        return data
+    
+    def generate_subtopic(self, subtopic: str, num_examples: int,
+                          agent: Optional[ChatAgent] = None,
+                          existing: Optional[Dict[str, str]] = None,
+                          on_pairs: Optional[Callable[[Dict[str, str]], None]] = None,
+                          initial_prompts: Optional[List[Tuple[str, int]]] = None) -> Dict[str, str]:
+        """
+        为单个子主题生成数据，数量不足时继续补充生成
         
-        response = self.agent.step(prompt)
-        content = response.msgs[0].content
+        每次请求的数量由TopUpScheduler根据解析成功率和新问题产出率调整；调用次数达到上限
+        或连续多次没有新问题时停止，此时返回的示例可能少于num_examples。
+        调度统计记录在self.subtopic_stats中。
         
-        # 提取JSON部分
-        try:
-            # 查找第一个{和最后一个}之间的内容
-            start_idx = content.find('{')
-            end_idx = content.rfind('}')
+        Args:
+            subtopic: 子主题
+            num_examples: 要生成的示例数量
+            agent: 使用的agent，默认为self.agent
+            existing: 该子主题已有的问题-答案对，只补充生成不足的部分
+            on_pairs: 每解析出一批新的问题-答案对时调用，参数为新增的问题-答案对
+            initial_prompts: 补充生成之前先依次发送的 (提示词, 要求的示例数)，
+                每个调用一次，不占用补充生成的次数
             
-            if start_idx != -1 and end_idx != -1:
-                json_str = content[start_idx:end_idx+1]
-                data = json.loads(json_str)
-                return data
+        Returns:
+            该子主题的问题-答案对字典
+        """
+        started = time.perf_counter()
+        subtopic_data = dict(existing or {})
+        initial_prompts = initial_prompts or []
+        duplicate_counts = {'exact_duplicates': 0, 'near_duplicates': 0}
+        scheduler = TopUpScheduler(num_examples - len(subtopic_data), self.max_attempts, self.max_batch_size,
+                                   reserved_attempts=len(initial_prompts))
+        # 无状态模式或从已有数据继续时，模型看不到之前的回答，需要在提示词中列出已有问题
+        list_existing = self.stateless or bool(existing)
+        
+        def request(prompt: str, requested: int):
+            response = self._step(prompt, agent)
+            pairs, report = parse_qa_pairs(response.msgs[0].content)
+            # 为弥补解析失败和重复，请求的数量可能多于还缺的数量，多出的部分不保留
+            new_pairs = filter_new_pairs(pairs, subtopic_data, self.question_index, duplicate_counts,
+                                         limit=num_examples - len(subtopic_data))
+            subtopic_data.update(new_pairs)
+            if on_pairs is not None and new_pairs:
+                on_pairs(new_pairs)
+            usage = response_usage(response)
+            scheduler.record(requested, None if report.failed else len(pairs), len(new_pairs),
+                             usage["total_tokens"], lost=report.lost, truncated=report.truncated,
+                             prompt_tokens=usage["prompt_tokens"], completion_tokens=usage["completion_tokens"])
+        
+        for prompt, requested in initial_prompts:
+            if len(subtopic_data) >= num_examples:
+                break
+            request(prompt, requested)
+        
+        while len(subtopic_data) < num_examples and not scheduler.exhausted:
+            batch = scheduler.next_batch(num_examples - len(subtopic_data))
+            if subtopic_data:
+                prompt = self._topup_prompt(subtopic, batch, list(subtopic_data) if list_existing else None)
             else:
-                # 尝试直接解析
-                return json.loads(content)
-        except json.JSONDecodeError:
-            # 如果解析失败，返回空字典
-            print(f"无法解析子主题 '{subtopic}' 的JSON响应")
-            return {}
+                prompt = self._subtopic_prompt(subtopic, batch)
+            request(prompt, batch)
+        
+        if len(subtopic_data) < num_examples:
+            print(f"子主题 '{subtopic}' 调用 {scheduler.attempts} 次后只生成了 {len(subtopic_data)}/{num_examples} 个示例")
+        
+        stats = scheduler.stats()
+        stats.update(duplicate_counts)
+        stats["examples"] = len(subtopic_data)
+        stats["wall_time"] = round(time.perf_counter() - started, 3)
+        self.subtopic_stats[subtopic] = stats
+        return subtopic_data
+    
+    def _split_examples(self, subtopics: List[str], total_examples: int) -> List[int]:
+        """计算每个子主题需要生成的示例数，最后一个子主题处理余数"""
+        examples_per_subtopic = total_examples // len(subtopics)
+        remainder = total_examples % len(subtopics)
+        return [
+            examples_per_subtopic + (remainder if i == len(subtopics) - 1 else 0)
+            for i in range(len(subtopics))
+        ]
     
     def generate_synthetic_data(self, main_topic: str, total_examples: int, num_subtopics: int = 5) -> Dict[str, str]:
         """
@@ -141,60 +386,150 @@ class SyntheticDataPipeline:
         Returns:
             合并后的问题-答案对字典
         """
+        self._reset_run_state()
         # 分解主题为子主题
         subtopics = self.decompose_topic(main_topic, num_subtopics)
         
-        # 计算每个子主题需要生成的示例数
-        examples_per_subtopic = total_examples // len(subtopics)
-        remainder = total_examples % len(subtopics)
-        
         # 为每个子主题生成数据
         all_data = {}
-        for i, subtopic in enumerate(tqdm(subtopics, desc="生成子主题数据")):
-            # 最后一个子主题处理余数
-            num_examples = examples_per_subtopic + (remainder if i == len(subtopics) - 1 else 0)
+        counts = self._split_examples(subtopics, total_examples)
+        for subtopic, num_examples in zip(tqdm(subtopics, desc="生成子主题数据"), counts):
+            all_data.update(self.generate_subtopic(subtopic, num_examples))
+        
+        return all_data
+    
+    async def generate_synthetic_data_async(self, main_topic: str, total_examples: int,
+                                            num_subtopics: int = 5, concurrency: int = 4) -> Dict[str, str]:
+        """
+        并发生成合成数据：多个子主题同时生成，结果按完成顺序合并
+        
+        每个子主题使用独立的新agent，生成结果不依赖其他子主题的对话历史。
+        模型调用在线程中执行，并发数由concurrency限制，调用频率由
+        requests_per_minute限制。
+        
+        Args:
+            main_topic: 主要主题
+            total_examples: 要生成的总示例数量
+            num_subtopics: 子主题数量
+            concurrency: 同时生成的子主题数量上限
             
-            subtopic_data = self.generate_data_for_subtopic(subtopic, num_examples)
+        Returns:
+            合并后的问题-答案对字典
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency必须大于0")
+        
+        self._reset_run_state()
+        subtopics = await asyncio.to_thread(self.decompose_topic, main_topic, num_subtopics)
+        jobs = [
+            functools.partial(self.generate_subtopic, subtopic, num_examples)
+            for subtopic, num_examples in zip(subtopics, self._split_examples(subtopics, total_examples))
+        ]
+        
+        all_data = {}
+        async for subtopic_data in self._run_subtopics(jobs, concurrency):
             all_data.update(subtopic_data)
-            
-            # 如果没有获得足够的示例，继续生成
-            while len(subtopic_data) < num_examples:
-                remaining = num_examples - len(subtopic_data)
-                more_prompt = f"""
-                请为子主题"{subtopic}"再生成{remaining}个不同的问题和答案对，确保它们与之前提供的不同。
-                
-                必须按以下JSON格式返回：
-                {{
-                    "问题1": "答案1",
-                    "问题2": "答案2"
-                }}
-                
-                如果是数学问题，必须使用LaTeX格式，例如：
-                {{
-                    "What is the coefficient of $x^2y^6$ in the expansion of $\\\\left(\\\\frac{{3}}{{5}}x-\\\\frac{{y}}{{2}}\\\\right)^8$?": "\\\\frac{{63}}{{400}}"
-                }}
-                """
-                more_response = self.agent.step(more_prompt)
-                try:
-                    more_content = more_response.msgs[0].content
-                    start_idx = more_content.find('{')
-                    end_idx = more_content.rfind('}')
-                    
-                    if start_idx != -1 and end_idx != -1:
-                        json_str = more_content[start_idx:end_idx+1]
-                        more_data = json.loads(json_str)
-                        subtopic_data.update(more_data)
-                        all_data.update(more_data)
-                    else:
-                        more_data = json.loads(more_content)
-                        subtopic_data.update(more_data)
-                        all_data.update(more_data)
-                except:
-                    # 如果解析失败，继续尝试
-                    pass
         
         return all_data
     
+    async def _run_subtopics(self, jobs: List[Callable[[ChatAgent], Any]], concurrency: int):
+        """
+        在线程中并发执行子主题任务，每个任务使用独立的新agent，按完成顺序产出结果
+        
+        Args:
+            jobs: 以agent为参数的子主题任务列表
+            concurrency: 同时执行的任务数量上限
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run(job):
+            async with semaphore:
+                return await asyncio.to_thread(job, self._create_agent())
+        
+        with tqdm(total=len(jobs), desc="生成子主题数据") as progress:
+            for future in asyncio.as_completed([run(job) for job in jobs]):
+                yield await future
+                progress.update(1)
+    
+    def generate_to_run_dir(self, main_topic: str, total_examples: int, run_dir: str,
+                            num_subtopics: int = 5, resume: bool = False, concurrency: int = 1) -> RunCheckpoint:
+        """
+        生成合成数据并边生成边写入运行目录，内存中只保留正在生成的子主题的数据
+        
+        每解析出一批问题-答案对就追加到运行目录的data.jsonl，每完成一个子主题就记录到
+        manifest.json。resume为True且运行目录中已有运行记录时，沿用记录中的子主题划分，
+        跳过已完成的子主题，未完成的子主题只补充不足的部分。
+        
+        Args:
+            main_topic: 主要主题
+            total_examples: 要生成的总示例数量
+            run_dir: 运行目录
+            num_subtopics: 子主题数量
+            resume: 是否继续运行目录中未完成的运行
+            concurrency: 同时生成的子主题数量
+            
+        Returns:
+            已关闭的RunCheckpoint，可用其export_json导出数据
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency必须大于0")
+        
+        self._reset_run_state()
+        checkpoint = RunCheckpoint(run_dir)
+        with checkpoint:
+            if resume and checkpoint.exists():
+                checkpoint.resume(main_topic)
+                self.subtopic_stats = checkpoint.stats()
+                # 已写入的问题加入去重索引
+                if self.question_index is not None:
+                    for _, question, _ in checkpoint.iter_records():
+                        self.question_index.check(question)
+                print(f"从 {run_dir} 继续运行，已完成 {len(checkpoint.completed())} 个子主题")
+            else:
+                subtopics = self.decompose_topic(main_topic, num_subtopics)
+                checkpoint.start(
+                    main_topic, subtopics, self._split_examples(subtopics, total_examples),
+                    config={"total_examples": total_examples, "num_subtopics": num_subtopics}
+                )
+            
+            jobs = [
+                functools.partial(self._generate_checkpointed, checkpoint, subtopic, num_examples)
+                for subtopic, num_examples in checkpoint.pending()
+            ]
+            if concurrency > 1:
+                async def run_all():
+                    async for _ in self._run_subtopics(jobs, concurrency):
+                        pass
+                asyncio.run(run_all())
+            else:
+                for job in tqdm(jobs, desc="生成子主题数据"):
+                    job(self.agent)
+        
+        return checkpoint
+    
+    def _generate_checkpointed(self, checkpoint: RunCheckpoint, subtopic: str, num_examples: int,
+                               agent: Optional[ChatAgent] = None) -> int:
+        """为单个子主题生成数据并写入运行目录，返回该子主题的示例数"""
+        subtopic_data = self.generate_subtopic(
+            subtopic, num_examples, agent,
+            existing=checkpoint.load_partial(subtopic),
+            on_pairs=functools.partial(checkpoint.append, subtopic)
+        )
+        checkpoint.mark_completed(subtopic, len(subtopic_data), self.subtopic_stats.get(subtopic))
+        return len(subtopic_data)
+    
+    def run_report(self, wall_time: Optional[float] = None) -> Dict[str, Any]:
+        """
+        返回最近一次生成的运行报告：每个子主题的示例数、调用次数、token用量、耗时、解析失败和重复问题数
+        
+        Args:
+            wall_time: 整次运行的耗时（秒），为None时用各子主题耗时之和
+            
+        Returns:
+            {'subtopics': [...], 'totals': {...}}
+        """
+        return build_run_report(self.subtopic_stats, wall_time)
+    
     def save_to_file(self, data: Dict[str, str], output_file: str):
         """
         将生成的数据保存到文件
@@ -208,6 +543,24 @@ class SyntheticDataPipeline:
         
         print(f"数据已保存到 {output_file}")
 
+def load_few_shot_examples(path: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    从JSON文件加载示例问题-答案对
+    
+    Args:
+        path: JSON文件路径，格式与生成的数据相同，为None时返回None
+        
+    Returns:
+        示例问题-答案对字典
+    """
+    if not path:
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        examples = json.load(f)
+    if not isinstance(examples, dict):
+        raise ValueError(f"示例文件必须是以问题为键、答案为值的JSON对象: {path}")
+    return examples
+
 def main():
     parser = argparse.ArgumentParser(description="合成数据生成器")
     parser.add_argument("--topic", type=str, required=True, help="主题")
@@ -216,17 +569,65 @@ def main():
     parser.add_argument("--temperature", type=float, default=0.2, help="模型温度参数")
     parser.add_argument("--output", type=str, default="synthetic_data.json", help="输出文件路径")
     parser.add_argument("--api_key", type=str, help="DeepSeek API密钥")
+    parser.add_argument("--concurrency", type=int, default=1, help="同时生成的子主题数量，大于1时并发生成")
+    parser.add_argument("--requests_per_minute", type=float, default=None, help="每分钟最多调用模型的次数")
+    parser.add_argument("--stateless", action="store_true", help="每次调用不携带对话历史，提示词大小保持不变")
+    parser.add_argument("--few_shot_file", type=str, default=None, help="示例问题-答案对JSON文件，附加到系统提示词中")
+    parser.add_argument("--run_dir", type=str, default=None, help="运行目录，边生成边写入，中断后可以继续")
+    parser.add_argument("--resume", action="store_true", help="继续--run_dir中未完成的运行")
+    parser.add_argument("--max_attempts", type=int, default=None, help="每个子主题最多调用模型的次数，默认按示例数量自动计算")
+    parser.add_argument("--max_batch_size", type=int, default=DEFAULT_MAX_BATCH_SIZE, help="每次调用最多要求生成的示例数")
+    parser.add_argument("--dedup_threshold", type=float, default=0.8, help="近似重复问题的相似度阈值")
+    parser.add_argument("--no_dedup", action="store_true", help="只丢弃文本完全相同的问题，不检查近似重复")
+    parser.add_argument("--decompose_cache", type=str, default=DEFAULT_DECOMPOSE_CACHE, help="主题分解结果的缓存文件")
+    parser.add_argument("--no_decompose_cache", action="store_true", help="不使用主题分解缓存")
+    parser.add_argument("--refresh_subtopics", action="store_true", help="忽略缓存的主题分解结果，重新分解主题")
     
     args = parser.parse_args()
+    if args.resume and not args.run_dir:
+        parser.error("--resume 需要同时指定 --run_dir")
     
-    pipeline = SyntheticDataPipeline(temperature=args.temperature, api_key=args.api_key)
-    data = pipeline.generate_synthetic_data(
-        main_topic=args.topic,
-        total_examples=args.num_examples,
-        num_subtopics=args.num_subtopics
+    pipeline = SyntheticDataPipeline(
+        temperature=args.temperature,
+        api_key=args.api_key,
+        requests_per_minute=args.requests_per_minute,
+        stateless=args.stateless,
+        few_shot_examples=load_few_shot_examples(args.few_shot_file),
+        max_attempts=args.max_attempts,
+        max_batch_size=args.max_batch_size,
+        dedup_threshold=None if args.no_dedup else args.dedup_threshold,
+        decompose_cache=None if args.no_decompose_cache else DecompositionCache(args.decompose_cache),
+        refresh_subtopics=args.refresh_subtopics
     )
+    if args.run_dir:
+        checkpoint = pipeline.generate_to_run_dir(
+            main_topic=args.topic,
+            total_examples=args.num_examples,
+            run_dir=args.run_dir,
+            num_subtopics=args.num_subtopics,
+            resume=args.resume,
+            concurrency=args.concurrency
+        )
+        count = checkpoint.export_json(args.output)
+        print(f"{count} 个数据样本已保存到 {args.output}")
+        return
+    
+    if args.concurrency > 1:
+        data = asyncio.run(pipeline.generate_synthetic_data_async(
+            main_topic=args.topic,
+            total_examples=args.num_examples,
+            num_subtopics=args.num_subtopics,
+            concurrency=args.concurrency
+        ))
+    else:
+        data = pipeline.generate_synthetic_data(
+            main_topic=args.topic,
+            total_examples=args.num_examples,
+            num_subtopics=args.num_subtopics
+        )
     
     pipeline.save_to_file(data, args.output)
+    print(format_run_report(pipeline.run_report()))
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,28 @@
+from content_index import ContentIndex, split_chunks
+from text_segment.text_segmentation import cjk_token_estimate
+
+PAGES = {
+    "https://example.com/diabetes": "糖尿病的诊断标准包括空腹血糖和糖化血红蛋白。\n\n胰岛素治疗适用于1型糖尿病患者。",
+    "https://example.com/hypertension": "高血压患者应限制钠盐摄入。\n\n降压药物包括利尿剂和钙通道阻滞剂。",
+}
+
+
+def test_search_returns_scores_without_changing_index():
+    index = ContentIndex.from_pages(PAGES, max_tokens=20)
+    first = index.search("胰岛素治疗", 2)
+    before = [(chunk.url, chunk.position, score) for chunk, score in first]
+
+    # 另一个子主题的检索不影响之前的结果
+    other = index.search("降压药物", 2)
+    assert other[0][0].url == "https://example.com/hypertension"
+    assert [(chunk.url, chunk.position, score) for chunk, score in first] == before
+    assert first[0][0].text == "胰岛素治疗适用于1型糖尿病患者。"
+    assert first[0][1] > first[1][1]
+    assert not hasattr(first[0][0], "score")
+
+
+def test_split_chunks_uses_segment_token_estimate():
+    text = "\n\n".join(["血糖监测很重要。" * 3, "Blood glucose monitoring matters. " * 5, "饮食控制。" * 10])
+    chunks = split_chunks(text, max_tokens=30)
+    assert all(cjk_token_estimate(chunk) <= 30 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "").replace(" ", "") == text.replace("\n", "").replace(" ", "")
@@ -0,0 +1,90 @@
+import pytest
+
+from crawl_cache import (ContentCache, CrawlError, CrawlPrefetcher, FetchResult, FirecrawlFetcher,
+                         LocalFileFetcher)
+
+URL = "https://example.com/a"
+OTHER_URL = "https://example.org/b"
+
+
+def _write_page(fetcher, url, content):
+    with open(fetcher.path_for(url), "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def test_second_prefetch_uses_cache_and_counts_only_its_own_results(tmp_path):
+    fetcher = LocalFileFetcher(str(tmp_path))
+    _write_page(fetcher, URL, "页面A")
+    _write_page(fetcher, OTHER_URL, "页面B")
+    prefetcher = CrawlPrefetcher(fetcher, ContentCache(str(tmp_path / "cache")))
+
+    assert prefetcher.prefetch([URL, OTHER_URL, URL]) == {URL: "页面A", OTHER_URL: "页面B"}
+    assert prefetcher.stats == {"cache_hits": 0, "fetched": 2, "not_modified": 0, "failed": 0}
+
+    # 新的缓存实例从磁盘读取
+    prefetcher = CrawlPrefetcher(fetcher, ContentCache(str(tmp_path / "cache")))
+    prefetcher.prefetch([URL])
+    assert prefetcher.prefetch([URL, OTHER_URL]) == {URL: "页面A", OTHER_URL: "页面B"}
+    assert prefetcher.stats == {"cache_hits": 2, "fetched": 0, "not_modified": 0, "failed": 0}
+
+
+def test_expired_entry_is_revalidated_with_etag(tmp_path):
+    fetcher = LocalFileFetcher(str(tmp_path))
+    _write_page(fetcher, URL, "页面A")
+    cache = ContentCache(ttl=0)
+    prefetcher = CrawlPrefetcher(fetcher, cache)
+    prefetcher.prefetch([URL])
+    etag = cache.get(URL)["etag"]
+
+    # 过期但内容没有变化：不重新下载，只刷新缓存时间
+    assert prefetcher.prefetch([URL]) == {URL: "页面A"}
+    assert prefetcher.stats["not_modified"] == 1
+    assert cache.get(URL)["etag"] == etag
+
+    _write_page(fetcher, URL, "页面A（更新）")
+    assert prefetcher.prefetch([URL]) == {URL: "页面A（更新）"}
+    assert prefetcher.stats["fetched"] == 1
+    assert cache.get(URL)["etag"] != etag
+
+
+def test_failed_fetch_is_not_cached(tmp_path):
+    fetcher = LocalFileFetcher(str(tmp_path))
+    cache = ContentCache(str(tmp_path / "cache"))
+    prefetcher = CrawlPrefetcher(fetcher, cache)
+
+    assert prefetcher.prefetch([URL]) == {URL: ""}
+    assert prefetcher.stats["failed"] == 1
+    assert cache.get(URL) is None
+
+    # 页面可以访问后重新抓取
+    _write_page(fetcher, URL, "页面A")
+    assert prefetcher.prefetch([URL]) == {URL: "页面A"}
+    assert prefetcher.stats["fetched"] == 1
+
+
+def test_empty_content_is_not_cached():
+    class EmptyFetcher(LocalFileFetcher):
+        def fetch(self, url, etag=None):
+            return FetchResult("")
+
+    cache = ContentCache()
+    prefetcher = CrawlPrefetcher(EmptyFetcher(), cache)
+    assert prefetcher.get(URL) == ""
+    assert prefetcher.stats["failed"] == 1
+    assert cache.get(URL) is None
+
+
+def test_firecrawl_fetcher_raises_on_incomplete_crawl():
+    class FakeFirecrawl:
+        def __init__(self, response):
+            self.response = response
+
+        def crawl(self, url):
+            return self.response
+
+    with pytest.raises(CrawlError):
+        FirecrawlFetcher(FakeFirecrawl({"status": "scraping", "data": []})).fetch(URL)
+    with pytest.raises(CrawlError):
+        FirecrawlFetcher(FakeFirecrawl({"status": "completed", "data": [{"markdown": ""}]})).fetch(URL)
+    result = FirecrawlFetcher(FakeFirecrawl({"status": "completed", "data": [{"markdown": "# A"}]})).fetch(URL)
+    assert result.content == "# A"
@@ -0,0 +1,65 @@
+import json
+
+from qa_parser import QAStreamParser, decode_json_string, parse_qa_pairs
+
+OUTPUT = (
+    '以下是生成的数据：\n```json\n'
+    '{"求 $\\\\frac{1}{2} + \\\\frac{1}{3}$": "$\\\\frac{5}{6}$",\n'
+    ' "\\u6c42\\u548c": "第一行\\n第二行\\t\\"引号\\"",\n'
+    ' "数组": [1, "a,b]"]}\n```'
+)
+EXPECTED = {
+    r"求 $\frac{1}{2} + \frac{1}{3}$": r"$\frac{5}{6}$",
+    "求和": '第一行\n第二行\t"引号"',
+    "数组": [1, "a,b]"],
+}
+
+
+def _feed_in_chunks(text, size):
+    parser = QAStreamParser()
+    pairs = []
+    for i in range(0, len(text), size):
+        pairs.extend(parser.feed(text[i:i + size]))
+    pairs.extend(parser.close())
+    return dict(pairs), parser.report
+
+
+def test_valid_json_strings_decode_like_json_loads():
+    for value in ["第一行\n$x$\t第二行", "\b\f\r", r"$\frac{1}{2}$ \times \neq", "\U0001f600 中文", '"\\/']:
+        for ensure_ascii in (True, False):
+            assert decode_json_string(json.dumps(value, ensure_ascii=ensure_ascii)[1:-1]) == value
+
+
+def test_unescaped_latex_is_kept():
+    # 模型没有转义反斜杠：\s不是合法的JSON转义，按容错规则解码
+    raw = r"$\sqrt{2} \neq \frac{1}{2}$\n下一行"
+    assert decode_json_string(raw) == "$\\sqrt{2} \\neq \\frac{1}{2}$\n下一行"
+
+
+def test_chunk_boundaries_inside_escapes():
+    whole, report = parse_qa_pairs(OUTPUT)
+    assert whole == EXPECTED
+    assert report.as_dict() == {"pairs": 3, "lost": 0, "objects": 1, "truncated": False}
+    # 任意切块（包括在\\、\"和\uXXXX中间切开）得到相同的结果
+    for size in (1, 2, 3, 5, 7):
+        pairs, chunk_report = _feed_in_chunks(OUTPUT, size)
+        assert pairs == EXPECTED
+        assert chunk_report.as_dict() == report.as_dict()
+
+
+def test_truncated_output_keeps_complete_pairs():
+    truncated = '{"问题一": "答案一", "问题二": "答案被截'
+    for size in (1, 4, len(truncated)):
+        pairs, report = _feed_in_chunks(truncated, size)
+        assert pairs == {"问题一": "答案一"}
+        assert report.lost == 1
+        assert report.truncated
+        assert not report.failed
+
+
+def test_unescaped_quote_drops_only_its_pair():
+    output = '{"问题一": "答案含有"未转义"的引号", "问题二": "答案二"}'
+    for size in (1, 3, len(output)):
+        pairs, report = _feed_in_chunks(output, size)
+        assert pairs == {"问题二": "答案二"}
+        assert report.lost == 1
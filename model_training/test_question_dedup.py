@@ -0,0 +1,48 @@
+from question_dedup import DUPLICATE, NEAR_DUPLICATE, NEW, QuestionDeduplicator, filter_new_pairs
+from run_checkpoint import RunCheckpoint
+
+QUESTION = r"已知函数 $f(x) = \dfrac{x^2 + 1}{x - 1}$，求 $f(x)$ 在区间 $(1, +\infty)$ 上的最小值。"
+# 只在LaTeX排版、空白和标点上不同
+REFORMATTED = r"已知函数\(f(x)=\frac{x^2+1}{x-1}\),求f(x)在区间(1,+\infty)上的最小值"
+# 措辞稍有不同的改写
+REWORDED = r"已知函数 $f(x) = \dfrac{x^2 + 1}{x - 1}$，求 $f(x)$ 在区间 $(1, +\infty)$ 上的最小值及取得最小值时x的值。"
+OTHER = "一个袋子里有3个红球和5个白球，随机取出两个球，求两个都是红球的概率。"
+
+
+def test_rejects_exact_and_near_duplicates():
+    index = QuestionDeduplicator()
+    assert index.check(QUESTION) == NEW
+    assert index.check(REFORMATTED) == DUPLICATE
+    assert index.check(REWORDED) == NEAR_DUPLICATE
+    assert index.check(OTHER) == NEW
+    # 被拒绝的问题不加入索引
+    assert len(index) == 2
+    assert index.stats == {'checked': 4, 'duplicates': 1, 'near_duplicates': 1}
+
+
+def test_filter_new_pairs_counts_duplicates():
+    index = QuestionDeduplicator()
+    seen = {QUESTION: "2 + 2\\sqrt{2}"}
+    index.check(QUESTION)
+    counts = {}
+    pairs = {QUESTION: "a", REFORMATTED: "b", REWORDED: "c", OTHER: "d"}
+    assert filter_new_pairs(pairs, seen, index, counts) == {OTHER: "d"}
+    assert counts == {'exact_duplicates': 2, 'near_duplicates': 1}
+
+
+def test_index_rebuilt_from_run_dir(tmp_path):
+    # 与generate_to_run_dir继续运行时一样，用运行目录中已写入的问题重建索引
+    run_dir = str(tmp_path / "run")
+    with RunCheckpoint(run_dir) as checkpoint:
+        checkpoint.start("数学", ["函数"], [2])
+        checkpoint.append("函数", {QUESTION: "2 + 2\\sqrt{2}"})
+
+    index = QuestionDeduplicator()
+    with RunCheckpoint(run_dir) as checkpoint:
+        checkpoint.resume("数学")
+        for _, question, _ in checkpoint.iter_records():
+            index.check(question)
+
+    assert index.check(REFORMATTED) == DUPLICATE
+    assert index.check(REWORDED) == NEAR_DUPLICATE
+    assert index.check(OTHER) == NEW
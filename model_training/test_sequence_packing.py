@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from sequence_packing import (IGNORE_INDEX, PackedDataCollator, build_packed_sequence, first_fit_decreasing,
+                              segment_ids)
+
+
+def _check_bins(lengths, bins, capacity):
+    # 每个样本恰好出现一次，每个序列不超过容量（超长样本按capacity计算）
+    assert sorted(i for b in bins for i in b) == list(range(len(lengths)))
+    for b in bins:
+        assert b
+        assert sum(min(max(lengths[i], 1), capacity) for i in b) <= capacity
+
+
+def test_first_fit_decreasing_bin_invariants():
+    rng = random.Random(0)
+    for _ in range(200):
+        capacity = rng.randint(1, 64)
+        lengths = [rng.randint(0, capacity + 8) for _ in range(rng.randint(0, 60))]
+        _check_bins(lengths, first_fit_decreasing(lengths, capacity), capacity)
+
+
+def test_first_fit_decreasing_packs_tightly():
+    lengths = [6, 5, 4, 3, 2, 1, 5]
+    bins = first_fit_decreasing(lengths, 10)
+    _check_bins(lengths, bins, 10)
+    assert len(bins) == 3
+    assert first_fit_decreasing([], 10) == []
+    with pytest.raises(ValueError):
+        first_fit_decreasing([1], 0)
+
+
+def test_build_packed_sequence_resets_positions_and_labels():
+    packed = build_packed_sequence([[11, 12, 13], [21, 22], [31, 32, 33]], 8, pad_token_id=0)
+    # 第三个样本被截断为剩下的3个位置
+    assert packed["input_ids"] == [11, 12, 13, 21, 22, 31, 32, 33]
+    assert packed["position_ids"] == [0, 1, 2, 0, 1, 0, 1, 2]
+    assert packed["labels"] == [IGNORE_INDEX, 12, 13, IGNORE_INDEX, 22, IGNORE_INDEX, 32, 33]
+    assert packed["sequence_lengths"] == [3, 2, 3]
+
+    padded = build_packed_sequence([[11, 12], [21]], 5, pad_token_id=0)
+    assert padded["attention_mask"] == [1, 1, 1, 0, 0]
+    assert padded["labels"][3:] == [IGNORE_INDEX, IGNORE_INDEX]
+    assert segment_ids(padded["sequence_lengths"], 5) == [0, 0, 1, -1, -2]
+
+
+def test_collator_builds_block_diagonal_causal_mask():
+    torch = pytest.importorskip("torch")
+    features = [
+        build_packed_sequence([[11, 12, 13], [21, 22]], 6, pad_token_id=0, pad_to_max=False),
+        build_packed_sequence([[31, 32]], 6, pad_token_id=0, pad_to_max=False),
+    ]
+    batch = PackedDataCollator(pad_token_id=0)(features)
+
+    assert batch["input_ids"].tolist() == [[11, 12, 13, 21, 22], [31, 32, 0, 0, 0]]
+    assert batch["position_ids"].tolist() == [[0, 1, 2, 0, 1], [0, 1, 0, 1, 2]]
+    assert batch["labels"][1, 2:].tolist() == [IGNORE_INDEX] * 3
+
+    mask = batch["attention_mask"]
+    assert mask.shape == (2, 1, 5, 5)
+    assert mask.dtype == torch.float32
+    allowed = (mask[:, 0] == 0).tolist()
+    segments = [[0, 0, 0, 1, 1], [0, 0, -1, -2, -3]]
+    for b in range(2):
+        for q in range(5):
+            for k in range(5):
+                # 只能注意同一样本中不晚于自己的位置，同一序列中的不同样本之间不能互相注意
+                assert allowed[b][q][k] == (segments[b][q] == segments[b][k] and k <= q)
+    assert (mask[0, 0, 3, :3] == torch.finfo(torch.float32).min).all()
@@ -0,0 +1,68 @@
+from topup import TopUpScheduler
+
+
+def _run(scheduler, respond):
+    # 与SyntheticDataPipeline.generate_subtopic相同的调度循环，respond(batch)返回(解析出的问题数, 新问题数)
+    have = 0
+    while have < scheduler.target and not scheduler.exhausted:
+        batch = scheduler.next_batch(scheduler.target - have)
+        returned, new = respond(batch)
+        scheduler.record(batch, returned, new)
+        have += new
+    return have
+
+
+def test_all_duplicates_stop_after_stall_limit():
+    scheduler = TopUpScheduler(20, max_attempts=100, max_stalled=3)
+    assert _run(scheduler, lambda batch: (batch, 0)) == 0
+    assert scheduler.attempts == 3
+    assert scheduler.stats()["duplicate_rate"] == 1.0
+
+
+def test_unparseable_output_stops_at_max_attempts():
+    scheduler = TopUpScheduler(40, max_attempts=5, max_batch_size=40)
+    requested = []
+
+    def garbage(batch):
+        requested.append(batch)
+        return None, 0
+
+    assert _run(scheduler, garbage) == 0
+    assert scheduler.attempts == 5
+    assert scheduler.parse_failures == 5
+    # 每次解析失败后请求数量减半，批次还能减小时不计入停滞
+    assert requested == [40, 20, 10, 5, 2]
+    assert scheduler.stalled == 0
+
+
+def test_unparseable_output_stops_without_attempt_limit():
+    scheduler = TopUpScheduler(40, max_batch_size=40, max_stalled=3)
+    _run(scheduler, lambda batch: (None, 0))
+    # 批次减到1后连续解析失败计入停滞
+    assert scheduler.stalled == 3
+    assert scheduler.attempts <= scheduler.max_attempts
+
+
+def test_batch_size_follows_yield_rate():
+    scheduler = TopUpScheduler(100, max_attempts=100, max_batch_size=50)
+    assert scheduler.next_batch(10) == 10
+    # 每次只有一半是新问题：要求的数量逐渐增加到仍需数量的两倍左右
+    for _ in range(6):
+        scheduler.record(10, 10, 5)
+    assert 18 <= scheduler.next_batch(10) <= 20
+    assert scheduler.next_batch(1000) == 50
+
+    # 产出率恢复后要求的数量回落
+    for _ in range(6):
+        scheduler.record(10, 10, 10)
+    assert scheduler.next_batch(10) <= 11
+
+
+def test_truncated_output_caps_next_batch():
+    scheduler = TopUpScheduler(100, max_attempts=100, max_batch_size=50)
+    scheduler.record(50, 12, 12, truncated=True)
+    assert scheduler.next_batch(88) == 12
+    # 解析成功后放宽上限，但不超过被截断时的数量
+    for _ in range(5):
+        scheduler.record(12, 12, 12)
+    assert scheduler.next_batch(88) == 12
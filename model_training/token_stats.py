@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+import argparse
+import functools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from alpaca_convert import ALPACA_PROMPT, DEFAULT_CHUNK_SIZE, iter_json_pairs
+from sequence_packing import TokenCache
+from stats_utils import percentile
+from text_segment.text_segmentation import cjk_token_estimate
+
+# 整条训练样本（填入提示词模板后的文本）在统计中的字段名
+SAMPLE_FIELD = "sample"
+
+
+def iter_json_array(f, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    增量解析JSON数组文件，逐个返回数组元素（如旧版notebook导出的transformed_qa_*.json）
+
+    Args:
+        f: 已打开的文本文件，位于数组开头
+        chunk_size: 每次读取的字符数
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("文件不是JSON数组")
+    position = 1
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # 元素还不完整，读入更多内容
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+        position = end
+        if position > chunk_size:
+            buffer = buffer[position:]
+            position = 0
+
+
+def _iter_jsonl_records(f, counts: Dict[str, int]) -> Iterator[Any]:
+    """逐行解析JSONL，与alpaca_convert.iter_jsonl_pairs一样跳过无法解析的行，并计入counts"""
+    for line in f:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            counts["skipped_lines"] = counts.get("skipped_lines", 0) + 1
+
+
+def iter_samples(path: str, counts: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, str]]:
+    """
+    逐条读取导出文件中的训练样本，统一为 instruction/input/output 字段
+
+    支持generated_answers_*.json（qa_pairs对象）、合成数据JSON（顶层问题-答案对象）、
+    transformed_qa_*.json（Alpaca记录数组）和JSONL（Alpaca记录、运行目录记录或只有text字段的记录）。
+    无法解析的JSONL行和不是对象的记录被跳过
+
+    Args:
+        path: 文件路径
+        counts: 累计 'skipped_lines'（跳过的行或记录数）的计数字典
+    """
+    if counts is None:
+        counts = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".jsonl"):
+            records = _iter_jsonl_records(f, counts)
+        else:
+            first = f.read(1)
+            while first and first.isspace():
+                first = f.read(1)
+            if first != "[":
+                records = None
+            else:
+                f.seek(0)
+                records = iter_json_array(f)
+        if records is not None:
+            for record in records:
+                if not isinstance(record, dict):
+                    counts["skipped_lines"] = counts.get("skipped_lines", 0) + 1
+                elif "question" in record:
+                    yield {"instruction": record["question"], "input": "", "output": record.get("answer", "")}
+                else:
+                    yield {key: value for key, value in record.items() if isinstance(value, str)}
+            return
+
+    for question, answer in iter_json_pairs(path):
+        yield {"instruction": question, "input": "",
+               "output": answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False)}
+
+
+class TokenLengthCache:
+    """
+    文本token数的缓存，保存为JSONL文件
+
+    与TokenCache使用相同的键（tokenizer名称和文本的sha1），但只保存长度。
+    多个进程只读取缓存文件，新的条目由主进程合并后统一追加，避免并发写入同一个文件。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: 缓存文件路径，为None时不使用缓存
+        """
+        self.path = path
+        self._lengths: Dict[str, int] = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 中断时写了一半的最后一行
+                        continue
+                    self._lengths[entry["key"]] = entry["length"]
+
+    def get(self, key: str) -> Optional[int]:
+        return self._lengths.get(key)
+
+    def append(self, entries: Dict[str, int]):
+        """将新的条目写入内存和缓存文件"""
+        entries = {key: length for key, length in entries.items() if key not in self._lengths}
+        self._lengths.update(entries)
+        if self.path and entries:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for key, length in entries.items():
+                    f.write(json.dumps({"key": key, "length": length}) + "\n")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_tokenizer(name: Optional[str]):
+    """每个进程只加载一次tokenizer"""
+    if name is None:
+        return None
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(name)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_length_cache(path: Optional[str]) -> TokenLengthCache:
+    """每个进程只读取一次长度缓存"""
+    return TokenLengthCache(path)
+
+
+def _count_tokens(texts: List[str], tokenizer_name: Optional[str], cache: TokenLengthCache,
+                  new_entries: Dict[str, int]) -> List[int]:
+    """返回每个文本的token数，缓存中没有的文本分词后记入new_entries"""
+    if tokenizer_name is None:
+        return [cjk_token_estimate(text) for text in texts]
+    keys = [TokenCache.key(tokenizer_name, text) for text in texts]
+    lengths = [cache.get(key) if cache.get(key) is not None else new_entries.get(key) for key in keys]
+    missing = [i for i, length in enumerate(lengths) if length is None]
+    if missing:
+        encoded = _load_tokenizer(tokenizer_name)([texts[i] for i in missing])["input_ids"]
+        for i, ids in zip(missing, encoded):
+            lengths[i] = new_entries[keys[i]] = len(ids)
+    return lengths
+
+
+def analyze_file(path: str, tokenizer_name: Optional[str] = None, prompt: str = ALPACA_PROMPT,
+                 cache_path: Optional[str] = None,
+                 batch_size: int = 1000) -> Tuple[Dict[str, List[int]], Dict[str, int], int]:
+    """
+    计算一个文件中每条样本各字段和整条样本的token数
+
+    Args:
+        path: 导出文件路径
+        tokenizer_name: Hugging Face tokenizer名称或路径，为None时按字符数粗略估计
+        prompt: 将instruction、input、output填入的提示词模板，用于计算整条样本的长度
+        cache_path: token数缓存文件，只读取，为None时不使用缓存
+        batch_size: 每次送入tokenizer的样本数
+
+    Returns:
+        (字段名 -> token数列表, 缓存中没有的新条目, 跳过的行数)，整条样本的字段名为 "sample"
+    """
+    cache = _load_length_cache(cache_path)
+    counts: Dict[str, int] = {}
+    new_entries: Dict[str, int] = {}
+    lengths: Dict[str, List[int]] = {}
+    batch: List[Dict[str, str]] = []
+
+    def flush():
+        fields = {field for sample in batch for field in sample}
+        for field in sorted(fields):
+            texts = [sample[field] for sample in batch if field in sample]
+            lengths.setdefault(field, []).extend(_count_tokens(texts, tokenizer_name, cache, new_entries))
+        texts = [sample["text"] if "text" in sample else
+                 prompt.format(sample.get("instruction", ""), sample.get("input", ""), sample.get("output", ""))
+                 for sample in batch]
+        lengths.setdefault(SAMPLE_FIELD, []).extend(_count_tokens(texts, tokenizer_name, cache, new_entries))
+        batch.clear()
+
+    for sample in iter_samples(path, counts):
+        batch.append(sample)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return lengths, new_entries, counts.get("skipped_lines", 0)
+
+
+def histogram(lengths: List[int], bin_width: int) -> Dict[str, int]:
+    """按bin_width划分区间统计数量，键为 "下界-上界" """
+    counts: Dict[int, int] = {}
+    for length in lengths:
+        counts[length // bin_width] = counts.get(length // bin_width, 0) + 1
+    return {f"{b * bin_width}-{(b + 1) * bin_width - 1}": counts[b] for b in sorted(counts)}
+
+
+def budget_report(lengths: Dict[str, List[int]], max_seq_length: int, batch_size: int,
+                  bin_width: int = 256) -> Dict[str, Any]:
+    """
+    汇总token长度分布，并估计在max_seq_length下的截断情况和每个epoch的训练量
+
+    Args:
+        lengths: 字段名 -> token数列表
+        max_seq_length: 训练的序列长度
+        batch_size: 每步的序列数（per_device_train_batch_size × gradient_accumulation_steps × 设备数）
+        bin_width: 直方图区间宽度
+
+    Returns:
+        统计字典
+    """
+    fields = {}
+    for field, values in lengths.items():
+        fields[field] = {
+            "count": len(values),
+            "mean": sum(values) / len(values) if values else 0.0,
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+            "max": max(values, default=0),
+            "histogram": histogram(values, bin_width),
+        }
+
+    samples = lengths.get(SAMPLE_FIELD, [])
+    tokens = sum(min(length, max_seq_length) for length in samples)
+    packed_sequences = math.ceil(tokens / max_seq_length)
+    return {
+        "fields": fields,
+        "budget": {
+            "max_seq_length": max_seq_length,
+            "samples": len(samples),
+            "samples_over_budget": sum(length > max_seq_length for length in samples),
+            "truncated_tokens": sum(max(length - max_seq_length, 0) for length in samples),
+            "tokens_per_epoch": tokens,
+            "padded_tokens_per_epoch": len(samples) * max_seq_length,
+            "steps_per_epoch": math.ceil(len(samples) / batch_size),
+            "packed_sequences_per_epoch": packed_sequences,
+            "packed_steps_per_epoch": math.ceil(packed_sequences / batch_size),
+        },
+    }
+
+
+def analyze_files(paths: List[str], tokenizer_name: Optional[str] = None, prompt: str = ALPACA_PROMPT,
+                  cache_path: Optional[str] = None, workers: int = 4,
+                  counts: Optional[Dict[str, int]] = None) -> Dict[str, List[int]]:
+    """
+    多进程计算多个文件的token数并合并
+
+    每个进程只加载一次tokenizer和缓存，新算出的token数在所有文件处理完后写入缓存，
+    再次运行（例如换一个max_seq_length）时不需要重新分词。
+
+    Args:
+        paths: 文件路径列表
+        tokenizer_name: Hugging Face tokenizer名称或路径，为None时按字符数粗略估计
+        prompt: 计算整条样本长度使用的提示词模板
+        cache_path: token数缓存文件，为None时不使用缓存
+        workers: 进程数
+        counts: 累计 'skipped_lines'（所有文件中跳过的行或记录数）的计数字典
+
+    Returns:
+        字段名 -> token数列表
+    """
+    job = functools.partial(analyze_file, tokenizer_name=tokenizer_name, prompt=prompt, cache_path=cache_path)
+    if workers <= 1 or len(paths) <= 1:
+        results = list(map(job, paths))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+            results = list(executor.map(job, paths))
+
+    merged: Dict[str, List[int]] = {}
+    new_entries: Dict[str, int] = {}
+    for lengths, entries, skipped in results:
+        for field, values in lengths.items():
+            merged.setdefault(field, []).extend(values)
+        new_entries.update(entries)
+        if counts is not None:
+            counts["skipped_lines"] = counts.get("skipped_lines", 0) + skipped
+    if cache_path and tokenizer_name:
+        TokenLengthCache(cache_path).append(new_entries)
+    return merged
+
+
+def format_budget_report(report: Dict[str, Any]) -> str:
+    """将统计格式化为便于在终端查看的文本"""
+    lines = [f"{'字段':<12} {'数量':>8} {'平均':>8} {'p50':>7} {'p90':>7} {'p99':>7} {'最大':>7}"]
+    for field, stats in report["fields"].items():
+        lines.append(f"{field:<12} {stats['count']:>8} {stats['mean']:>8.1f} {stats['p50']:>7} "
+                     f"{stats['p90']:>7} {stats['p99']:>7} {stats['max']:>7}")
+    budget = report["budget"]
+    samples = budget["samples"] or 1
+    lines.extend([
+        "",
+        f"max_seq_length = {budget['max_seq_length']}：{budget['samples_over_budget']}/{budget['samples']} "
+        f"个样本（{budget['samples_over_budget'] / samples:.1%}）超出，共截断 {budget['truncated_tokens']} 个token",
+        f"每个epoch的训练token数：{budget['tokens_per_epoch']}（不打包时填充到 {budget['padded_tokens_per_epoch']}）",
+        f"每个epoch的步数：不打包 {budget['steps_per_epoch']}，打包 {budget['packed_steps_per_epoch']}"
+        f"（约 {budget['packed_sequences_per_epoch']} 个序列）",
+    ])
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计导出的CoT数据的token长度分布并估计训练预算")
+    parser.add_argument("files", nargs="+", help="generated_answers_*.json、transformed_qa_*.json或JSONL文件")
+    parser.add_argument("--tokenizer", type=str, default=None, help="Hugging Face tokenizer名称或路径，默认按字符数粗略估计")
+    parser.add_argument("--max_seq_length", type=int, default=2048, help="训练的序列长度")
+    parser.add_argument("--batch_size", type=int, default=8, help="每步的序列数（batch size × 梯度累积步数 × 设备数）")
+    parser.add_argument("--bin_width", type=int, default=256, help="直方图区间宽度（token数）")
+    parser.add_argument("--cache", type=str, default=None, help="token数缓存文件，只在指定--tokenizer时使用")
+    parser.add_argument("--workers", type=int, default=4, help="进程数")
+    parser.add_argument("--output", type=str, default=None, help="将完整统计写入JSON文件")
+
+    args = parser.parse_args()
+
+    counts: Dict[str, int] = {}
+    lengths = analyze_files(args.files, args.tokenizer, cache_path=args.cache, workers=args.workers, counts=counts)
+    report = budget_report(lengths, args.max_seq_length, args.batch_size, args.bin_width)
+    report["skipped_lines"] = counts.get("skipped_lines", 0)
+    if report["skipped_lines"]:
+        print(f"跳过了 {report['skipped_lines']} 行无法解析的记录")
+    print(format_budget_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"统计已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import math
+from typing import Any, Dict, Optional
+
+# 每次请求的默认最大示例数：一次要求太多时模型输出容易被截断，导致整批JSON无法解析
+DEFAULT_MAX_BATCH_SIZE = 50
+# 连续多少次调用没有得到任何新问题时放弃
+DEFAULT_MAX_STALLED = 3
+
+
+def response_usage(response: Any) -> Dict[str, int]:
+    """
+    从agent响应的info["usage"]中读取本次调用的token用量，没有用量信息时均为0
+
+    Args:
+        response: agent.step的返回值
+
+    Returns:
+        {'prompt_tokens', 'completion_tokens', 'total_tokens'} 字典
+    """
+    usage = (getattr(response, "info", None) or {}).get("usage") or {}
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    total = usage.get("total_tokens")
+    if total is None:
+        total = prompt_tokens + completion_tokens
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": total}
+
+
+def response_tokens(response: Any) -> int:
+    """
+    从agent响应的info["usage"]中读取本次调用消耗的token数，没有用量信息时返回0
+
+    Args:
+        response: agent.step的返回值
+
+    Returns:
+        总token数
+    """
+    return response_usage(response)["total_tokens"]
+
+
+class TopUpScheduler:
+    """
+    单个子主题的生成调度器
+
+    决定每次调用向模型要求多少个示例，并在调用次数用完或连续多次没有新问题时停止，
+    避免模型反复返回重复问题或无法解析的JSON时无限重试。
+
+    - 解析失败时，下一次请求的数量减半（输出过长被截断是解析失败的常见原因），
+      请求数量还能减小时不计入停滞次数；输出被截断时，下一次最多要求这次实际输出的数量
+    - 解析成功时，逐步放宽请求数量的上限，但不超过曾经解析失败的数量
+    - 未指定调用次数上限时，按目标数量和当前每次请求的上限计算，批次变小时允许更多次调用
+    - 按最近几次调用中新问题占请求数量的比例（新问题产出率）多要一些，
+      使去重后的新问题数接近仍需的数量
+    """
+
+    def __init__(self, target: int, max_attempts: Optional[int] = None,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_stalled: int = DEFAULT_MAX_STALLED,
+                 smoothing: float = 0.5, reserved_attempts: int = 0):
+        """
+        Args:
+            target: 该子主题要生成的示例数
+            max_attempts: 最多调用模型的次数，None表示按目标数量和每次请求的上限自动计算
+            max_batch_size: 每次请求的最大示例数
+            max_stalled: 连续多少次调用没有新问题时停止
+            smoothing: 产出率和解析成功率的指数平滑系数，越大越看重最近一次调用
+            reserved_attempts: 不受调度控制的额外调用次数（如每个URL固定的一次调用），加到上限中
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size必须大于0")
+        self.target = target
+        self._max_attempts = max_attempts
+        self.reserved_attempts = reserved_attempts
+        self.max_batch_size = max_batch_size
+        self.max_stalled = max_stalled
+        self.smoothing = smoothing
+
+        self.batch_cap = max_batch_size
+        # 解析失败过的最小请求数量，放宽上限时不超过它
+        self.failed_batch: Optional[int] = None
+        self.yield_rate = 1.0
+        self.parse_rate = 1.0
+        self.duplicate_rate = 0.0
+
+        self.attempts = 0
+        self.stalled = 0
+        self.requested = 0
+        self.returned = 0
+        self.new = 0
+        self.parse_failures = 0
+        self.lost = 0
+        self.truncated = 0
+        self.tokens = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.wasted_tokens = 0
+
+    @property
+    def max_attempts(self) -> int:
+        """当前的调用次数上限"""
+        if self._max_attempts is not None:
+            return self._max_attempts + self.reserved_attempts
+        return 2 * math.ceil(self.target / self.batch_cap) + 3 + self.reserved_attempts
+
+    @property
+    def exhausted(self) -> bool:
+        """是否应该停止继续请求"""
+        return self.attempts >= self.max_attempts or self.stalled >= self.max_stalled
+
+    def next_batch(self, remaining: int) -> int:
+        """
+        计算下一次调用要求的示例数
+
+        Args:
+            remaining: 仍需的示例数
+
+        Returns:
+            本次请求的示例数
+        """
+        batch = math.ceil(remaining / max(self.yield_rate, 0.2))
+        return max(1, min(batch, self.batch_cap))
+
+    def record(self, requested: int, returned: Optional[int], new: int, tokens: int = 0,
+               lost: int = 0, truncated: bool = False, prompt_tokens: int = 0, completion_tokens: int = 0):
+        """
+        记录一次调用的结果
+
+        Args:
+            requested: 本次要求的示例数
+            returned: 解析出的问题数，解析失败时为None
+            new: 其中此前没有出现过的问题数
+            tokens: 本次调用消耗的token数
+            lost: 无法解析而丢弃的问题-答案对数量
+            truncated: 输出是否被截断
+            prompt_tokens: 本次调用的输入token数
+            completion_tokens: 本次调用的输出token数
+        """
+        self.attempts += 1
+        self.requested += requested
+        self.tokens += tokens
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.lost += lost
+        if truncated:
+            self.truncated += 1
+        # 解析失败但请求数量还能减小时不算停滞，下一次会用更小的批次重试
+        if new:
+            self.stalled = 0
+        elif returned is not None or requested <= 1:
+            self.stalled += 1
+
+        if returned is None:
+            self.parse_failures += 1
+            self.parse_rate = self._smooth(self.parse_rate, 0.0)
+            self.failed_batch = requested if self.failed_batch is None else min(self.failed_batch, requested)
+            self.batch_cap = max(1, requested // 2)
+            self.wasted_tokens += tokens
+            return
+
+        self.parse_rate = self._smooth(self.parse_rate, 1.0)
+        if truncated:
+            # 输出被截断时，下次最多要求这次实际输出的数量
+            limit = max(returned, 1) + 1
+            self.failed_batch = limit if self.failed_batch is None else min(self.failed_batch, limit)
+            self.batch_cap = max(1, min(self.batch_cap, returned))
+        self.returned += returned
+        self.new += new
+        self.yield_rate = self._smooth(self.yield_rate, min(new / requested, 1.0) if requested else 0.0)
+        if returned:
+            self.duplicate_rate = self._smooth(self.duplicate_rate, (returned - new) / returned)
+            self.wasted_tokens += round(tokens * (returned - new) / returned)
+        else:
+            self.wasted_tokens += tokens
+        if not truncated:
+            grown = max(self.batch_cap, requested * 2)
+            if self.failed_batch is not None:
+                grown = min(grown, max(self.failed_batch - 1, 1))
+            self.batch_cap = min(self.max_batch_size, grown)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回调度统计，用于写入元数据"""
+        return {
+            "target": self.target,
+            "attempts": self.attempts,
+            "requested": self.requested,
+            "returned": self.returned,
+            "new": self.new,
+            "duplicates": self.returned - self.new,
+            "duplicate_rate": (self.returned - self.new) / self.returned if self.returned else 0.0,
+            "parse_failures": self.parse_failures,
+            "lost_pairs": self.lost,
+            "truncated_responses": self.truncated,
+            "yield": self.new / self.requested if self.requested else 0.0,
+            "tokens": self.tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "wasted_tokens": self.wasted_tokens,
+        }
+
+    def _smooth(self, current: float, observed: float) -> float:
+        return (1 - self.smoothing) * current + self.smoothing * observed
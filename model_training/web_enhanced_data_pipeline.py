@@ -1,84 +1,85 @@
-import json
-import os
-from typing import List, Dict, Any, Optional
 import argparse
+from typing import Callable, Dict, List, Optional, Tuple
 from tqdm import tqdm
 
 from camel.agents import ChatAgent
-from camel.configs import DeepSeekConfig
-from camel.models import ModelFactory
-from camel.types import ModelPlatformType, ModelType
-from camel.loaders import Firecrawl
 
-class WebEnhancedDataPipeline:
-    def __init__(self, temperature: float = 0.2, api_key: Optional[str] = None):
+from content_index import DEFAULT_CHUNK_TOKENS, Chunk, ContentIndex, spread_examples
+from crawl_cache import (DEFAULT_CACHE_TTL, DEFAULT_CRAWL_CACHE_DIR, ContentCache, ContentFetcher, CrawlPrefetcher,
+                         FirecrawlFetcher, LocalFileFetcher)
+from decompose_cache import DEFAULT_DECOMPOSE_CACHE, DecompositionCache
+from run_checkpoint import RunCheckpoint
+from synthetic_data_pipeline import SyntheticDataPipeline, load_few_shot_examples
+from run_report import format_run_report
+from topup import DEFAULT_MAX_BATCH_SIZE
+
+SYSTEM_MESSAGE = "你是一个专门用于生成高质量合成数据的助手。你需要根据给定的主题和参考内容生成问题和答案对。数学公式必须使用LaTeX格式。确保数据的生成格式保持一致：JSON格式，以问题为键，答案为值。"
+
+class WebEnhancedDataPipeline(SyntheticDataPipeline):
+    system_prompt = SYSTEM_MESSAGE
+    
+    def __init__(self, temperature: float = 0.2, api_key: Optional[str] = None,
+                 requests_per_minute: Optional[float] = None, stateless: bool = False,
+                 few_shot_examples: Optional[Dict[str, str]] = None, max_attempts: Optional[int] = None,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, dedup_threshold: Optional[float] = 0.8,
+                 fetcher: Optional[ContentFetcher] = None, crawl_cache_dir: Optional[str] = None,
+                 crawl_cache_ttl: float = DEFAULT_CACHE_TTL, crawl_workers: int = 8, per_host_limit: int = 2,
+                 chunk_tokens: int = DEFAULT_CHUNK_TOKENS, chunks_per_subtopic: int = 5,
+                 decompose_cache: Optional[DecompositionCache] = None, refresh_subtopics: bool = False):
         """
         初始化网页增强的合成数据生成pipeline
         
+        主题分解、模型调用、补充生成和运行报告与SyntheticDataPipeline相同，
+        每个子主题先基于与它最相关的网页内容片段生成。
+        
         Args:
             temperature: 模型温度参数
             api_key: DeepSeek API密钥，如果为None则从环境变量获取
+            requests_per_minute: 每分钟最多调用模型的次数，None表示不限制
+            stateless: 为True时每次调用前清空agent的对话历史，只发送系统提示词和本次提示词，
+                每次调用的提示词大小不随已生成的数据量增长
+            few_shot_examples: 附加到系统提示词中的示例问题-答案对
+            max_attempts: 每个子主题补充生成时最多调用模型的次数，None表示按示例数量自动计算
+            max_batch_size: 每次调用最多要求生成的示例数
+            dedup_threshold: 近似重复问题的相似度阈值，整个数据集共用一个问题去重索引，
+                规范化后相同或近似重复的问题会被丢弃并补充生成；为None时只丢弃文本完全相同的问题
+            fetcher: 网页内容抓取器，为None时使用Firecrawl
+            crawl_cache_dir: 网页内容缓存目录，为None时只在本次运行的内存中缓存
+            crawl_cache_ttl: 网页内容缓存的有效期（秒）
+            crawl_workers: 同时抓取的URL数量上限
+            per_host_limit: 同一主机同时抓取的URL数量上限
+            chunk_tokens: 网页内容切分后每个片段的token预算
+            chunks_per_subtopic: 每个子主题最多使用的相关片段数
+            decompose_cache: 主题分解结果的缓存，为None时每次都调用模型分解主题
+            refresh_subtopics: 为True时忽略已缓存的分解结果，重新分解主题并更新缓存
         """
-        if api_key:
-            os.environ["DEEPSEEK_API_KEY"] = api_key
-        
-        self.model = ModelFactory.create(
-            model_platform=ModelPlatformType.DEEPSEEK,
-            model_type=ModelType.DEEPSEEK_CHAT,
-            model_config_dict=DeepSeekConfig(temperature=temperature).as_dict(),
+        super().__init__(
+            temperature=temperature,
+            api_key=api_key,
+            requests_per_minute=requests_per_minute,
+            stateless=stateless,
+            few_shot_examples=few_shot_examples,
+            max_attempts=max_attempts,
+            max_batch_size=max_batch_size,
+            dedup_threshold=dedup_threshold,
+            decompose_cache=decompose_cache,
+            refresh_subtopics=refresh_subtopics
         )
-        
-        self.agent = ChatAgent(
-            system_message="你是一个专门用于生成高质量合成数据的助手。你需要根据给定的主题和参考内容生成问题和答案对。数学公式必须使用LaTeX格式。确保数据的生成格式保持一致：JSON格式，以问题为键，答案为值。",
-            model=self.model
+        self.chunk_tokens = chunk_tokens
+        self.chunks_per_subtopic = chunks_per_subtopic
+        # 本次运行爬取的网页内容片段的检索索引
+        self.content_index: Optional[ContentIndex] = None
+        
+        self.prefetcher = CrawlPrefetcher(
+            fetcher if fetcher is not None else FirecrawlFetcher(),
+            ContentCache(crawl_cache_dir, crawl_cache_ttl),
+            max_workers=crawl_workers,
+            per_host_limit=per_host_limit
         )
-        
-        self.firecrawl = Firecrawl()
-    
-    def decompose_topic(self, main_topic: str, num_subtopics: int = 5) -> List[str]:
-        """
-        将主题分解为子主题
-        
-        Args:
-            main_topic: 主要主题
-            num_subtopics: 子主题数量
-            
-        Returns:
-            子主题列表
-        """
-        prompt = f"""
-        请将以下主题分解为{num_subtopics}个更具体的子主题：
-        
-        主题：{main_topic}
-        
-        请直接返回子主题列表，每行一个子主题，不要有任何额外的解释或编号。
-        """
-        
-        response = self.agent.step(prompt)
-        subtopics = [
-            line.strip() for line in response.msgs[0].content.strip().split("\n")
-            if line.strip()
-        ]
-        
-        # 确保我们有足够的子主题
-        if len(subtopics) < num_subtopics:
-            remaining = num_subtopics - len(subtopics)
-            more_prompt = f"""
-            请再提供{remaining}个关于"{main_topic}"的子主题，使其与之前提供的不同。
-            直接返回子主题列表，每行一个，不要有任何额外的解释或编号。
-            """
-            more_response = self.agent.step(more_prompt)
-            more_subtopics = [
-                line.strip() for line in more_response.msgs[0].content.strip().split("\n")
-                if line.strip()
-            ]
-            subtopics.extend(more_subtopics[:remaining])
-        
-        return subtopics[:num_subtopics]
     
     def crawl_url(self, url: str) -> str:
         """
-        爬取URL内容
+        爬取URL内容，优先使用缓存
         
         Args:
             url: 要爬取的URL
@@ -86,33 +87,27 @@ class WebEnhancedDataPipeline:
         Returns:
             提取的内容
         """
-        try:
-            response = self.firecrawl.crawl(url=url)
-            if response["status"] == "completed" and response["data"]:
-                return response["data"][0]["markdown"]
-            return ""
-        except Exception as e:
-            print(f"爬取URL {url} 时出错: {e}")
-            return ""
+        return self.prefetcher.get(url)
     
-    def generate_data_from_content(self, subtopic: str, content: str, num_examples: int) -> Dict[str, str]:
+    def prefetch_urls(self, urls: List[str]) -> Dict[str, str]:
         """
-        基于爬取的内容生成数据
+        并发爬取一组URL，每个不同的URL只爬取一次
         
         Args:
-            subtopic: 子主题
-            content: 爬取的内容
-            num_examples: 要生成的示例数量
+            urls: URL列表
             
         Returns:
-            问题-答案对的字典
+            {URL: 提取的内容}，爬取失败的URL内容为空字符串
         """
-        # 限制内容长度，避免超出模型上下文窗口
-        max_content_length = 3000
-        if len(content) > max_content_length:
-            content = content[:max_content_length] + "..."
-        
-        prompt = f"""
+        contents = self.prefetcher.prefetch(urls)
+        stats = self.prefetcher.stats
+        print(f"网页内容：{len(contents)} 个URL，缓存命中 {stats['cache_hits']}，"
+              f"新爬取 {stats['fetched']}，未变化 {stats['not_modified']}，失败 {stats['failed']}")
+        return contents
+    
+    def _content_prompt(self, subtopic: str, content: str, num_examples: int) -> str:
+        """构造基于爬取内容生成数据的提示词，content应为split_chunks切分出的片段"""
+        return f"""
         请基于以下内容，为主题"{subtopic}"生成{num_examples}个高质量的问题和答案对：
         
         参考内容：
@@ -137,83 +132,6 @@ class WebEnhancedDataPipeline:
         问题和答案应该直接或间接地基于给定的参考内容。
         请保持一致的格式和输出风格。
         """
-        
-        response = self.agent.step(prompt)
-        content = response.msgs[0].content
-        
-        # 提取JSON部分
-        try:
-            # 查找第一个{和最后一个}之间的内容
-            start_idx = content.find('{')
-            end_idx = content.rfind('}')
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = content[start_idx:end_idx+1]
-                data = json.loads(json_str)
-                return data
-            else:
-                # 尝试直接解析
-                return json.loads(content)
-        except json.JSONDecodeError:
-            # 如果解析失败，返回空字典
-            print(f"无法解析子主题 '{subtopic}' 的JSON响应")
-            return {}
-    
-    def generate_fallback_data(self, subtopic: str, num_examples: int) -> Dict[str, str]:
-        """
-        在没有URL内容时生成备用数据
-        
-        Args:
-            subtopic: 子主题
-            num_examples: 要生成的示例数量
-            
-        Returns:
-            问题-答案对的字典
-        """
-        prompt = f"""
-        请为以下子主题生成{num_examples}个高质量的问题和答案对：
-        
-        子主题：{subtopic}
-        
-        请按照以下JSON格式返回结果，不要有任何额外的解释：
-        
-        {{
-            "问题1": "答案1",
-            "问题2": "答案2",
-            ...
-        }}
-        
-        确保问题具有挑战性和多样性，答案简洁明了。
-        
-        如果是数学问题，必须使用LaTeX格式来表示数学公式，例如：
-        {{
-            "What is the coefficient of $x^2y^6$ in the expansion of $\\\\left(\\\\frac{{3}}{{5}}x-\\\\frac{{y}}{{2}}\\\\right)^8$?": "\\\\frac{{63}}{{400}}",
-            "how many a in banana?": "3"
-        }}
-        
-        请保持一致的格式和输出风格。
-        """
-        
-        response = self.agent.step(prompt)
-        content = response.msgs[0].content
-        
-        # 提取JSON部分
-        try:
-            # 查找第一个{和最后一个}之间的内容
-            start_idx = content.find('{')
-            end_idx = content.rfind('}')
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = content[start_idx:end_idx+1]
-                data = json.loads(json_str)
-                return data
-            else:
-                # 尝试直接解析
-                return json.loads(content)
-        except json.JSONDecodeError:
-            # 如果解析失败，返回空字典
-            print(f"无法解析子主题 '{subtopic}' 的JSON响应")
-            return {}
     
     def generate_synthetic_data(
         self, 
@@ -236,91 +154,132 @@ class WebEnhancedDataPipeline:
         Returns:
             合并后的问题-答案对字典
         """
+        self._reset_run_state()
         # 分解主题为子主题
         subtopics = self.decompose_topic(main_topic, num_subtopics)
         
-        # 计算每个子主题需要生成的示例数
-        examples_per_subtopic = total_examples // len(subtopics)
-        remainder = total_examples % len(subtopics)
+        # 所有子主题共用同一批网页内容，在生成前一次性爬取
+        self.load_web_content(urls if use_web_content else None)
         
         # 为每个子主题生成数据
         all_data = {}
-        for i, subtopic in enumerate(tqdm(subtopics, desc="生成子主题数据")):
-            # 最后一个子主题处理余数
-            num_examples = examples_per_subtopic + (remainder if i == len(subtopics) - 1 else 0)
-            
-            subtopic_data = {}
-            
-            # 如果启用了网页内容增强且提供了URL
-            if use_web_content and urls:
-                # 爬取URL内容
-                for url in urls:
-                    content = self.crawl_url(url)
-                    if content:
-                        # 基于内容生成数据
-                        examples_this_url = num_examples // len(urls)
-                        url_data = self.generate_data_from_content(subtopic, content, examples_this_url)
-                        subtopic_data.update(url_data)
-            
-            # 如果没有获得足够的示例，使用备用方法生成
-            if len(subtopic_data) < num_examples:
-                remaining = num_examples - len(subtopic_data)
-                fallback_data = self.generate_fallback_data(subtopic, remaining)
-                subtopic_data.update(fallback_data)
-            
-            # 更新总数据集
-            all_data.update(subtopic_data)
-            
-            # 如果仍然没有获得足够的示例，继续生成
-            while len(subtopic_data) < num_examples:
-                remaining = num_examples - len(subtopic_data)
-                more_prompt = f"""
-                请为子主题"{subtopic}"再生成{remaining}个不同的问题和答案对，确保它们与之前提供的不同。
-                
-                必须按以下JSON格式返回：
-                {{
-                    "问题1": "答案1",
-                    "问题2": "答案2"
-                }}
-                
-                如果是数学问题，必须使用LaTeX格式，例如：
-                {{
-                    "What is the coefficient of $x^2y^6$ in the expansion of $\\\\left(\\\\frac{{3}}{{5}}x-\\\\frac{{y}}{{2}}\\\\right)^8$?": "\\\\frac{{63}}{{400}}"
-                }}
-                """
-                more_response = self.agent.step(more_prompt)
-                try:
-                    more_content = more_response.msgs[0].content
-                    start_idx = more_content.find('{')
-                    end_idx = more_content.rfind('}')
-                    
-                    if start_idx != -1 and end_idx != -1:
-                        json_str = more_content[start_idx:end_idx+1]
-                        more_data = json.loads(json_str)
-                        subtopic_data.update(more_data)
-                        all_data.update(more_data)
-                    else:
-                        more_data = json.loads(more_content)
-                        subtopic_data.update(more_data)
-                        all_data.update(more_data)
-                except:
-                    # 如果解析失败，继续尝试
-                    pass
+        counts = self._split_examples(subtopics, total_examples)
+        for subtopic, num_examples in zip(tqdm(subtopics, desc="生成子主题数据"), counts):
+            all_data.update(self.generate_subtopic(subtopic, num_examples))
         
         return all_data
     
-    def save_to_file(self, data: Dict[str, str], output_file: str):
+    def generate_to_run_dir(self, main_topic: str, total_examples: int, run_dir: str,
+                            num_subtopics: int = 5, resume: bool = False, concurrency: int = 1,
+                            urls: Optional[List[str]] = None) -> RunCheckpoint:
+        """
+        爬取网页内容后生成合成数据，边生成边写入运行目录，中断后可以继续
+        
+        继续运行时同样需要传入urls（网页内容有缓存时不会重新爬取）；还没有数据的子主题
+        基于网页片段生成，已有部分数据的子主题只补充生成不足的部分。其余参数同SyntheticDataPipeline。
+        
+        Args:
+            main_topic: 主要主题
+            total_examples: 要生成的总示例数量
+            run_dir: 运行目录
+            num_subtopics: 子主题数量
+            resume: 是否继续运行目录中未完成的运行
+            concurrency: 同时生成的子主题数量
+            urls: 用户提供的URL列表
+            
+        Returns:
+            已关闭的RunCheckpoint，可用其export_json导出数据
+        """
+        self.load_web_content(urls)
+        return super().generate_to_run_dir(main_topic, total_examples, run_dir, num_subtopics, resume, concurrency)
+    
+    def load_web_content(self, urls: Optional[List[str]]):
+        """
+        爬取URL并建立网页内容片段的检索索引，之后生成的子主题都使用这些内容
+        
+        Args:
+            urls: URL列表，为空时不使用网页内容
+        """
+        contents = self.prefetch_urls(urls) if urls else {}
+        self.content_index = ContentIndex.from_pages(contents, self.chunk_tokens) if contents else None
+        if self.content_index is not None:
+            print(f"网页内容切分为 {len(self.content_index)} 个片段")
+    
+    def generate_subtopic(self, subtopic: str, num_examples: int,
+                          agent: Optional[ChatAgent] = None,
+                          existing: Optional[Dict[str, str]] = None,
+                          on_pairs: Optional[Callable[[Dict[str, str]], None]] = None,
+                          initial_prompts: Optional[List[Tuple[str, int]]] = None) -> Dict[str, str]:
+        """
+        为单个子主题生成数据：先基于与子主题最相关的网页片段生成，不足的部分再补充生成
+        
+        示例数分配到self.content_index中最相关的几个片段上，每个片段调用一次；
+        子主题已有数据（从运行目录继续）或没有网页内容时直接补充生成。
+        使用的片段记录在self.subtopic_stats的reference_chunks中。其余参数同SyntheticDataPipeline。
+        
+        Args:
+            subtopic: 子主题
+            num_examples: 要生成的示例数量
+            agent: 使用的agent，默认为self.agent
+            existing: 该子主题已有的问题-答案对
+            on_pairs: 每解析出一批新的问题-答案对时调用
+            initial_prompts: 在网页片段的提示词之后、补充生成之前发送的提示词
+            
+        Returns:
+            该子主题的问题-答案对字典
+        """
+        chunks, prompts = [], []
+        if self.content_index is not None and not existing:
+            chunks, prompts = self._chunk_prompts(subtopic, num_examples, self.content_index)
+        
+        subtopic_data = super().generate_subtopic(subtopic, num_examples, agent, existing, on_pairs,
+                                                  prompts + list(initial_prompts or []))
+        self.subtopic_stats[subtopic]["reference_chunks"] = [
+            {"url": chunk.url, "position": chunk.position, "score": round(score, 3)}
+            for chunk, score in chunks
+        ]
+        return subtopic_data
+    
+    def generate_data_from_content(self, subtopic: str, content: str, num_examples: int) -> Dict[str, str]:
         """
-        将生成的数据保存到文件
+        基于一段给定的内容为子主题生成数据，不足的部分补充生成
+        
+        content切分成片段后按generate_subtopic的方式使用，不影响self.content_index。
         
         Args:
-            data: 问题-答案对字典
-            output_file: 输出文件路径
+            subtopic: 子主题
+            content: 参考内容
+            num_examples: 要生成的示例数量
+            
+        Returns:
+            生成的问题-答案对字典
+        """
+        index = ContentIndex.from_pages({"": content}, self.chunk_tokens)
+        _, prompts = self._chunk_prompts(subtopic, num_examples, index)
+        return super().generate_subtopic(subtopic, num_examples, initial_prompts=prompts)
+    
+    def generate_fallback_data(self, subtopic: str, num_examples: int) -> Dict[str, str]:
         """
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        不使用网页内容为子主题生成数据
         
-        print(f"数据已保存到 {output_file}")
+        Args:
+            subtopic: 子主题
+            num_examples: 要生成的示例数量
+            
+        Returns:
+            生成的问题-答案对字典
+        """
+        return super().generate_subtopic(subtopic, num_examples)
+    
+    def _chunk_prompts(self, subtopic: str, num_examples: int,
+                       content_index: ContentIndex) -> Tuple[List[Tuple[Chunk, float]], List[Tuple[str, int]]]:
+        """检索与子主题最相关的片段，把示例数分配到片段上，返回 ((片段, 得分)列表, (提示词, 示例数)列表)"""
+        chunks = content_index.search(subtopic, min(self.chunks_per_subtopic, num_examples))
+        chunk_counts = spread_examples(num_examples, len(chunks))
+        chunks = chunks[:len(chunk_counts)]
+        prompts = [(self._content_prompt(subtopic, chunk.text, count), count)
+                   for (chunk, _), count in zip(chunks, chunk_counts)]
+        return chunks, prompts
 
 def main():
     parser = argparse.ArgumentParser(description="网页增强合成数据生成器")
@@ -332,10 +291,63 @@ def main():
     parser.add_argument("--api_key", type=str, help="DeepSeek API密钥")
     parser.add_argument("--no_web", action="store_true", help="禁用网页内容增强")
     parser.add_argument("--urls", type=str, nargs='+', help="要爬取的URL列表")
+    parser.add_argument("--requests_per_minute", type=float, default=None, help="每分钟最多调用模型的次数")
+    parser.add_argument("--stateless", action="store_true", help="每次调用不携带对话历史，提示词大小保持不变")
+    parser.add_argument("--run_dir", type=str, default=None, help="运行目录，边生成边写入，中断后可以继续")
+    parser.add_argument("--resume", action="store_true", help="继续--run_dir中未完成的运行")
+    parser.add_argument("--few_shot_file", type=str, default=None, help="示例问题-答案对JSON文件，附加到系统提示词中")
+    parser.add_argument("--max_attempts", type=int, default=None, help="每个子主题最多调用模型的次数，默认按示例数量自动计算")
+    parser.add_argument("--max_batch_size", type=int, default=DEFAULT_MAX_BATCH_SIZE, help="每次调用最多要求生成的示例数")
+    parser.add_argument("--dedup_threshold", type=float, default=0.8, help="近似重复问题的相似度阈值")
+    parser.add_argument("--no_dedup", action="store_true", help="只丢弃文本完全相同的问题，不检查近似重复")
+    parser.add_argument("--decompose_cache", type=str, default=DEFAULT_DECOMPOSE_CACHE, help="主题分解结果的缓存文件")
+    parser.add_argument("--no_decompose_cache", action="store_true", help="不使用主题分解缓存")
+    parser.add_argument("--refresh_subtopics", action="store_true", help="忽略缓存的主题分解结果，重新分解主题")
+    parser.add_argument("--crawl_cache_dir", type=str, default=DEFAULT_CRAWL_CACHE_DIR, help="网页内容缓存目录")
+    parser.add_argument("--crawl_cache_ttl", type=float, default=DEFAULT_CACHE_TTL, help="网页内容缓存的有效期（秒）")
+    parser.add_argument("--crawl_workers", type=int, default=8, help="同时爬取的URL数量")
+    parser.add_argument("--per_host_limit", type=int, default=2, help="同一网站同时爬取的URL数量")
+    parser.add_argument("--chunk_tokens", type=int, default=DEFAULT_CHUNK_TOKENS, help="网页内容切分后每个片段的token预算")
+    parser.add_argument("--chunks_per_subtopic", type=int, default=5, help="每个子主题最多使用的相关网页片段数")
+    parser.add_argument("--local_pages_dir", type=str, default=None, help="从本地目录读取网页内容而不是使用Firecrawl（测试或离线运行）")
     
     args = parser.parse_args()
+    if args.resume and not args.run_dir:
+        parser.error("--resume 需要同时指定 --run_dir")
+    
+    pipeline = WebEnhancedDataPipeline(
+        temperature=args.temperature,
+        api_key=args.api_key,
+        requests_per_minute=args.requests_per_minute,
+        stateless=args.stateless,
+        few_shot_examples=load_few_shot_examples(args.few_shot_file),
+        max_attempts=args.max_attempts,
+        max_batch_size=args.max_batch_size,
+        dedup_threshold=None if args.no_dedup else args.dedup_threshold,
+        fetcher=LocalFileFetcher(args.local_pages_dir) if args.local_pages_dir else None,
+        crawl_cache_dir=args.crawl_cache_dir,
+        crawl_cache_ttl=args.crawl_cache_ttl,
+        crawl_workers=args.crawl_workers,
+        per_host_limit=args.per_host_limit,
+        chunk_tokens=args.chunk_tokens,
+        chunks_per_subtopic=args.chunks_per_subtopic,
+        decompose_cache=None if args.no_decompose_cache else DecompositionCache(args.decompose_cache),
+        refresh_subtopics=args.refresh_subtopics
+    )
+    if args.run_dir:
+        checkpoint = pipeline.generate_to_run_dir(
+            main_topic=args.topic,
+            total_examples=args.num_examples,
+            run_dir=args.run_dir,
+            num_subtopics=args.num_subtopics,
+            resume=args.resume,
+            urls=None if args.no_web else args.urls
+        )
+        count = checkpoint.export_json(args.output)
+        print(f"{count} 个数据样本已保存到 {args.output}")
+        print(format_run_report(pipeline.run_report()))
+        return
     
-    pipeline = WebEnhancedDataPipeline(temperature=args.temperature, api_key=args.api_key)
     data = pipeline.generate_synthetic_data(
         main_topic=args.topic,
         total_examples=args.num_examples,
@@ -345,6 +357,7 @@ def main():
     )
     
     pipeline.save_to_file(data, args.output)
+    print(format_run_report(pipeline.run_report()))
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
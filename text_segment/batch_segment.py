@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""
+批量分段工具：将目录或通配符匹配到的大量文本文件分段，结果写入同一个CSV/JSONL文件
+
+用法示例：
+    python batch_segment.py articles/ --output segments.jsonl --workers 8
+    python batch_segment.py "dumps/**/*.txt" --output segments.csv --max_length 1000
+    python batch_segment.py articles/ --output segments.jsonl --dedup_index dedup_index.json
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+from multiprocessing import Pool
+
+from dedup import DUPLICATE, NEAR_DUPLICATE, SegmentDeduplicator
+from text_segmentation import TextSegmenter
+
+FIELDS = ['source_file', 'segment_index', 'start', 'end', 'overlap_start', 'text', 'length']
+# 启用去重时追加的字段
+DEDUP_FIELDS = ['segment_id', 'near_duplicate_of']
+
+# 每个工作进程复用同一个TextSegmenter（及其预编译的正则表达式）
+_segmenter = None
+
+
+def _init_worker(segmenter_kwargs):
+    global _segmenter
+    _segmenter = TextSegmenter(**segmenter_kwargs)
+
+
+def _segment_file(path):
+    """
+    在工作进程中对单个文件分段
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        (文件路径, 文件字节数, 分段列表, 错误信息)，
+        分段为 (start, end, overlap_start, 含重叠的文本, 长度, 不含重叠的文本)
+    """
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        # 偏移量指向原文，文本与segment_text的输出相同，长度按配置的长度函数计算
+        segments = [
+            (span.start, span.end, span.overlap_start,
+             segment, _segmenter.length_function(segment), _segmenter.preprocess_text(span.text))
+            for segment, span in _segmenter.segment_text_spans(text)
+        ]
+        return path, size, segments, None
+    except Exception as e:
+        return path, 0, [], str(e)
+
+
+def collect_files(inputs, pattern="*.txt"):
+    """
+    将输入的目录、文件和通配符展开为文件列表
+
+    Args:
+        inputs: 目录、文件路径或通配符列表
+        pattern: 目录中要匹配的文件名模式
+
+    Returns:
+        去重并排序后的文件路径列表
+    """
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            files.update(glob.glob(os.path.join(item, '**', pattern), recursive=True))
+        elif os.path.isfile(item):
+            files.add(item)
+        else:
+            files.update(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+    return sorted(files)
+
+
+class _SegmentWriter:
+    """按输出文件扩展名选择CSV或JSONL格式，逐行写入分段结果"""
+
+    def __init__(self, output_path, output_format=None, fields=FIELDS):
+        if output_format is None:
+            output_format = 'jsonl' if output_path.endswith(('.jsonl', '.json')) else 'csv'
+        self.output_format = output_format
+        self.fields = fields
+        self.file = open(output_path, 'w', encoding='utf-8', newline='')
+        if output_format == 'csv':
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(fields)
+
+    def write(self, row):
+        if self.output_format == 'csv':
+            self.writer.writerow([row[field] for field in self.fields])
+        else:
+            self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+def segment_files(files, output_path, segmenter_kwargs, workers=None, output_format=None, chunksize=8,
+                  deduplicator=None):
+    """
+    用进程池并行分段，结果按完成顺序流式写入同一个输出文件
+
+    启用去重时，去重在主进程中进行，所有文件共用同一个索引：
+    与已见分段完全重复的分段被丢弃，近似重复的分段保留并标记
+
+    Args:
+        files: 要分段的文件列表
+        output_path: 输出文件路径（.csv 或 .jsonl）
+        segmenter_kwargs: 传给TextSegmenter的参数
+        workers: 工作进程数，默认为CPU核数
+        output_format: 'csv' 或 'jsonl'，默认根据扩展名判断
+        chunksize: 每次分发给工作进程的文件数
+        deduplicator: SegmentDeduplicator实例，为None时不去重
+
+    Returns:
+        运行统计信息字典
+    """
+    stats = {'files': 0, 'failed_files': 0, 'segments': 0, 'bytes': 0,
+             'duplicate_segments': 0, 'near_duplicate_segments': 0}
+    start_time = time.perf_counter()
+
+    fields = FIELDS if deduplicator is None else FIELDS + DEDUP_FIELDS
+    writer = _SegmentWriter(output_path, output_format, fields)
+    try:
+        with Pool(workers, initializer=_init_worker, initargs=(segmenter_kwargs,)) as pool:
+            for path, size, segments, error in pool.imap_unordered(_segment_file, files, chunksize):
+                if error is not None:
+                    print(f"Error segmenting {path}: {error}")
+                    stats['failed_files'] += 1
+                    continue
+
+                written = 0
+                for i, (start, end, overlap_start, segment, length, content) in enumerate(segments):
+                    row = {
+                        'source_file': path,
+                        'segment_index': i,
+                        'start': start,
+                        'end': end,
+                        'overlap_start': overlap_start,
+                        'text': segment,
+                        'length': length,
+                    }
+                    if deduplicator is not None:
+                        # 按不含重叠的内容去重，避免上下文不同的同一段落被当作不同分段
+                        result = deduplicator.check(content)
+                        if result.status == DUPLICATE:
+                            stats['duplicate_segments'] += 1
+                            continue
+                        if result.status == NEAR_DUPLICATE:
+                            stats['near_duplicate_segments'] += 1
+                        row['segment_id'] = result.segment_id
+                        row['near_duplicate_of'] = result.match_id or ''
+                    writer.write(row)
+                    written += 1
+                stats['files'] += 1
+                stats['segments'] += written
+                stats['bytes'] += size
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start_time
+    stats['seconds'] = elapsed
+    stats['files_per_sec'] = stats['files'] / elapsed if elapsed else 0.0
+    stats['mb_per_sec'] = stats['bytes'] / 1024 / 1024 / elapsed if elapsed else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量文本分段工具")
+    parser.add_argument("inputs", nargs='+', help="输入目录、文件或通配符")
+    parser.add_argument("--output", type=str, default="segments.csv", help="输出文件路径（.csv 或 .jsonl）")
+    parser.add_argument("--format", type=str, choices=['csv', 'jsonl'], help="输出格式，默认根据扩展名判断")
+    parser.add_argument("--pattern", type=str, default="*.txt", help="目录中要匹配的文件名模式")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认为CPU核数")
+    parser.add_argument("--delimiter", type=str, default="\n\n", help="段落分隔符")
+    parser.add_argument("--max_length", type=int, default=1000, help="每段最大长度")
+    parser.add_argument("--overlap_length", type=int, default=100, help="重叠长度")
+    parser.add_argument("--min_segment_length", type=int, default=200, help="最小段落长度")
+    parser.add_argument("--length_function", type=str, choices=['chars', 'cjk'], default='chars', help="长度计算方式")
+    parser.add_argument("--packing", type=str, choices=['greedy', 'balanced'], default='greedy',
+                        help="分段方式：greedy为贪心装满，balanced在段数不变的前提下让各段长度尽量均匀")
+    parser.add_argument("--remove_urls", action="store_true", help="删除URL和邮箱地址")
+    parser.add_argument("--split_english_sentences", action="store_true", help="英文句号、问号和感叹号也作为句子边界")
+    parser.add_argument("--dedup_index", type=str, default=None,
+                        help="去重索引文件路径，存在时先加载，运行结束后保存")
+    parser.add_argument("--dedup_max_entries", type=int, default=1000000, help="去重索引最多保存的分段数")
+
+    args = parser.parse_args()
+
+    files = collect_files(args.inputs, args.pattern)
+    if not files:
+        print("没有找到要分段的文件")
+        return
+    print(f"共找到 {len(files)} 个文件")
+
+    segmenter_kwargs = {
+        'delimiter': args.delimiter,
+        'max_length': args.max_length,
+        'overlap_length': args.overlap_length,
+        'replace_continuous_spaces': True,
+        'remove_urls': args.remove_urls,
+        'min_segment_length': args.min_segment_length,
+        'length_function': args.length_function,
+        'packing': args.packing,
+        'split_english_sentences': args.split_english_sentences,
+    }
+
+    deduplicator = None
+    if args.dedup_index:
+        if os.path.exists(args.dedup_index):
+            deduplicator = SegmentDeduplicator.load(args.dedup_index, args.dedup_max_entries)
+            print(f"已加载去重索引: {args.dedup_index}（{len(deduplicator)} 个分段）")
+        else:
+            deduplicator = SegmentDeduplicator(max_entries=args.dedup_max_entries)
+
+    stats = segment_files(files, args.output, segmenter_kwargs, args.workers, args.format,
+                          deduplicator=deduplicator)
+
+    print(f"\n分段结果已保存到: {args.output}")
+    print(f"处理文件: {stats['files']} 个，失败: {stats['failed_files']} 个，共 {stats['segments']} 段")
+    if deduplicator is not None:
+        deduplicator.save(args.dedup_index)
+        print(f"丢弃重复分段: {stats['duplicate_segments']} 段，标记近似重复: {stats['near_duplicate_segments']} 段")
+        print(f"去重索引已保存到: {args.dedup_index}（{len(deduplicator)} 个分段）")
+    print(f"耗时: {stats['seconds']:.2f} 秒")
+    print(f"吞吐量: {stats['files_per_sec']:.2f} 文件/秒，{stats['mb_per_sec']:.2f} MB/秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+"""
+TextSegmenter基准测试：在几类合成语料上分别测量 preprocess_text、segment_text
+和 merge_short_segments 的吞吐量、峰值内存和分段数量，结果保存为JSON，便于在不同提交之间比较
+
+用法示例：
+    python benchmark.py --output bench_before.json
+    python benchmark.py --output bench_after.json --compare bench_before.json
+    python benchmark.py --size 200000 --repeat 5 --corpora chinese mixed
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+from text_segmentation import TextSegmenter
+
+_CHINESE_WORDS = (
+    "患者 血糖 胆固醇 甘油三酯 检验 结果 医生 建议 复查 指标 正常 异常 肝功能 肾功能 "
+    "体重 饮食 运动 睡眠 血压 心率 治疗 方案 药物 剂量 随访 观察 症状 诊断 报告 数据"
+).split()
+_ENGLISH_WORDS = (
+    "the patient blood glucose level was measured after fasting and compared with reference "
+    "range results indicate mild elevation doctor recommends follow up diet exercise weight "
+    "management plan includes regular monitoring of cholesterol triglycerides and pressure"
+).split()
+_CHINESE_ENDINGS = "。。。！？；"
+_ENGLISH_ENDINGS = "...!?"
+
+
+def _chinese_sentence(rng):
+    return "".join(rng.choice(_CHINESE_WORDS) for _ in range(rng.randint(5, 30))) + rng.choice(_CHINESE_ENDINGS)
+
+
+def _english_sentence(rng):
+    words = [rng.choice(_ENGLISH_WORDS) for _ in range(rng.randint(5, 25))]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + rng.choice(_ENGLISH_ENDINGS)
+
+
+def _mixed_sentence(rng):
+    if rng.random() < 0.5:
+        return _chinese_sentence(rng)
+    # 中文句子中夹杂英文术语、数字和网址
+    return (_chinese_sentence(rng)[:-1] + f" HbA1c {rng.uniform(4, 12):.1f}% "
+            + rng.choice(["https://example.com/report", "LDL-C", "BMI 27.5", "  "])
+            + _chinese_sentence(rng))
+
+
+def _paragraphs(rng, size, make_sentence, sentence_sep):
+    parts = []
+    total = 0
+    while total < size:
+        paragraph = sentence_sep.join(make_sentence(rng) for _ in range(rng.randint(1, 12)))
+        # 偶尔插入多余的空格和空行，让预处理有事可做
+        if rng.random() < 0.2:
+            paragraph = paragraph.replace(" ", "   ", 3) + "\t\n"
+        parts.append(paragraph)
+        parts.append("\n\n")
+        total += len(paragraph) + 2
+    return "".join(parts)[:size]
+
+
+def generate_corpus(kind, size, seed=0):
+    """
+    生成指定类型的合成语料
+
+    Args:
+        kind: 'chinese'、'english'、'mixed' 或 'huge_paragraph'
+        size: 语料字符数
+        seed: 随机种子，相同参数总是生成相同的语料
+
+    Returns:
+        语料文本
+    """
+    rng = random.Random(seed)
+    if kind == 'chinese':
+        return _paragraphs(rng, size, _chinese_sentence, "")
+    if kind == 'english':
+        return _paragraphs(rng, size, _english_sentence, " ")
+    if kind == 'mixed':
+        return _paragraphs(rng, size, _mixed_sentence, "\n")
+    if kind == 'huge_paragraph':
+        # 没有分隔符也没有句末标点的单个超长段落
+        return " ".join(rng.choice(_ENGLISH_WORDS + _CHINESE_WORDS) for _ in range(size // 4))[:size]
+    raise ValueError(f"未知的语料类型: {kind}")
+
+
+CORPORA = ['chinese', 'english', 'mixed', 'huge_paragraph']
+
+
+def _measure(func, arg, repeat):
+    """
+    多次运行func(arg)，返回最快一次的耗时、峰值内存和每次运行结果的长度
+
+    峰值内存单独运行一次测量，避免tracemalloc的开销影响计时
+    """
+    times = []
+    counts = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        times.append(time.perf_counter() - start)
+        counts.append(len(result))
+        del result
+
+    tracemalloc.start()
+    result = func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return min(times), peak, counts
+
+
+def run_benchmark(corpora, size, repeat, segmenter_kwargs, seed=0):
+    """
+    对每类语料分别测量三个阶段
+
+    Args:
+        corpora: 语料类型列表
+        size: 每份语料的字符数
+        repeat: 每个阶段重复运行的次数，计时取最快一次
+        segmenter_kwargs: 传给TextSegmenter的参数
+        seed: 生成语料的随机种子
+
+    Returns:
+        {语料类型: {阶段: 指标字典}}
+    """
+    segmenter = TextSegmenter(**segmenter_kwargs)
+    results = {}
+    for kind in corpora:
+        text = generate_corpus(kind, size, seed)
+        # merge_short_segments 的输入：预处理后的文本按行切开（预处理会把连续换行合并为一个）
+        pieces = segmenter.preprocess_text(text).split("\n")
+
+        stages = {
+            'preprocess_text': (segmenter.preprocess_text, text, len(text)),
+            'segment_text': (segmenter.segment_text, text, len(text)),
+            'merge_short_segments': (segmenter.merge_short_segments, pieces, sum(len(p) for p in pieces)),
+        }
+        results[kind] = {}
+        for stage, (func, arg, chars) in stages.items():
+            seconds, peak, counts = _measure(func, arg, repeat)
+            results[kind][stage] = {
+                'chars': chars,
+                'seconds': seconds,
+                'chars_per_sec': chars / seconds if seconds else 0.0,
+                'peak_memory_bytes': peak,
+                # preprocess_text 的输出长度是字符数，其余阶段是分段数
+                'output_count': counts[0],
+                'stable': len(set(counts)) == 1,
+            }
+            print(f"{kind:>15} {stage:>21}: {results[kind][stage]['chars_per_sec'] / 1e6:8.2f} M字符/秒  "
+                  f"峰值内存 {peak / 1024 / 1024:8.2f} MB  输出 {counts[0]}")
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(current, baseline):
+    """
+    打印两次基准测试的对比：吞吐量和峰值内存的变化，以及分段数量是否改变
+
+    Args:
+        current: 本次结果（run_benchmark返回的字典所在的完整报告）
+        baseline: 作为基准的报告
+    """
+    print(f"\n与 {baseline.get('commit') or '基准'} 比较：")
+    if baseline.get('config') != current.get('config'):
+        print("注意：两次运行的参数不同，结果可能不可比")
+    for kind, stages in current['results'].items():
+        for stage, metrics in stages.items():
+            old = baseline['results'].get(kind, {}).get(stage)
+            if old is None:
+                continue
+            speedup = metrics['chars_per_sec'] / old['chars_per_sec'] if old['chars_per_sec'] else 0.0
+            memory = metrics['peak_memory_bytes'] / old['peak_memory_bytes'] if old['peak_memory_bytes'] else 0.0
+            changed = "" if metrics['output_count'] == old['output_count'] else \
+                f"  输出数量改变: {old['output_count']} -> {metrics['output_count']}"
+            print(f"{kind:>15} {stage:>21}: 吞吐量 x{speedup:.2f}  峰值内存 x{memory:.2f}{changed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TextSegmenter基准测试")
+    parser.add_argument("--output", type=str, default="benchmark_results.json", help="结果JSON文件路径")
+    parser.add_argument("--compare", type=str, default=None, help="与之比较的历史结果JSON文件")
+    parser.add_argument("--corpora", nargs='+', choices=CORPORA, default=CORPORA, help="要测试的语料类型")
+    parser.add_argument("--size", type=int, default=1000000, help="每份语料的字符数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段的重复次数")
+    parser.add_argument("--seed", type=int, default=0, help="生成语料的随机种子")
+    parser.add_argument("--max_length", type=int, default=1000, help="每段最大长度")
+    parser.add_argument("--overlap_length", type=int, default=100, help="重叠长度")
+    parser.add_argument("--min_segment_length", type=int, default=200, help="最小段落长度")
+    parser.add_argument("--length_function", type=str, choices=['chars', 'cjk'], default='chars', help="长度计算方式")
+    parser.add_argument("--packing", type=str, choices=['greedy', 'balanced'], default='greedy',
+                        help="分段方式：greedy为贪心装满，balanced在段数不变的前提下让各段长度尽量均匀")
+
+    args = parser.parse_args()
+
+    segmenter_kwargs = {
+        'max_length': args.max_length,
+        'overlap_length': args.overlap_length,
+        'min_segment_length': args.min_segment_length,
+        'length_function': args.length_function,
+        'packing': args.packing,
+    }
+    results = run_benchmark(args.corpora, args.size, args.repeat, segmenter_kwargs, args.seed)
+
+    report = {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'config': dict(segmenter_kwargs, size=args.size, repeat=args.repeat, seed=args.seed),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n基准测试结果已保存到: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        compare_results(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
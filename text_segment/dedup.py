@@ -0,0 +1,233 @@
+import hashlib
+import json
+import re
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+from minhash import MinHasher
+
+
+# 规范化时去掉空白、标点和符号，只比较文字内容
+_NON_WORD_PATTERN = re.compile(r'[\W_]+')
+
+DUPLICATE = 'duplicate'
+NEAR_DUPLICATE = 'near_duplicate'
+NEW = 'new'
+
+
+def normalize_segment(text):
+    """
+    Normalize a segment for duplicate detection.
+
+    Applies NFKC normalization, lowercases and removes whitespace,
+    punctuation and symbols, so segments that only differ in formatting
+    compare equal.
+
+    Args:
+        text (str): Segment text
+
+    Returns:
+        str: Normalized text
+    """
+    return _NON_WORD_PATTERN.sub('', unicodedata.normalize('NFKC', text).lower())
+
+
+class DedupResult:
+    """
+    Result of SegmentDeduplicator.check.
+
+    Attributes:
+        status (str): DUPLICATE, NEAR_DUPLICATE or NEW
+        segment_id (str): Content hash of the normalized segment
+        match_id (str): Id of the indexed segment it duplicates, or None
+        similarity (float): Estimated Jaccard similarity to match_id
+    """
+    __slots__ = ('status', 'segment_id', 'match_id', 'similarity')
+
+    def __init__(self, status, segment_id, match_id=None, similarity=0.0):
+        self.status = status
+        self.segment_id = segment_id
+        self.match_id = match_id
+        self.similarity = similarity
+
+    def __repr__(self):
+        return (f"DedupResult(status={self.status!r}, segment_id={self.segment_id!r}, "
+                f"match_id={self.match_id!r}, similarity={self.similarity:.2f})")
+
+
+class SegmentDeduplicator:
+    def __init__(self, max_entries=1000000, num_perm=32, bands=8, shingle_size=5,
+                 threshold=0.8):
+        """
+        Index of seen segments that finds exact and near duplicates.
+
+        Exact duplicates are found by hashing the normalized segment. Near
+        duplicates are found with MinHash signatures over character shingles
+        and locality-sensitive hashing on bands of the signature; candidates
+        are confirmed by the estimated Jaccard similarity. The index keeps at
+        most max_entries segments and evicts the least recently seen ones,
+        so memory stays bounded across runs.
+
+        Args:
+            max_entries (int): Maximum number of indexed segments
+            num_perm (int): Number of MinHash permutations
+            bands (int): Number of LSH bands; must divide num_perm
+            shingle_size (int): Length of the character shingles
+            threshold (float): Minimum estimated Jaccard similarity for a
+                near duplicate
+        """
+        if not isinstance(max_entries, int) or max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer")
+        if not isinstance(num_perm, int) or num_perm <= 0:
+            raise ValueError("num_perm must be a positive integer")
+        if not isinstance(bands, int) or bands <= 0 or num_perm % bands:
+            raise ValueError("bands must be a positive integer dividing num_perm")
+        if not isinstance(shingle_size, int) or shingle_size <= 0:
+            raise ValueError("shingle_size must be a positive integer")
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+
+        self.max_entries = max_entries
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+
+        self._minhash = MinHasher(num_perm, bands, shingle_size)
+
+        # 分段id -> MinHash签名，按最近出现的顺序排列
+        self._entries = OrderedDict()
+        # (band序号, band内容) -> 最近一个落在该桶中的分段id
+        self._buckets = {}
+        self.stats = {'checked': 0, 'duplicates': 0, 'near_duplicates': 0, 'evicted': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, text):
+        return self._hash(normalize_segment(text)) in self._entries
+
+    def check(self, text):
+        """
+        Look a segment up in the index and add it if it is not an exact
+        duplicate.
+
+        Args:
+            text (str): Segment text
+
+        Returns:
+            DedupResult: Whether the segment is new, a near duplicate or an
+                exact duplicate of an indexed segment
+        """
+        normalized = normalize_segment(text)
+        segment_id = self._hash(normalized)
+        self.stats['checked'] += 1
+
+        if segment_id in self._entries:
+            self._entries.move_to_end(segment_id)
+            self.stats['duplicates'] += 1
+            return DedupResult(DUPLICATE, segment_id, segment_id, 1.0)
+
+        signature = self._minhash.signature(normalized)
+        result = DedupResult(NEW, segment_id)
+        if signature is not None:
+            match_id, similarity = self._best_candidate(signature)
+            if match_id is not None:
+                self._entries.move_to_end(match_id)
+                self.stats['near_duplicates'] += 1
+                result = DedupResult(NEAR_DUPLICATE, segment_id, match_id, similarity)
+
+        self._add(segment_id, signature)
+        return result
+
+    def filter(self, segments):
+        """
+        Drop exact duplicates from a stream of segments.
+
+        Args:
+            segments: Iterable of segment texts
+
+        Yields:
+            str: Segments that are not exact duplicates of indexed segments
+        """
+        for segment in segments:
+            if self.check(segment).status != DUPLICATE:
+                yield segment
+
+    def save(self, path):
+        """
+        Save the index to a JSON file.
+
+        Args:
+            path (str): Output file path
+        """
+        data = {
+            'max_entries': self.max_entries,
+            'num_perm': self.num_perm,
+            'bands': self.bands,
+            'shingle_size': self.shingle_size,
+            'threshold': self.threshold,
+            'entries': [[segment_id, None if signature is None else signature.tolist()]
+                        for segment_id, signature in self._entries.items()],
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path, max_entries=None):
+        """
+        Load an index saved with save.
+
+        Args:
+            path (str): Index file path
+            max_entries (int, optional): Override the saved maximum size
+
+        Returns:
+            SegmentDeduplicator: The loaded index
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        deduplicator = cls(
+            max_entries=max_entries or data['max_entries'],
+            num_perm=data['num_perm'],
+            bands=data['bands'],
+            shingle_size=data['shingle_size'],
+            threshold=data['threshold'],
+        )
+        for segment_id, signature in data['entries']:
+            deduplicator._add(segment_id, None if signature is None else array('Q', signature))
+        deduplicator.stats['evicted'] = 0
+        return deduplicator
+
+    @staticmethod
+    def _hash(normalized):
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+    def _best_candidate(self, signature):
+        """Return the most similar indexed segment above the threshold."""
+        best_id, best_similarity = None, 0.0
+        for key in self._minhash.band_keys(signature):
+            candidate = self._buckets.get(key)
+            if candidate is None or candidate == best_id:
+                continue
+            similarity = self._minhash.similarity(signature, self._entries[candidate])
+            if similarity >= self.threshold and similarity > best_similarity:
+                best_id, best_similarity = candidate, similarity
+        return best_id, best_similarity
+
+    def _add(self, segment_id, signature):
+        self._entries[segment_id] = signature
+        self._entries.move_to_end(segment_id)
+        if signature is not None:
+            for key in self._minhash.band_keys(signature):
+                self._buckets[key] = segment_id
+
+        while len(self._entries) > self.max_entries:
+            old_id, old_signature = self._entries.popitem(last=False)
+            if old_signature is not None:
+                for key in self._minhash.band_keys(old_signature):
+                    if self._buckets.get(key) == old_id:
+                        del self._buckets[key]
+            self.stats['evicted'] += 1
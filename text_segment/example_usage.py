@@ -13,37 +13,32 @@ def segment_file_to_csv(input_file_path, output_csv_path, max_length=1000, overl
         min_segment_length=min_segment_length  # 最小段落长度
     )
     
-    # Read text from file
+    # Segment the file while reading it, and write segments to CSV as they come
+    count = 0
+    total_length = 0
     try:
-        with open(input_file_path, 'r', encoding='utf-8') as file:
-            text = file.read()
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        return []
-    
-    # Segment the text
-    segments = segmenter.segment_text(text)
-    
-    # Write segments to CSV
-    try:
-        with open(output_csv_path, 'w', encoding='utf-8', newline='') as csvfile:
+        with open(input_file_path, 'r', encoding='utf-8') as file, \
+                open(output_csv_path, 'w', encoding='utf-8', newline='') as csvfile:
             writer = csv.writer(csvfile)
             # Write header
             writer.writerow(['段落序号', '文本内容', '字符长度', '包含重叠'])
             
             # Write segments
-            for i, segment in enumerate(segments, 1):
-                has_overlap = i > 1 and len(segments) > 1
+            for i, segment in enumerate(segmenter.segment_stream(file), 1):
+                has_overlap = i > 1
                 writer.writerow([i, segment, len(segment), "是" if has_overlap else "否"])
+                count = i
+                total_length += len(segment)
         
         print(f"\n分段结果已保存到: {output_csv_path}")
-        print(f"总共分成 {len(segments)} 段")
-        print(f"平均段落长度: {sum(len(s) for s in segments) / len(segments):.2f} 字符")
+        print(f"总共分成 {count} 段")
+        if count:
+            print(f"平均段落长度: {total_length / count:.2f} 字符")
         
     except Exception as e:
-        print(f"Error writing CSV file: {e}")
+        print(f"Error segmenting file: {e}")
     
-    return segments
+    return count
 
 if __name__ == "__main__":
     # 输入和输出文件路径
@@ -51,7 +46,7 @@ if __name__ == "__main__":
     output_file = "segmented_text.csv"
     
     # 执行分段并保存为CSV
-    segments = segment_file_to_csv(
+    count = segment_file_to_csv(
         input_file_path=input_file,
         output_csv_path=output_file,
         max_length=1000,  # 每段最大1000字符
@@ -0,0 +1,67 @@
+import zlib
+from array import array
+
+
+# MinHash使用的梅森素数及生成排列参数的固定种子，保证签名可以跨进程、跨运行复用
+_MERSENNE_PRIME = (1 << 61) - 1
+_HASH_MASK = (1 << 32) - 1
+_SEED = 1
+
+
+class MinHasher:
+    def __init__(self, num_perm, bands, shingle_size):
+        """
+        MinHash signatures over character shingles, split into LSH bands.
+
+        The permutations are generated from a fixed seed, so signatures of
+        the same text are identical across processes and runs. Callers
+        validate the parameters; bands must divide num_perm.
+
+        Args:
+            num_perm (int): Number of MinHash permutations
+            bands (int): Number of LSH bands
+            shingle_size (int): Length of the character shingles
+        """
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self._rows = num_perm // bands
+
+        state = _SEED
+        self._permutations = []
+        for _ in range(num_perm):
+            state = (state * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+            a = (state >> 3) % (_MERSENNE_PRIME - 1) + 1
+            state = (state * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+            b = (state >> 3) % _MERSENNE_PRIME
+            self._permutations.append((a, b))
+
+    def signature(self, normalized):
+        """
+        Compute the MinHash signature of a normalized text.
+
+        Args:
+            normalized (str): Normalized text
+
+        Returns:
+            array: Unsigned 64-bit signature values, or None if the text is
+                shorter than one shingle
+        """
+        size = self.shingle_size
+        if len(normalized) < size:
+            return None
+        hashes = {zlib.crc32(normalized[i:i + size].encode('utf-8'))
+                  for i in range(len(normalized) - size + 1)}
+        return array('Q', [
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _HASH_MASK
+            for a, b in self._permutations
+        ])
+
+    def band_keys(self, signature):
+        """Return the (band index, band bytes) LSH bucket keys of a signature."""
+        rows = self._rows
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+
+    def similarity(self, signature, other):
+        """Estimate the Jaccard similarity of two signatures."""
+        return sum(x == y for x, y in zip(signature, other)) / self.num_perm
@@ -0,0 +1,50 @@
+import json
+
+from text_segmentation import TextSegmenter, cjk_token_estimate
+
+
+def _offsets(spans):
+    return [(span.start, span.end, span.overlap_start) for span in spans]
+
+
+def test_resegment_with_empty_leading_span():
+    # 文档开头是超长且没有标点的内容时，segment_spans 会先输出一个空分段 (0, 0)
+    segmenter = TextSegmenter(max_length=50, overlap_length=10, min_segment_length=0)
+    old_text = "检" * 80 + "。第二句话内容。\n\n第三段内容很长很长。" + "第四句。" * 20
+    new_text = old_text[:127] + "X" + old_text[128:]
+    previous = segmenter.segment_spans(old_text)
+    assert (previous[0].start, previous[0].end) == (0, 0)
+
+    result = segmenter.resegment(previous, new_text)
+    expected = segmenter.segment_spans(new_text)
+
+    assert _offsets(result.spans) == _offsets(expected)
+    assert sorted(result.added + result.unchanged) == sorted(span.segment_id for span in expected)
+
+
+def test_batch_segment_matches_segment_text(tmp_path):
+    # 批量分段输出的文本与segment_text相同，长度按配置的长度函数计算
+    from batch_segment import segment_files
+
+    segmenter_kwargs = {'max_length': 40, 'overlap_length': 10, 'min_segment_length': 0,
+                        'length_function': 'cjk', 'replace_continuous_spaces': True}
+    text = "第一段   内容很长。Some  English words here.\n\n\n第二段内容。" * 5
+    path = tmp_path / "doc.txt"
+    path.write_text(text, encoding='utf-8')
+    output = tmp_path / "segments.jsonl"
+
+    segment_files([str(path)], str(output), segmenter_kwargs, workers=1)
+
+    rows = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    segmenter = TextSegmenter(**segmenter_kwargs)
+    expected = segmenter.segment_text(text)
+    assert [row['text'] for row in rows] == expected
+    assert [row['length'] for row in rows] == [cjk_token_estimate(segment) for segment in expected]
+
+
+def test_span_overlap_matches_emitted_overlap():
+    # 句子在原文中没有分隔符，在分段中以分隔符拼接，重叠部分的起点要按句子的原文位置计算
+    segmenter = TextSegmenter(max_length=20, overlap_length=8, min_segment_length=0)
+    text = "第一句话。长更长更长。第四句内容。第五句内容比较长。\n\n第六句。"
+    for segment, span in segmenter.segment_text_spans(text):
+        assert span.text_with_overlap.replace("\n", "") == segment.replace(segmenter.delimiter, "")
@@ -1,6 +1,70 @@
+import hashlib
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from itertools import chain
+
+
+# 中日韩文字及全角标点，每个字符大致对应一个token
+_CJK_RANGES = '\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef'
+_CJK_PATTERN = re.compile('[' + _CJK_RANGES + ']')
+_ALNUM_RUN_PATTERN = re.compile(r'[A-Za-z0-9]+')
+_SYMBOL_PATTERN = re.compile(r'[^\sA-Za-z0-9' + _CJK_RANGES + ']')
+_WORD_PATTERN = re.compile(r'\S+')
+# 均衡分段时用于判断句子是否以标题或列表项开头
+_HEADING_PATTERN = re.compile(r'#{1,6}\s|第[一二三四五六七八九十百千\d]+[章节部分篇条]|[一二三四五六七八九十]+、|[（(][一二三四五六七八九十]+[）)]')
+_LIST_ITEM_PATTERN = re.compile(r'[-*•·]\s|\d+[.、)）]|[（(]\d+[）)]')
+
+
+def cjk_token_estimate(text):
+    """
+    Fast token count estimate for mixed Chinese/English text.
+    
+    Every CJK character or full-width punctuation mark counts as one token,
+    every run of ASCII letters and digits as one token per four characters,
+    and every other non-space symbol as one token.
+    
+    Args:
+        text (str): Text to measure
+        
+    Returns:
+        int: Estimated number of tokens
+    """
+    tokens = len(_CJK_PATTERN.findall(text)) + len(_SYMBOL_PATTERN.findall(text))
+    for run in _ALNUM_RUN_PATTERN.findall(text):
+        tokens += (len(run) + 3) // 4
+    return tokens
+
+
+def cached_token_length(encode, maxsize=65536):
+    """
+    Build a length function that counts tokens with a real tokenizer.
+    
+    Results are cached per string, so sentences and words that repeat across
+    a corpus are only tokenized once.
+    
+    Args:
+        encode (callable): Tokenizer encode function returning a token list,
+            e.g. tiktoken's encoding.encode
+        maxsize (int): Maximum number of cached strings
+        
+    Returns:
+        callable: Function mapping a string to its number of tokens
+    """
+    @lru_cache(maxsize=maxsize)
+    def token_length(text):
+        return len(encode(text))
+    
+    return token_length
+
+
 class TextSegmenter:
     def __init__(self, delimiter="\n\n", max_length=5000, overlap_length=50,
-                 replace_continuous_spaces=True, remove_urls=False, min_segment_length=100):
+                 replace_continuous_spaces=True, remove_urls=False, min_segment_length=100,
+                 length_function="chars", deduplicator=None, split_english_sentences=False,
+                 packing="greedy", affinity_weight=1.0):
         """
         Initialize the text segmenter with given parameters.
         
@@ -11,13 +75,39 @@ class TextSegmenter:
             replace_continuous_spaces (bool): Whether to replace continuous spaces/tabs
             remove_urls (bool): Whether to remove URLs from text
             min_segment_length (int): Minimum length for a segment before merging
+            length_function (str | callable): How tokens are counted: "chars"
+                for characters, "cjk" for cjk_token_estimate, or a callable
+                such as one built with cached_token_length
+            deduplicator (SegmentDeduplicator, optional): Index used to drop
+                merged segments that exactly repeat an indexed segment
+            split_english_sentences (bool): Whether ".", "?" and "!" followed
+                by whitespace also end a sentence
+            packing (str): "greedy" closes a segment as soon as the next
+                sentence does not fit; "balanced" uses the same number of
+                segments but spreads the sentences so their lengths are as
+                even as possible
+            affinity_weight (float): For balanced packing, how strongly to
+                prefer cuts before headings and avoid cuts inside lists;
+                0 disables it
         """
+        if not isinstance(delimiter, str) or not delimiter:
+            raise ValueError("delimiter must be a non-empty string")
         if not isinstance(max_length, int) or max_length <= 0:
             raise ValueError("max_length must be a positive integer")
         if not isinstance(overlap_length, int) or overlap_length < 0:
             raise ValueError("overlap_length must be a non-negative integer")
         if overlap_length >= max_length:
             raise ValueError("overlap_length must be less than max_length")
+        if length_function == "chars":
+            length_function = len
+        elif length_function == "cjk":
+            length_function = cjk_token_estimate
+        elif not callable(length_function):
+            raise ValueError('length_function must be "chars", "cjk" or a callable')
+        if packing not in ("greedy", "balanced"):
+            raise ValueError('packing must be "greedy" or "balanced"')
+        if not isinstance(affinity_weight, (int, float)) or affinity_weight < 0:
+            raise ValueError("affinity_weight must be a non-negative number")
             
         self.delimiter = delimiter
         self.max_length = max_length
@@ -25,14 +115,35 @@ class TextSegmenter:
         self.replace_continuous_spaces = replace_continuous_spaces
         self.remove_urls = remove_urls
         self.min_segment_length = min_segment_length
+        self.length_function = length_function
+        self.deduplicator = deduplicator
+        self.split_english_sentences = split_english_sentences
+        self.packing = packing
+        self.affinity_weight = affinity_weight
+        
+        # 分段长度按片段累加，分隔符的长度只计算一次
+        self._delimiter_length = length_function(delimiter)
+        self._space_length = length_function(" ")
         
         # 预编译正则表达式
-        import re
         self.space_pattern = re.compile(r'[ \t]+')
         self.newline_pattern = re.compile(r'\n+')
         self.url_pattern = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
         self.email_pattern = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
         self.chinese_pattern = re.compile(r'[。！？；]')
+        self.sentence_endings = '。！？；'
+        # 一次扫描找出所有可能的句子边界：句末标点和分隔符的第一个字符。
+        # 只用字符集（不用分支）时正则引擎可以快速跳过其余字符
+        boundary_chars = self.sentence_endings + delimiter[0]
+        if split_english_sentences:
+            boundary_chars += '.?!'
+        self._boundary_pattern = re.compile('[' + re.escape(boundary_chars) + ']')
+        # 流式分句时，缓冲区末尾这么多字符内的边界要等读到更多文本才能确定
+        self._boundary_margin = max(len(delimiter) - 1, 1 if split_english_sentences else 0)
+        # 与space_pattern/newline_pattern替换结果相同，但跳过不改变文本的匹配，
+        # 用于在预处理时记录偏移量
+        self._space_run_pattern = re.compile(r'[ \t]{2,}|\t')
+        self._newline_run_pattern = re.compile(r'\n{2,}')
         
     def preprocess_text(self, text):
         """
@@ -47,6 +158,22 @@ class TextSegmenter:
         if not isinstance(text, str):
             raise ValueError("Input text must be a string")
             
+        return self._preprocess_piece(text).strip()
+
+    def _preprocess_piece(self, text):
+        """
+        Apply the preprocessing substitutions without stripping the ends.
+        
+        Applying this to consecutive pieces of a document gives the same
+        result as applying it to the whole document, as long as the pieces
+        are cut at positions returned by _find_safe_cut.
+        
+        Args:
+            text (str): Raw text piece
+            
+        Returns:
+            str: Preprocessed text piece
+        """
         if self.replace_continuous_spaces:
             # Replace continuous spaces and tabs with single space
             text = self.space_pattern.sub(' ', text)
@@ -59,7 +186,83 @@ class TextSegmenter:
             # Remove email addresses
             text = self.email_pattern.sub('', text)
         
-        return text.strip()
+        return text
+
+    def _preprocess_with_offsets(self, text):
+        """
+        Preprocess text and record where every character came from.
+        
+        Args:
+            text (str): Input text to preprocess
+            
+        Returns:
+            tuple: (preprocessed text, array mapping each preprocessed
+                character index to its index in the input text)
+        """
+        offsets = array('i', range(len(text)))
+        
+        substitutions = []
+        if self.replace_continuous_spaces:
+            substitutions.append((self._space_run_pattern, ' '))
+            substitutions.append((self._newline_run_pattern, '\n'))
+        if self.remove_urls:
+            substitutions.append((self.url_pattern, ''))
+            substitutions.append((self.email_pattern, ''))
+        
+        for pattern, replacement in substitutions:
+            pieces = []
+            new_offsets = array('i')
+            last = 0
+            for match in pattern.finditer(text):
+                pieces.append(text[last:match.start()])
+                new_offsets.extend(offsets[last:match.start()])
+                if replacement:
+                    # 替换字符对应到被替换内容的起始位置
+                    pieces.append(replacement)
+                    new_offsets.append(offsets[match.start()])
+                last = match.end()
+            pieces.append(text[last:])
+            new_offsets.extend(offsets[last:])
+            text = "".join(pieces)
+            offsets = new_offsets
+        
+        stripped = text.lstrip()
+        lead = len(text) - len(stripped)
+        text = stripped.rstrip()
+        return text, offsets[lead:lead + len(text)]
+
+    def _find_sentence_end(self, text, end):
+        """
+        Return the index just past the last sentence ending in text[:end],
+        or 0 if there is none.
+        """
+        return max(text.rfind(c, 0, end) for c in self.sentence_endings) + 1
+
+    def _find_safe_cut(self, text, limit):
+        """
+        Find a position where raw text can be cut before preprocessing.
+        
+        None of the preprocessing patterns can match across a sentence ending
+        or across the start of a whitespace run, so cutting there keeps the
+        preprocessing of the two halves identical to that of the whole.
+        
+        Args:
+            text (str): Raw text buffer
+            limit (int): Buffer size above which a whitespace cut is used
+                when there is no sentence ending
+            
+        Returns:
+            int: Cut position (0 if the buffer should be kept whole)
+        """
+        cut = self._find_sentence_end(text, len(text))
+        if cut or len(text) <= limit:
+            return cut
+        
+        # 没有句末标点的超长段落：退而在最后一段空白之前切开
+        cut = max(text.rfind(' '), text.rfind('\t'), text.rfind('\n'))
+        while cut > 0 and text[cut - 1] in ' \t\n':
+            cut -= 1
+        return max(cut, 0)
 
     def merge_short_segments(self, segments):
         """
@@ -74,20 +277,8 @@ class TextSegmenter:
         if not segments:
             return segments
             
-        merged = []
-        current = segments[0]
-        
-        for i in range(1, len(segments)):
-            if len(current) < self.min_segment_length and i < len(segments):
-                current += self.delimiter + segments[i]
-            else:
-                merged.append(current)
-                current = segments[i]
-                
-        if current:
-            merged.append(current)
-            
-        return merged
+        return [segment for segment, _, _ in self._merge_stream(
+            (segment, self.length_function(segment), 0, 0) for segment in segments)]
 
     def segment_text(self, text):
         """
@@ -102,62 +293,930 @@ class TextSegmenter:
         # Preprocess text
         text = self.preprocess_text(text)
         
-        # Split text by delimiter and Chinese sentence endings
+        return [segment for segment, _, _, _ in self._finish_segments(self._split_sentences(text))]
+
+    def segment_spans(self, text):
+        """
+        Segment the input text and return where each segment lies in it.
+        
+        Segmentation is the same as segment_text, but every segment is
+        returned as a TextSpan of offsets into the original, unpreprocessed
+        text. The overlap is kept as an offset rather than a copied string,
+        and the segment text is only sliced when it is asked for.
+        
+        Args:
+            text (str): Input text to segment
+            
+        Returns:
+            list: List of TextSpan
+        """
+        return [span for _, span in self.segment_text_spans(text)]
+
+    def segment_text_spans(self, text):
+        """
+        Segment the input text and return every segment with its span.
+        
+        The segment texts are exactly those returned by segment_text and
+        the spans those returned by segment_spans, computed in one pass.
+        
+        Args:
+            text (str): Input text to segment
+            
+        Returns:
+            list: List of (segment text, TextSpan)
+        """
+        if not isinstance(text, str):
+            raise ValueError("Input text must be a string")
+        
+        processed, offsets = self._preprocess_with_offsets(text)
+        
         segments = []
-        initial_segments = text.split(self.delimiter)
-        
-        for segment in initial_segments:
-            # Further split by Chinese sentence endings if needed
-            chinese_sentences = self.chinese_pattern.split(segment)
-            segments.extend(s.strip() for s in chinese_sentences if s.strip())
-        
-        # Process segments
-        result_segments = []
-        current_segment = ""
-        
-        for segment in segments:
-            # If adding this segment would exceed max_length
-            if len(current_segment + self.delimiter + segment) > self.max_length:
-                if current_segment:
-                    result_segments.append(current_segment)
+        for segment, start, end, overlap_start in self._finish_segments(self._split_sentences(processed), processed):
+            # 结束位置映射到最后一个字符之后
+            original_end = offsets[end - 1] + 1 if end > start else offsets[start]
+            segments.append((segment, TextSpan(text, offsets[start], original_end, offsets[overlap_start])))
+        return segments
+
+    def resegment(self, previous, new_text, edit=None):
+        """
+        Re-segment an edited document, redoing only the edited window.
+        
+        Segmentation restarts at a segment boundary shortly before the edit
+        and stops as soon as it lines up again with a segment boundary of
+        the previous segmentation after the edit. All segments outside that
+        window are reused with shifted offsets. The spans are the same as
+        segment_spans(new_text) would return.
+        
+        Args:
+            previous (list): TextSpan list from segment_spans (or resegment)
+                of the previous version of the document
+            new_text (str): The edited document
+            edit (tuple, optional): (start, old_end, new_end) of the single
+                changed region, meaning old_text[start:old_end] was replaced
+                by new_text[start:new_end]. Computed from the common prefix
+                and suffix of the two texts if not given.
+            
+        Returns:
+            ResegmentResult: New spans and the segment ids that were added,
+                removed or left unchanged
+        """
+        if not isinstance(new_text, str):
+            raise ValueError("Input text must be a string")
+        if self.deduplicator is not None:
+            raise ValueError("resegment does not support a deduplicator")
+        if self.packing != "greedy":
+            raise ValueError("resegment only supports greedy packing")
+        if not previous:
+            spans = self.segment_spans(new_text)
+            return ResegmentResult(spans, [span.segment_id for span in spans], [], [])
+        
+        old_text = previous[0].source
+        if edit is None:
+            edit = _find_edit(old_text, new_text)
+        edit_start, old_end, new_end = edit
+        delta = new_end - old_end
+        
+        # 第一个受编辑影响的分段；它前一个分段的边界也可能因此改变，
+        # 所以从再往前一个、并且从句首开始的分段重新分段
+        first_affected = bisect_left([span.end for span in previous], edit_start)
+        restart = first_affected - 2
+        while restart > 0 and not self._is_restart_point(old_text, previous[restart].start):
+            restart -= 1
+        restart = max(restart, 0)
+        restart_offset = previous[restart].start if restart else 0
+        # 保留的前缀只包含在重新分段起点之前开始的分段；起点之前可能有空分段
+        # （如文档开头是超长且没有标点的内容时的 (0, 0)），它们也会重新生成
+        restart = bisect_left([span.start for span in previous], restart_offset)
+        
+        old_starts = {span.start: i for i, span in enumerate(previous) if span.start >= old_end}
+        # 窗口从编辑结束处向后延伸，找不到对齐的分段边界时加倍
+        window = 2 * (self.max_length + self.min_segment_length + self.overlap_length)
+        
+        while True:
+            window_end = self._window_end(new_text, new_end + window)
+            regenerated = [
+                TextSpan(new_text, restart_offset + span.start, restart_offset + span.end,
+                         restart_offset + span.overlap_start)
+                for span in self.segment_spans(new_text[restart_offset:window_end])
+            ]
+            if restart and regenerated:
+                # 重新分段的第一个分段与原来相同，但缺少来自前一分段的重叠
+                regenerated[0].overlap_start = previous[restart].overlap_start
+            
+            resync = None
+            for j in range(1, len(regenerated)):
+                span = regenerated[j]
+                m = old_starts.get(span.start - delta) if span.start > new_end else None
+                if (m is not None and self._is_restart_point(old_text, previous[m].start)
+                        and self._is_restart_point(new_text, span.start)):
+                    resync = j, m
+                    break
+            
+            if resync is not None or window_end == len(new_text):
+                break
+            window *= 2
+        
+        spans = [TextSpan(new_text, span.start, span.end, span.overlap_start) for span in previous[:restart]]
+        if resync is None:
+            spans.extend(regenerated)
+            removed = [span.segment_id for span in previous[restart:]]
+            added = [span.segment_id for span in regenerated]
+        else:
+            j, m = resync
+            # 对齐处的分段沿用原来的范围，重叠部分以新的前一分段为准
+            spans.extend(regenerated[:j])
+            spans.append(TextSpan(new_text, previous[m].start + delta, previous[m].end + delta,
+                                  regenerated[j].overlap_start))
+            spans.extend(TextSpan(new_text, span.start + delta, span.end + delta, span.overlap_start + delta)
+                         for span in previous[m + 1:])
+            removed = [span.segment_id for span in previous[restart:m + 1]]
+            added = [span.segment_id for span in spans[restart:restart + j + 1]]
+        
+        # 内容相同的分段视为未改变
+        kept = Counter(removed) & Counter(added)
+        unchanged = list(kept.elements())
+        unchanged_before = [span.segment_id for span in previous[:restart]]
+        unchanged_after = [span.segment_id for span in previous[resync[1] + 1:]] if resync else []
+        return ResegmentResult(
+            spans,
+            list((Counter(added) - kept).elements()),
+            list((Counter(removed) - kept).elements()),
+            unchanged_before + unchanged + unchanged_after,
+        )
+
+    def _is_restart_point(self, text, pos):
+        """
+        Whether segmenting text[pos:] from scratch continues the segmentation
+        of the whole text exactly, for a segment that starts at text[pos].
+        
+        That holds when the segment starts a sentence that fits within
+        max_length. A segment that starts in, or at the beginning of, a
+        sentence that had to be split into words may depend on what came
+        before it. The check is conservative: when in doubt it returns False.
+        """
+        if pos == 0:
+            return True
+        
+        # 预处理后，前面必须是句末标点或分隔符
+        head = self._preprocess_piece(text[max(0, pos - 256):pos])
+        stripped = head.rstrip()
+        # 英文句末标点后面必须紧跟空白才算边界
+        if not (head.endswith(self.delimiter) or stripped.endswith(self.delimiter)
+                or (stripped and stripped[-1] in self.sentence_endings)
+                or (self.split_english_sentences and stripped and stripped[-1] in '.?!'
+                    and len(stripped) < len(head))
+                or (not stripped and pos <= 256)):
+            return False
+        
+        # 这个句子本身不能超过max_length
+        limit = min(len(text), pos + max(1024, 8 * self.max_length))
+        window = self._preprocess_piece(text[pos:limit])
+        boundary = next(self._iter_boundaries(window), None)
+        if boundary is None:
+            if limit < len(text):
+                return False
+            end = len(window)
+        else:
+            end = boundary[0]
+        return self.length_function(window[:end].strip()) <= self.max_length
+
+    def _window_end(self, text, target):
+        """
+        Return the first position at or after target that directly follows a
+        sentence ending, or the end of text.
+        """
+        if target >= len(text):
+            return len(text)
+        ends = [index for index in (text.find(c, target) for c in self.sentence_endings) if index != -1]
+        return min(ends) + 1 if ends else len(text)
+
+    def segment_stream(self, fp, block_size=65536):
+        """
+        Segment a text file incrementally, yielding segments one at a time.
+        
+        The input is read in blocks of block_size characters. Partial
+        sentences and the overlap tail are carried across block boundaries,
+        so memory is bounded by max_length, min_segment_length, overlap and
+        block_size rather than by the size of the file. The segments are the
+        same as those of segment_text(fp.read()).
+        
+        Args:
+            fp: Text file object opened for reading
+            block_size (int): Number of characters to read per block
+            
+        Yields:
+            str: Text segments
+        """
+        if not isinstance(block_size, int) or block_size <= 0:
+            raise ValueError("block_size must be a positive integer")
+        
+        return (segment for segment, _, _, _ in self._finish_segments(self._stream_sentences(fp, block_size)))
+
+    def _split_sentences(self, text):
+        """
+        Split preprocessed text into sentences at delimiters and sentence
+        endings.
+        
+        Args:
+            text (str): Preprocessed text
+            
+        Yields:
+            tuple: Non-empty stripped sentences as (sentence, start, end),
+                with offsets into text
+        """
+        offsets, _ = self._sentence_offsets(text)
+        for i in range(0, len(offsets), 2):
+            start = offsets[i]
+            end = offsets[i + 1]
+            yield text[start:end], start, end
+
+    def _iter_boundaries(self, text, limit=None):
+        """
+        Find the sentence boundaries of text in a single regex pass.
+        
+        A delimiter ends a sentence and is dropped. A sentence ending
+        (and, with split_english_sentences, ".", "?" or "!" followed by
+        whitespace) is kept as the last character of its sentence.
+        
+        Args:
+            text (str): Preprocessed text
+            limit (int, optional): Ignore boundaries starting at or after limit
+            
+        Yields:
+            tuple: (end of the sentence, start of the text after the boundary)
+        """
+        delimiter = self.delimiter
+        delimiter_first = delimiter[0]
+        delimiter_len = len(delimiter)
+        endings = self.sentence_endings
+        english = self.split_english_sentences
+        if limit is None:
+            limit = len(text)
+        start = 0
+        for match in self._boundary_pattern.finditer(text, 0, limit):
+            pos = match.start()
+            if pos < start:
+                # 位于刚找到的分隔符内部
+                continue
+            char = match.group()
+            if char == delimiter_first and text.startswith(delimiter, pos):
+                start = pos + delimiter_len
+                yield pos, start
+            elif char in endings or (english and char in '.?!'
+                                     and pos + 1 < len(text) and text[pos + 1].isspace()):
+                start = pos + 1
+                yield start, start
+
+    def _sentence_offsets(self, text, limit=None):
+        """
+        Split text into stripped, non-empty sentences without copying it.
+        
+        Args:
+            text (str): Preprocessed text
+            limit (int, optional): Only use boundaries that start before
+                limit and leave the text after the last of them unsplit.
+                If not given, the text after the last boundary is the final
+                sentence.
+            
+        Returns:
+            tuple: (array of the start and end offsets of the sentences, one
+                pair after another; position where the unsplit rest of the
+                text begins)
+        """
+        offsets = array('i')
+        start = 0
+        if limit is not None:
+            boundaries = self._iter_boundaries(text, limit)
+        else:
+            # 最后一个句子到文本末尾为止
+            boundaries = chain(self._iter_boundaries(text), ((len(text), len(text)),))
+        for end, next_start in boundaries:
+            # 去掉首尾空白只移动偏移量，不复制文本
+            if start < end and (text[start].isspace() or text[end - 1].isspace()):
+                while start < end and text[start].isspace():
+                    start += 1
+                while end > start and text[end - 1].isspace():
+                    end -= 1
+            if start < end:
+                offsets.append(start)
+                offsets.append(end)
+            start = next_start
+        return offsets, start
+
+    def _stream_sentences(self, fp, block_size):
+        """
+        Read raw text from fp and yield sentences as they are completed.
+        
+        Yields the same sentences as _split_sentences(preprocess_text(...))
+        on the whole file, with offsets into the preprocessed stream. A
+        sentence that already exceeds max_length before its end has been
+        read is not buffered: it is announced with _LONG_SENTENCE and then
+        yielded as lists of complete words, which is exactly what the packer
+        would split it into.
+        
+        Args:
+            fp: Text file object opened for reading
+            block_size (int): Number of characters to read per block
+            
+        Yields:
+            tuple | list | object: Sentences, word lists or _LONG_SENTENCE
+        """
+        # 边界可能横跨缓冲区末尾，末尾这部分暂不切分
+        margin = self._boundary_margin
+        raw = ""
+        pending = ""
+        # pending第一个字符在预处理后文本中的位置
+        base = 0
+        started = False
+        in_long_sentence = False
+        
+        while True:
+            block = fp.read(block_size)
+            eof = not block
+            raw += block
+            
+            cut = len(raw) if eof else self._find_safe_cut(raw, block_size)
+            processed = self._preprocess_piece(raw[:cut])
+            raw = raw[cut:]
+            
+            # 只去掉文档开头和结尾的空白，与preprocess_text的strip一致
+            if not started:
+                processed = processed.lstrip()
+                started = bool(processed)
+            pending += processed
+            if eof:
+                pending = pending.rstrip()
+                margin = 0
+            limit = None if eof else len(pending) - margin
+            
+            if in_long_sentence:
+                # 超长句子的剩余部分，到下一个边界为止
+                boundary = next(self._iter_boundaries(pending, limit), None)
+                if boundary is not None:
+                    end, next_start = boundary
+                    yield self._word_list(pending, 0, end, base)
+                    in_long_sentence = False
+                    pending = pending[next_start:]
+                    base += next_start
+                    if limit is not None:
+                        limit -= next_start
+                elif eof:
+                    yield self._word_list(pending, 0, len(pending), base)
+                    break
+            
+            if not in_long_sentence:
+                offsets, end = self._sentence_offsets(pending, limit)
+                for i in range(0, len(offsets), 2):
+                    start = offsets[i]
+                    stop = offsets[i + 1]
+                    yield pending[start:stop], base + start, base + stop
+                pending = pending[end:]
+                base += end
+            
+            if eof:
+                break
+            
+            # 当前句子尚未结束但已超过max_length时，先输出其中完整的单词
+            complete = pending[:len(pending) - margin] if margin else pending
+            if in_long_sentence or self.length_function(complete.strip()) > self.max_length:
+                word_end = max(complete.rfind(' '), complete.rfind('\t'), complete.rfind('\n'))
+                if word_end > 0:
+                    if not in_long_sentence:
+                        yield _LONG_SENTENCE
+                        in_long_sentence = True
+                    yield self._word_list(pending, 0, word_end, base)
+                    pending = pending[word_end:]
+                    base += word_end
+
+    def _word_list(self, text, start, end, base):
+        """
+        Return the whitespace-separated words of text[start:end] as a list of
+        (word, start, end) with offsets shifted by base.
+        """
+        return [(match.group(), base + match.start(), base + match.end())
+                for match in _WORD_PATTERN.finditer(text, start, end)]
+
+    def _finish_segments(self, sentences, text=None):
+        """
+        Run packing, merging and overlap over a sentence stream.
+        
+        Args:
+            sentences: Iterable of sentences
+            text (str, optional): The preprocessed text the sentences come
+                from, needed to compute overlap_start
+        
+        Yields:
+            tuple: (text with overlap, start, end, overlap_start) with offsets
+                into the preprocessed text; overlap_start is None if text is
+                not given
+        """
+        pack = self._pack_balanced if self.packing == "balanced" else self._pack_sentences
+        return self._overlap_stream(self._merge_stream(pack(sentences)), text)
+
+    def _pack_sentences(self, sentences):
+        """
+        Greedily pack sentences into segments of at most max_length.
+        
+        The current segment is kept as a list of parts with a running length,
+        so the cost is linear in the input size. Every sentence and word is
+        measured once with length_function and the segment length is the sum
+        of its parts, so a growing segment is never re-measured.
+        
+        Args:
+            sentences: Iterable of sentences as produced by _split_sentences
+                or _stream_sentences
+            
+        Yields:
+            tuple: Packed segments as (text, length, start, end)
+        """
+        length_function = self.length_function
+        current_parts = []
+        current_len = 0
+        current_start = current_end = 0
+        delimiter_len = self._delimiter_length
+        space_len = self._space_length
+        
+        for item in sentences:
+            if item is _LONG_SENTENCE:
+                # 流式读取时的超长句子：先结束当前段落，后续以单词列表给出
+                if current_parts:
+                    yield "".join(current_parts), current_len, current_start, current_end
+                current_parts = []
+                current_len = 0
+                continue
+            
+            if type(item) is list:
+                words = item
+            else:
+                segment, segment_start, segment_end = item
+                segment_len = length_function(segment)
+                # If adding this segment would exceed max_length
+                if current_len + delimiter_len + segment_len <= self.max_length:
+                    if current_parts:
+                        current_parts.append(self.delimiter)
+                        current_len += delimiter_len + segment_len
+                    else:
+                        current_len = segment_len
+                        current_start = segment_start
+                    current_parts.append(segment)
+                    current_end = segment_end
+                    continue
+                
+                if current_parts:
+                    yield "".join(current_parts), current_len, current_start, current_end
+                
+                if segment_len <= self.max_length:
+                    current_parts = [segment]
+                    current_len = segment_len
+                    current_start, current_end = segment_start, segment_end
+                    continue
                 
                 # If single segment is longer than max_length, split it
-                if len(segment) > self.max_length:
-                    words = segment.split()
-                    current_segment = ""
-                    for word in words:
-                        if len(current_segment + " " + word) > self.max_length:
-                            result_segments.append(current_segment)
-                            current_segment = word
-                        else:
-                            current_segment += " " + word if current_segment else word
+                current_parts = []
+                current_len = 0
+                words = self._word_list(segment, 0, len(segment), segment_start)
+            
+            for word, word_start, word_end in words:
+                word_len = length_function(word)
+                if current_len + space_len + word_len > self.max_length:
+                    if not current_parts:
+                        current_start = current_end = word_start
+                    yield "".join(current_parts), current_len, current_start, current_end
+                    current_parts = [word]
+                    current_len = word_len
+                    current_start = word_start
+                elif current_parts:
+                    current_parts.append(" ")
+                    current_parts.append(word)
+                    current_len += space_len + word_len
                 else:
-                    current_segment = segment
-            else:
-                current_segment += self.delimiter + segment if current_segment else segment
+                    current_parts.append(word)
+                    current_len = word_len
+                    current_start = word_start
+                current_end = word_end
         
         # Add the last segment if it exists
-        if current_segment:
-            result_segments.append(current_segment)
-        
-        # Merge short segments
-        result_segments = self.merge_short_segments(result_segments)
-        
-        # Handle overlap
-        if self.overlap_length > 0 and len(result_segments) > 1:
-            overlapped_segments = []
-            for i in range(len(result_segments)):
-                if i == 0:
-                    overlapped_segments.append(result_segments[i])
-                else:
-                    # Add overlap from previous segment
-                    prev_segment = result_segments[i-1]
-                    overlap = prev_segment[-self.overlap_length:] if len(prev_segment) > self.overlap_length else prev_segment
-                    overlapped_segments.append(overlap + self.delimiter + result_segments[i])
+        if current_parts:
+            yield "".join(current_parts), current_len, current_start, current_end
+
+    def _pack_balanced(self, sentences):
+        """
+        Pack sentences into as few segments as greedy packing would, with
+        segment lengths as even as possible.
+        
+        Sentences are buffered in windows of about 16 * max_length, so memory
+        stays bounded for streams. Each window is packed with
+        _balance_window up to where the last greedy segment of the window
+        starts; the rest is carried over to the next window. Sentences
+        longer than max_length end the window and are split into words by
+        the greedy packer.
+        
+        Args:
+            sentences: Iterable of sentences as produced by _split_sentences
+                or _stream_sentences
             
-            return overlapped_segments
+        Yields:
+            tuple: Packed segments as (text, length, start, end)
+        """
+        length_function = self.length_function
+        max_length = self.max_length
+        delimiter_len = self._delimiter_length
+        window_length = 16 * max_length
+        buffer = []
+        buffer_len = 0
+        # 贪心分段在缓冲区中最后一段的起点和长度
+        greedy_start = 0
+        greedy_len = None
+        sentences = iter(sentences)
+        # 超长句子之后读到的第一个普通句子，放回去重新处理
+        following = []
+        
+        while True:
+            item = following.pop() if following else next(sentences, None)
+            if item is None:
+                break
             
-        return result_segments
+            if item is not _LONG_SENTENCE and type(item) is not list:
+                segment, segment_start, segment_end = item
+                segment_len = length_function(segment)
+                if segment_len <= max_length:
+                    if greedy_len is not None and greedy_len + delimiter_len + segment_len <= max_length:
+                        greedy_len += delimiter_len + segment_len
+                    else:
+                        greedy_start = len(buffer)
+                        greedy_len = segment_len
+                    buffer.append((segment, segment_len, segment_start, segment_end))
+                    buffer_len += segment_len + delimiter_len
+                    
+                    if buffer_len >= window_length and greedy_start > 0:
+                        # 只重新分配贪心分段最后一段之前的句子：这部分的最少段数
+                        # 与贪心相同，剩下的句子从贪心的分段边界开始进入下一个窗口，
+                        # 所以总段数与贪心分段完全相同
+                        for chunk in self._balance_window(buffer[:greedy_start]):
+                            yield self._join_chunk(chunk)
+                        buffer = buffer[greedy_start:]
+                        buffer_len = greedy_len + delimiter_len
+                        greedy_start = 0
+                    continue
+            
+            # 超长句子：先结束当前窗口，再由贪心分段按单词切开。
+            # 最后一段单词与贪心分段一样可以接上后面的句子，作为一个整体留在缓冲区中
+            for chunk in self._balance_window(buffer):
+                yield self._join_chunk(chunk)
+            last = None
+            for packed in self._pack_sentences(self._long_sentence_items(item, sentences, following)):
+                if last is not None:
+                    yield last
+                last = packed
+            if last is not None:
+                buffer = [last]
+                buffer_len = last[1] + delimiter_len
+                greedy_start = 0
+                greedy_len = last[1]
+            else:
+                buffer = []
+                buffer_len = 0
+                greedy_start = 0
+                greedy_len = None
+        
+        for chunk in self._balance_window(buffer):
+            yield self._join_chunk(chunk)
+
+    @staticmethod
+    def _long_sentence_items(first, sentences, following):
+        """
+        Yield first and the word lists that continue it from sentences, and
+        put the first item after them into following.
+        """
+        yield first
+        for item in sentences:
+            if item is _LONG_SENTENCE or type(item) is list:
+                yield item
+            else:
+                following.append(item)
+                return
+
+    def _join_chunk(self, chunk):
+        """Join buffered (text, length, start, end) sentences into a segment."""
+        return (self.delimiter.join(entry[0] for entry in chunk),
+                sum(entry[1] for entry in chunk) + self._delimiter_length * (len(chunk) - 1),
+                chunk[0][2], chunk[-1][3])
+
+    def _balance_window(self, buffer):
+        """
+        Split buffered sentences into the minimum number of segments that
+        fit in max_length, minimizing the squared deviation of the segment
+        lengths from their mean.
+        
+        Dynamic programming over the cut positions: best[j] is the best
+        (segment count, cost) for the first j sentences. A cut before a
+        heading lowers the cost and a cut between two list items raises it,
+        scaled by affinity_weight.
+        
+        Args:
+            buffer (list): Sentences as (text, length, start, end), each at
+                most max_length long
+            
+        Returns:
+            list: Lists of sentences, one per segment
+        """
+        n = len(buffer)
+        if n == 0:
+            return []
+        
+        max_length = self.max_length
+        delimiter_len = self._delimiter_length
+        # prefix[j] - prefix[i] - delimiter_len 是第i到第j-1个句子组成的分段长度
+        prefix = [0]
+        for entry in buffer:
+            prefix.append(prefix[-1] + entry[1] + delimiter_len)
+        
+        # 贪心分段的段数就是最少段数
+        count = 0
+        current = None
+        for entry in buffer:
+            if current is not None and current + delimiter_len + entry[1] <= max_length:
+                current += delimiter_len + entry[1]
+            else:
+                count += 1
+                current = entry[1]
+        target = (prefix[n] - delimiter_len * count) / count
+        
+        cut_cost = [0.0] * n
+        if self.affinity_weight:
+            # 愿意为在标题前切分而让分段长度偏离目标约四分之一
+            bonus = self.affinity_weight * 2 * (target / 4) ** 2
+            is_list = [bool(_LIST_ITEM_PATTERN.match(entry[0])) for entry in buffer]
+            for i in range(1, n):
+                if _HEADING_PATTERN.match(buffer[i][0]):
+                    cut_cost[i] = -bonus
+                elif is_list[i - 1] and is_list[i]:
+                    cut_cost[i] = bonus
+        
+        best_count = [0] + [n + 1] * n
+        best_cost = [0.0] * (n + 1)
+        back = [0] * (n + 1)
+        for j in range(1, n + 1):
+            i = j - 1
+            while i >= 0:
+                length = prefix[j] - prefix[i] - delimiter_len
+                if length > max_length and i < j - 1:
+                    break
+                chunk_count = best_count[i] + 1
+                cost = best_cost[i] + (length - target) ** 2 + cut_cost[i]
+                if chunk_count < best_count[j] or (chunk_count == best_count[j] and cost < best_cost[j]):
+                    best_count[j] = chunk_count
+                    best_cost[j] = cost
+                    back[j] = i
+                i -= 1
+        
+        chunks = []
+        j = n
+        while j > 0:
+            chunks.append(buffer[back[j]:j])
+            j = back[j]
+        chunks.reverse()
+        return chunks
+
+    def _merge_stream(self, segments):
+        """
+        Merge segments that are shorter than min_segment_length with the
+        segments that follow them.
+        
+        Args:
+            segments: Iterable of (text, length, start, end)
+            
+        Yields:
+            tuple: Merged text segments as (text, start, end)
+        """
+        # 用片段列表和长度计数代替字符串拼接，避免每次合并都复制整个缓冲区
+        current_parts = None
+        current_len = 0
+        current_start = current_end = 0
+        delimiter_len = self._delimiter_length
+        
+        for segment, segment_len, segment_start, segment_end in segments:
+            if current_parts is None:
+                current_parts = [segment]
+                current_len = segment_len
+                current_start = segment_start
+            elif current_len < self.min_segment_length:
+                current_parts.append(segment)
+                current_len += delimiter_len + segment_len
+            else:
+                yield self.delimiter.join(current_parts), current_start, current_end
+                current_parts = [segment]
+                current_len = segment_len
+                current_start = segment_start
+            current_end = segment_end
+        
+        if current_parts is not None:
+            current = self.delimiter.join(current_parts)
+            if current:
+                yield current, current_start, current_end
+
+    def _overlap_stream(self, segments, text=None):
+        """
+        Prefix every segment but the first with the tail of the previous one.
+        
+        Segments the deduplicator reports as exact duplicates are dropped;
+        the overlap of the next segment still comes from the segment that
+        precedes it in the text.
+        
+        Args:
+            segments: Iterable of merged (text, start, end)
+            text (str, optional): The preprocessed text the offsets refer to
+            
+        Yields:
+            tuple: (text with overlap, start, end, overlap_start), where
+                overlap_start is where the overlap tail begins in text, or
+                None if text is not given
+        """
+        deduplicator = self.deduplicator
+        prev_segment = None
+        prev_start = prev_end = 0
+        for segment, start, end in segments:
+            if deduplicator is not None and deduplicator.check(segment).status == 'duplicate':
+                # 重复的分段不输出，但仍作为下一分段重叠部分的来源
+                pass
+            elif prev_segment is None or self.overlap_length == 0:
+                yield segment, start, end, start if text is not None else None
+            else:
+                # Add overlap from previous segment
+                overlap = self._overlap_tail(prev_segment)
+                overlap_start = None
+                if text is not None:
+                    overlap_start = self._overlap_offset(prev_segment, len(overlap), prev_start, prev_end, text)
+                yield overlap + self.delimiter + segment, start, end, overlap_start
+            prev_segment = segment
+            prev_start, prev_end = start, end
+
+    def _overlap_offset(self, segment, overlap_len, start, end, text):
+        """
+        Find where the overlap tail of a segment begins in the text.
+        
+        The segment joins sentences and words of text[start:end] with the
+        delimiter or a space, while in the text they are separated by
+        whitespace, a dropped delimiter or nothing at all. The tail is
+        matched backwards against the text; every run of whitespace and
+        delimiters in the segment corresponds to a possibly empty run of
+        whitespace and delimiters in the text.
+        
+        Args:
+            segment (str): Merged segment without overlap
+            overlap_len (int): Length of the overlap tail in characters
+            start (int): Start offset of the segment in text
+            end (int): End offset of the segment in text
+            text (str): Preprocessed text
+            
+        Returns:
+            int: Offset in text of the first sentence or word character of
+                the overlap tail
+        """
+        i = len(segment)
+        j = end
+        target = i - overlap_len
+        while i > target and j > start:
+            if self._is_separator_end(segment, 0, i):
+                i = self._skip_separators(segment, 0, i)
+                if i <= target:
+                    # 重叠部分以拼接符开头，从其后的句子或单词开始
+                    break
+                j = self._skip_separators(text, start, j)
+            elif segment[i - 1] == text[j - 1]:
+                i -= 1
+                j -= 1
+            elif self._is_separator_end(text, start, j):
+                j = self._skip_separators(text, start, j)
+            else:
+                break
+        return max(j, start)
+
+    def _is_separator_end(self, text, start, end):
+        """Whether text[start:end] ends with whitespace or the delimiter."""
+        return end > start and (text[end - 1].isspace()
+                                or bool(self.delimiter) and text.endswith(self.delimiter, start, end))
+
+    def _skip_separators(self, text, start, end):
+        """Return where the run of whitespace and delimiters ending at end begins."""
+        while self._is_separator_end(text, start, end):
+            end -= 1 if text[end - 1].isspace() else len(self.delimiter)
+        return end
+
+    def _overlap_tail(self, segment):
+        """
+        Return the longest suffix of segment that fits in overlap_length.
+        
+        Args:
+            segment (str): Previous segment
+            
+        Returns:
+            str: Overlap text
+        """
+        if self.length_function is len:
+            return segment[-self.overlap_length:] if len(segment) > self.overlap_length else segment
+        if self.length_function(segment) <= self.overlap_length:
+            return segment
+        
+        # 二分查找满足token预算的最长后缀
+        low, high = 0, len(segment)
+        while low < high:
+            mid = (low + high) // 2
+            if self.length_function(segment[mid:]) <= self.overlap_length:
+                high = mid
+            else:
+                low = mid + 1
+        return segment[low:]
+
+
+class TextSpan:
+    """
+    A segment described by offsets into the original text.
+    
+    Attributes:
+        source (str): The original text
+        start (int): Start offset of the segment
+        end (int): End offset of the segment
+        overlap_start (int): Start offset of the segment including the
+            overlap taken from the previous segment
+    """
+    __slots__ = ('source', 'start', 'end', 'overlap_start')
+    
+    def __init__(self, source, start, end, overlap_start):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.overlap_start = overlap_start
+    
+    @property
+    def text(self):
+        """str: The segment text, sliced from the original text."""
+        return self.source[self.start:self.end]
+    
+    @property
+    def text_with_overlap(self):
+        """str: The segment text including the overlap."""
+        return self.source[self.overlap_start:self.end]
+    
+    @property
+    def segment_id(self):
+        """str: Content hash of the segment text including the overlap."""
+        return hashlib.sha1(self.text_with_overlap.encode('utf-8')).hexdigest()[:16]
+    
+    def __repr__(self):
+        return f"TextSpan(start={self.start}, end={self.end}, overlap_start={self.overlap_start})"
+
+
+class ResegmentResult:
+    """
+    Result of TextSegmenter.resegment.
+    
+    Attributes:
+        spans (list): TextSpan list for the new text
+        added (list): Ids of segments that are new and need embedding
+        removed (list): Ids of previous segments that no longer exist
+        unchanged (list): Ids of segments whose content is unchanged
+    """
+    __slots__ = ('spans', 'added', 'removed', 'unchanged')
+    
+    def __init__(self, spans, added, removed, unchanged):
+        self.spans = spans
+        self.added = added
+        self.removed = removed
+        self.unchanged = unchanged
+
+
+def _find_edit(old_text, new_text):
+    """
+    Find the single changed region between two texts.
+    
+    Returns:
+        tuple: (start, old_end, new_end) such that old_text[start:old_end]
+            was replaced by new_text[start:new_end]
+    """
+    # 用切片比较做二分查找，比逐字符比较快得多
+    limit = min(len(old_text), len(new_text))
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old_text[:mid] == new_text[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = low
+    
+    low, high = 0, limit - prefix
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old_text[len(old_text) - mid:] == new_text[len(new_text) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return prefix, len(old_text) - low, len(new_text) - low
+
+
+# 流式分句时标记超长句子的开始
+_LONG_SENTENCE = object()
 
 
 # Example usage